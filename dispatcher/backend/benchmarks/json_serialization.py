@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" compare stdlib and orjson serialization of a large task document
+
+    cd dispatcher/backend && PYTHONPATH=src python benchmarks/json_serialization.py """
+
+import json
+import uuid
+import random
+import timeit
+import datetime
+
+from bson import ObjectId
+
+import utils.json
+from utils.json import Encoder, default
+
+NB_EVENTS = 2000
+STDOUT_LINES = 20000
+NUMBER = 20
+
+
+def get_task():
+    now = datetime.datetime.utcnow()
+    statuses = ["reserved", "started", "scraper_started", "scraper_running"]
+    return {
+        "_id": ObjectId(),
+        "status": "scraper_running",
+        "schedule_name": "wikipedia_fr_all_maxi",
+        "worker": "worker-1",
+        "timestamp": {status: now for status in statuses},
+        "events": [
+            {
+                "code": random.choice(statuses),  # nosec
+                "timestamp": now + datetime.timedelta(seconds=index),
+                "file": {"name": f"{uuid.uuid4().hex}.zim", "size": index * 1024},
+            }
+            for index in range(NB_EVENTS)
+        ],
+        "container": {
+            "command": ["mwoffliner", '--mwUrl="https://fr.wikipedia.org"'],
+            "exit_code": None,
+            "stdout": "\n".join(
+                f"[info] [{now.isoformat()}] Getting article {index} of 2000000…"
+                for index in range(STDOUT_LINES)
+            ),
+            "stderr": "",
+            "progress": {"done": 1000, "total": 2000000},
+        },
+        "updated_at": now,
+        "version": 12,
+    }
+
+
+def main():
+    task = get_task()
+
+    def stdlib():
+        return json.dumps(task, default=default)
+
+    def encoder():
+        # what jsonify does
+        return json.dumps(task, cls=Encoder, sort_keys=True)
+
+    benchmarks = {"stdlib": stdlib, "encoder (jsonify)": encoder}
+    if utils.json.USE_ORJSON:
+        benchmarks["orjson"] = lambda: utils.json.dumps_bytes(task)
+    else:
+        print("orjson not in use (not installed or JSON_BACKEND=stdlib)")
+
+    size = len(stdlib())
+    print(f"task document: {size / 2**20:.2f}MiB of JSON, {NB_EVENTS} events")
+    for name, func in benchmarks.items():
+        duration = min(timeit.repeat(func, number=NUMBER, repeat=3)) / NUMBER
+        print(f"{name:>20}: {duration * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
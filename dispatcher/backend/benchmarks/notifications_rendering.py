@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" compare rendering notifications per recipient and once per event
+
+    cd dispatcher/backend && PYTHONPATH=src python benchmarks/notifications_rendering.py """
+
+import timeit
+
+from common.notifications import (
+    get_context,
+    jinja_env,
+    render_mailgun_notification,
+    render_slack_notification,
+)
+
+NB_FILES = 50
+NB_RECIPIENTS = 20
+NUMBER = 50
+
+
+def get_task():
+    return {
+        "_id": "5f2c1e3a9b1e8a0001a1b2c3",
+        "status": "succeeded",
+        "schedule_name": "wikipedia_fr_all_maxi",
+        "config": {"warehouse_path": "/wikipedia"},
+        "files": {
+            f"wikipedia_fr_all_maxi_{index}.zim": {
+                "name": f"wikipedia_fr_all_maxi_{index}.zim",
+                "size": index * 2 ** 30,
+            }
+            for index in range(NB_FILES)
+        },
+    }
+
+
+def main():
+    task = get_task()
+
+    def per_recipient():
+        # previous behavior: templates looked-up and rendered for each recipient
+        for _ in range(NB_RECIPIENTS):
+            context = get_context(task)
+            for name in ("email_subject.txt", "email_body.html"):
+                jinja_env.get_template(name).render(**context)
+            for name in ("slack_fallback.txt", "slack_title.txt", "slack_message.txt"):
+                jinja_env.get_template(name).render(**context)
+
+    def once():
+        render_mailgun_notification(task)
+        render_slack_notification(task)
+
+    print(f"task with {NB_FILES} files, {NB_RECIPIENTS} recipients per method")
+    for name, func in {"per recipient": per_recipient, "once": once}.items():
+        duration = min(timeit.repeat(func, number=NUMBER, repeat=3)) / NUMBER
+        print(f"{name:>15}: {duration * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" compare SSH-key authentication verification: openssl subprocess vs in-process
+
+    Verifies a message signed by the last of the user's NB_KEYS keys,
+    as /auth/ssh_authorize does for each request.
+
+    cd dispatcher/backend && PYTHONPATH=src python benchmarks/ssh_auth.py """
+
+import time
+import shutil
+import pathlib
+import datetime
+import tempfile
+import subprocess
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from common.constants import OPENSSL_BIN
+from utils.ssh import find_signing_key
+
+NB_KEYS = 3
+DURATION = 5  # seconds per benchmark
+
+
+def openssl_verify(ssh_keys, message, signature):
+    """previous implementation: one `openssl pkeyutl` per key until it matches"""
+    with tempfile.TemporaryDirectory() as tmp_dirname:
+        tmp_dir = pathlib.Path(tmp_dirname)
+        message_path = tmp_dir.joinpath("message")
+        signatured_path = tmp_dir.joinpath(f"{message_path.name}.sig")
+        message_path.write_bytes(message)
+        signatured_path.write_bytes(signature)
+        for ssh_key in ssh_keys:
+            pkcs8_key = tmp_dir.joinpath("pubkey")
+            pkcs8_key.write_text(ssh_key["pkcs8_key"])
+            pkey_util = subprocess.run(
+                [
+                    OPENSSL_BIN,
+                    "pkeyutl",
+                    "-verify",
+                    "-pubin",
+                    "-inkey",
+                    str(pkcs8_key),
+                    "-in",
+                    str(message_path),
+                    "-sigfile",
+                    str(signatured_path),
+                ],
+                capture_output=True,
+            )
+            if pkey_util.returncode == 0:
+                return ssh_key
+    return None
+
+
+def get_ssh_keys(tmp_dir):
+    ssh_keys = []
+    for index in range(NB_KEYS):
+        private_key = rsa.generate_private_key(65537, 2048, default_backend())
+        private_key_path = tmp_dir.joinpath(f"key{index}")
+        private_key_path.write_bytes(
+            private_key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption(),
+            )
+        )
+        ssh_keys.append(
+            {
+                "fingerprint": f"{index:032x}",
+                "pkcs8_key": private_key.public_key()
+                .public_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PublicFormat.SubjectPublicKeyInfo,
+                )
+                .decode("ASCII"),
+            }
+        )
+    return ssh_keys, private_key_path
+
+
+def sign(private_key_path, message, tmp_dir):
+    message_path = tmp_dir.joinpath("message")
+    message_path.write_bytes(message)
+    subprocess.run(
+        [OPENSSL_BIN, "pkeyutl", "-sign", "-inkey", str(private_key_path)]
+        + ["-in", str(message_path), "-out", str(tmp_dir.joinpath("message.sig"))],
+        check=True,
+    )
+    return tmp_dir.joinpath("message.sig").read_bytes()
+
+
+def measure(func, *args):
+    """requests per second"""
+    count = 0
+    started_on = time.perf_counter()
+    while time.perf_counter() - started_on < DURATION:
+        assert func(*args) is not None
+        count += 1
+    return count / (time.perf_counter() - started_on)
+
+
+def main():
+    tmp_dir = pathlib.Path(tempfile.mkdtemp())
+    try:
+        ssh_keys, private_key_path = get_ssh_keys(tmp_dir)
+        message = f"bob:{datetime.datetime.utcnow().isoformat()}".encode("ASCII")
+        signature = sign(private_key_path, message, tmp_dir)
+        args = (ssh_keys, message, signature)
+
+        print(f"{NB_KEYS} keys, signed with the last one")
+        for name, func in {
+            "openssl": openssl_verify,
+            "in-process": find_signing_key,
+        }.items():
+            print(f"{name:>12}: {measure(func, *args):,.0f} auth/s")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
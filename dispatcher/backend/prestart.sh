@@ -5,4 +5,5 @@ die() {
 	exit 1
 }
 
+python -c "from utils.database import Initializer; Initializer.initialize()" || die
 python -c "from utils.database import Initializer; Initializer.create_initial_user()" || die
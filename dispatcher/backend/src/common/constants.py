@@ -3,13 +3,57 @@ import datetime
 
 from common.enum import SchedulePeriodicity
 
+
+def get_int_env(name: str, default: int) -> int:
+    """integer value of an environment variable, default if unset or invalid"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
 OPENSSL_BIN = os.getenv("OPENSSL_BIN", "/usr/bin/openssl")
 MESSAGE_VALIDITY = 60  # number of seconds before a message expire
 
 REFRESH_TOKEN_EXPIRY = 180  # days
 TOKEN_EXPIRY = 24  # hours
+# secrets signing access tokens, shared by all API processes/replicas.
+# `kid:secret` entries, comma-separated (env) or one per line (file).
+# first one signs new tokens, others are only accepted (rotation).
+# a random secret is generated (per process) if none is configured
+JWT_SECRETS = os.getenv("JWT_SECRETS", "")
+JWT_SECRETS_FILE = os.getenv("JWT_SECRETS_FILE", "")
 
 DEFAULT_SCHEDULE_DURATION = datetime.timedelta(days=31).total_seconds()
+# number of recent successful durations kept on schedule for rolling statistics
+DURATION_HISTORY_SIZE = 10
+# weight of the latest duration in the exponentially weighted moving average
+DURATION_EWMA_ALPHA = 0.3
+
+# seconds worker polls are answered from the in-memory matchmaking snapshot
+# before it is reloaded from database. 0 disables it (query database each poll)
+MATCHMAKING_CACHE_TTL = get_int_env("MATCHMAKING_CACHE_TTL", 30)
+
+# number of serialized responses (documents) kept in memory by each process
+RESPONSE_CACHE_SIZE = get_int_env("RESPONSE_CACHE_SIZE", 512)
+
+# number of verified access tokens kept in memory by each process (until expiry)
+TOKEN_CACHE_SIZE = get_int_env("TOKEN_CACHE_SIZE", 1024)
+
+# JSON library used to serialize responses and messages: orjson or stdlib.
+# stdlib is used if orjson is not installed
+JSON_BACKEND = os.getenv("JSON_BACKEND", "orjson")
+
+# seconds tags, languages, categories and offliners of schedules are kept in memory
+FACETS_CACHE_TTL = get_int_env("FACETS_CACHE_TTL", 300)
+
+# number of messages waiting to be broadcasted before new ones are dropped
+BROADCASTER_QUEUE_SIZE = get_int_env("BROADCASTER_QUEUE_SIZE", 1000)
+# seconds between logs of broadcaster statistics (queue depth, drops). 0 disables
+BROADCASTER_STATS_INTERVAL = get_int_env("BROADCASTER_STATS_INTERVAL", 300)
+
+# seconds events pushed to workers are kept for replay (missed while disconnected)
+WORKER_EVENTS_TTL = get_int_env("WORKER_EVENTS_TTL", 172800)
 
 PERIODICITIES = {
     SchedulePeriodicity.monthly: {"days": 31},
@@ -21,17 +65,11 @@ PERIODICITIES = {
 ZIM_UPLOAD_URI = os.getenv(
     "ZIM_UPLOAD_URI", "sftp://uploader@warehouse.farm.openzim.org:1522/zim"
 )
-try:
-    ZIM_EXPIRATION = int(os.getenv("ZIM_EXPIRATION", "0"))
-except Exception:
-    ZIM_EXPIRATION = 0
+ZIM_EXPIRATION = get_int_env("ZIM_EXPIRATION", 0)
 LOGS_UPLOAD_URI = os.getenv(
     "LOGS_UPLOAD_URI", "sftp://uploader@warehouse.farm.openzim.org:1522/logs"
 )
-try:
-    LOGS_EXPIRATION = int(os.getenv("LOGS_EXPIRATION", "30"))
-except Exception:
-    LOGS_EXPIRATION = 30
+LOGS_EXPIRATION = get_int_env("LOGS_EXPIRATION", 30)
 
 # empty ZIMCHECK_OPTION means no zimcheck
 ZIMCHECK_OPTION = os.getenv("ZIMCHECK_OPTION", "")
@@ -56,5 +94,16 @@ SLACK_USERNAME = os.getenv("SLACK_USERNAME")
 SLACK_EMOJI = os.getenv("SLACK_EMOJI")
 SLACK_ICON = os.getenv("SLACK_ICON")
 
+# delivery (notifications-worker)
+NOTIFICATIONS_WORKERS = get_int_env("NOTIFICATIONS_WORKERS", 4)
+# attempts for each recipient before giving up (kept as dead-letter)
+NOTIFICATIONS_MAX_ATTEMPTS = get_int_env("NOTIFICATIONS_MAX_ATTEMPTS", 6)
+# seconds before first retry, doubled on each attempt
+NOTIFICATIONS_RETRY_DELAY = get_int_env("NOTIFICATIONS_RETRY_DELAY", 60)
+# seconds for a notification request (mailgun, slack, webhook)
+NOTIFICATIONS_TIMEOUT = get_int_env("NOTIFICATIONS_TIMEOUT", 30)
+# seconds dead-letters are kept for
+NOTIFICATIONS_DEAD_TTL = get_int_env("NOTIFICATIONS_DEAD_TTL", 2592000)
+
 # string to replace hidden secrets with
 SECRET_REPLACEMENT = "********"  # nosec
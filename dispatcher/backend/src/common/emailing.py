@@ -2,15 +2,17 @@
 # -*- coding: utf-8 -*-
 # vim: ai ts=4 sts=4 et sw=4 nu
 
-import logging
 from typing import Optional, Sequence
 
 import requests
 from werkzeug.datastructures import MultiDict
 
-from common.constants import MAILGUN_API_KEY, MAILGUN_API_URL, MAILGUN_FROM
-
-logger = logging.getLogger(__name__)
+from common.constants import (
+    MAILGUN_API_KEY,
+    MAILGUN_API_URL,
+    MAILGUN_FROM,
+    NOTIFICATIONS_TIMEOUT,
+)
 
 
 def send_email_via_mailgun(
@@ -21,7 +23,9 @@ def send_email_via_mailgun(
     bcc: Optional[Sequence] = None,
     headers: Optional[dict] = None,
     attachments: Optional[Sequence] = None,
+    session: Optional[requests.Session] = None,
 ):
+    """mailgun ID of sent email. Raises on failure (for caller to retry)"""
     if not MAILGUN_API_URL or not MAILGUN_API_KEY:
         return
 
@@ -41,20 +45,17 @@ def send_email_via_mailgun(
     ]
     data = MultiDict(values)
 
-    try:
-        resp = requests.post(
-            url=f"{MAILGUN_API_URL}/messages",
-            auth=("api", MAILGUN_API_KEY),
-            data=data,
-            files=[
-                ("attachment", (fpath.name, open(fpath, "rb").read()))
-                for fpath in attachments
-            ]
-            if attachments
-            else [],
-        )
-        resp.raise_for_status()
-    except Exception as exc:
-        logger.error(f"Failed to send mailgun notif: {exc}")
-        logger.exception(exc)
+    resp = (session or requests).post(
+        url=f"{MAILGUN_API_URL}/messages",
+        auth=("api", MAILGUN_API_KEY),
+        data=data,
+        files=[
+            ("attachment", (fpath.name, open(fpath, "rb").read()))
+            for fpath in attachments
+        ]
+        if attachments
+        else [],
+        timeout=NOTIFICATIONS_TIMEOUT,
+    )
+    resp.raise_for_status()
     return resp.json().get("id")
@@ -1,25 +1,86 @@
 import os
+import threading
 import urllib.parse
 
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 from pymongo.database import Database as BaseDatabase
 from pymongo.collection import Collection as BaseCollection
 from common.enum import TaskStatus
+from common.constants import WORKER_EVENTS_TTL, NOTIFICATIONS_DEAD_TTL
 
 MONGODB_URI = urllib.parse.urlparse(
     os.getenv("MONGODB_URI", "mongodb://localhost:27017/Zimfarm"), scheme="mongodb"
 )
+try:
+    MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+except Exception:
+    MONGODB_MAX_POOL_SIZE = 100
+try:
+    MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+except Exception:
+    MONGODB_MIN_POOL_SIZE = 0
+
+
+class RoundTripsCounter(monitoring.CommandListener):
+    """counts commands sent to MongoDB by the current thread (ie. HTTP request)"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def count(self) -> int:
+        return getattr(self._local, "count", 0)
+
+    def reset(self):
+        self._local.count = 0
+
+    def started(self, event):
+        self._local.count = self.count + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+ROUNDTRIPS = RoundTripsCounter()
 
 
 class Client(MongoClient):
+    """MongoClient holding the process-wide connection pool
+
+    Use `Client.get()` to retrieve the shared instance. It is lazily created
+    on first use and recreated in forked children (uwsgi workers) as a client
+    must not be shared across processes."""
+
+    _instance = None
+    _pid = None
+    _lock = threading.Lock()
+
     def __init__(self):
-        super().__init__(f"{MONGODB_URI.scheme}://{MONGODB_URI.netloc}/")
+        super().__init__(
+            f"{MONGODB_URI.scheme}://{MONGODB_URI.netloc}/",
+            maxPoolSize=MONGODB_MAX_POOL_SIZE,
+            minPoolSize=MONGODB_MIN_POOL_SIZE,
+            event_listeners=[ROUNDTRIPS],
+            connect=False,
+        )
+
+    @classmethod
+    def get(cls) -> "Client":
+        if cls._pid != os.getpid():
+            with cls._lock:
+                if cls._pid != os.getpid():
+                    cls._instance = cls()
+                    cls._pid = os.getpid()
+        return cls._instance
 
 
 class Database(BaseDatabase):
     def __init__(self):
         super().__init__(
-            Client(), MONGODB_URI.path[1:] if MONGODB_URI.path else "Zimfarm"
+            Client.get(), MONGODB_URI.path[1:] if MONGODB_URI.path else "Zimfarm"
         )
 
 
@@ -65,6 +126,20 @@ class Tasks(BaseCollection):
         self.create_index("timestamp.started", name="timestamp.started")
         self.create_index("timestamp.succeeded", name="timestamp.succeeded")
         self.create_index("timestamp.failed", name="timestamp.failed")
+        # listing, most recently updated first
+        self.create_index("updated_at", name="updated_at")
+        self.create_index([("status", 1), ("updated_at", -1)], name="status_updated_at")
+        self.create_index(
+            [("schedule_name", 1), ("updated_at", -1)], name="schedule_name_updated_at"
+        )
+        # tasks not completed for a worker
+        self.create_index([("worker", 1), ("status", 1)], name="worker_status")
+        # successful tasks of a schedule, by completion (durations)
+        self.create_index(
+            [("schedule_name", 1), ("timestamp.scraper_completed", 1)],
+            name="schedule_name_scraper_completed",
+            partialFilterExpression={"container.exit_code": 0},
+        )
 
         self.database.command(
             {"collMod": self._name, "validator": {"$jsonSchema": self.schema}}
@@ -91,6 +166,20 @@ class RequestedTasks(BaseCollection):
         self.create_index("status", name="status")
         self.create_index("schedule_name", name="schedule_name")
         self.create_index("timestamp.requested", name="timestamp.requested")
+        # requested tasks doable by a worker (offliner and pinned worker)
+        self.create_index(
+            [("config.task_name", 1), ("worker", 1), ("priority", -1)],
+            name="task_name_worker_priority",
+        )
+        # listing order
+        self.create_index(
+            [
+                ("priority", -1),
+                ("timestamp.reserved", -1),
+                ("timestamp.requested", -1),
+            ],
+            name="priority_reserved_requested",
+        )
 
         self.database.command(
             {"collMod": self._name, "validator": {"$jsonSchema": self.schema}}
@@ -111,3 +200,43 @@ class Schedules(BaseCollection):
 class Workers(BaseCollection):
     def __init__(self):
         super().__init__(Database(), "workers")
+
+
+class WorkerEvents(BaseCollection):
+    """events pushed to a worker, sequence-numbered per worker for replay"""
+
+    _name = "worker_events"
+
+    def __init__(self, database=None):
+        if not database:
+            database = Database()
+        super().__init__(database, self._name)
+
+    def initialize(self):
+        self.create_index([("worker", 1), ("seq", 1)], name="worker_seq", unique=True)
+        self.create_index(
+            "created_on", name="created_on", expireAfterSeconds=WORKER_EVENTS_TTL
+        )
+
+
+class Notifications(BaseCollection):
+    """outbox of notifications to deliver (see common.notifications)"""
+
+    _name = "notifications"
+
+    def __init__(self, database=None):
+        if not database:
+            database = Database()
+        super().__init__(database, self._name)
+
+    def initialize(self):
+        # due notifications, claimed by notifications-worker
+        self.create_index(
+            [("status", 1), ("next_attempt_on", 1)], name="status_next_attempt_on"
+        )
+        self.create_index(
+            "dead_on",
+            name="dead_on",
+            expireAfterSeconds=NOTIFICATIONS_DEAD_TTL,
+            partialFilterExpression={"status": "dead"},
+        )
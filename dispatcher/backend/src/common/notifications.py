@@ -3,16 +3,20 @@
 # vim: ai ts=4 sts=4 et sw=4 nu
 
 import os
-import json
+import random
+import pathlib
 import logging
+import datetime
+import collections
 
-import requests
 import humanfriendly
+from pymongo import ReturnDocument
 from marshmallow import ValidationError
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
-from common.mongo import Tasks, RequestedTasks
-from utils.json import Encoder
+from common import getnow
+from common.mongo import Tasks, RequestedTasks, Notifications
+from utils.json import dumps_bytes, loads
 from common.enum import TaskStatus
 from common.emailing import send_email_via_mailgun
 from common.schemas.models import EventNotificationSchema, ScheduleNotificationSchema
@@ -23,17 +27,33 @@ from common.constants import (
     SLACK_USERNAME,
     SLACK_EMOJI,
     SLACK_ICON,
+    MAILGUN_API_URL,
+    MAILGUN_API_KEY,
+    NOTIFICATIONS_TIMEOUT,
+    NOTIFICATIONS_MAX_ATTEMPTS,
+    NOTIFICATIONS_RETRY_DELAY,
 )
 
 logger = logging.getLogger(__name__)
+
+# deliveries (and notification) statuses
+PENDING = "pending"
+SENT = "sent"
+DEAD = "dead"
+# time a worker has to process a claimed notification before another can
+CLAIM_DURATION = datetime.timedelta(minutes=15)
+TEMPLATES_DIR = pathlib.Path(__file__).resolve().parent.parent / "templates"
+
 jinja_env = Environment(
-    loader=FileSystemLoader("templates"),
+    loader=FileSystemLoader(str(TEMPLATES_DIR)),
     autoescape=select_autoescape(["html", "xml", "txt"]),
 )
 jinja_env.filters["short_id"] = lambda value: str(value)[:5]
 jinja_env.filters["format_size"] = lambda value: humanfriendly.format_size(
     value, binary=True
 )
+# compiled once for all notifications
+TEMPLATES = {name: jinja_env.get_template(name) for name in jinja_env.list_templates()}
 
 
 class GlobalNotifications:
@@ -78,72 +98,111 @@ def get_context(task):
     return {"base_url": PUBLIC_URL, "download_url": ZIM_DOWNLOAD_URL, "task": task}
 
 
-def handle_mailgun_notification(task, recipients):
+def render_mailgun_notification(task):
     context = get_context(task)
-    subject = jinja_env.get_template("email_subject.txt").render(**context)
-    body = jinja_env.get_template("email_body.html").render(**context)
-    for recipient in recipients:
-        send_email_via_mailgun(recipient, subject, body)
+    return {
+        "subject": TEMPLATES["email_subject.txt"].render(**context),
+        "body": TEMPLATES["email_body.html"].render(**context),
+    }
 
 
-def handle_webhook_notification(task, urls):
-    for url in urls:
-        try:
-            resp = requests.post(url, json=task)
-            resp.raise_for_status()
-        except Exception as exc:
-            logger.error(f"Webhook failed with: {exc}")
-            logger.exception(exc)
+def send_mailgun_notification(rendered, recipient, session):
+    send_email_via_mailgun(
+        recipient, rendered["subject"], rendered["body"], session=session
+    )
 
 
-def handle_slack_notification(task, channels):
-    # return early if slack is not configured
-    if not SLACK_URL:
-        return
+def render_webhook_notification(task):
+    return task
 
+
+def send_webhook_notification(rendered, url, session):
+    resp = session.post(url, json=rendered, timeout=NOTIFICATIONS_TIMEOUT)
+    resp.raise_for_status()
+
+
+def render_slack_notification(task):
     context = get_context(task)
-    for channel in channels:
-        try:
-            requests.post(
-                SLACK_URL,
-                json={
-                    # destination. prefix with # for chans or @ for account
-                    "channel": channel,
-                    "username": SLACK_USERNAME,
-                    "icon_emoji": SLACK_EMOJI,
-                    "icon_url": SLACK_ICON,
-                    "attachments": [
-                        {
-                            # desktop notif, mobile, etc
-                            "fallback": jinja_env.get_template(
-                                "slack_fallback.txt"
-                            ).render(**context),
-                            "color": {
-                                TaskStatus.succeeded: "good",
-                                TaskStatus.canceled: "warning",
-                                TaskStatus.cancel_requested: "warning",
-                                TaskStatus.failed: "danger",
-                            }.get(task["status"]),
-                            "fields": [
-                                {
-                                    "title": jinja_env.get_template(
-                                        "slack_title.txt"
-                                    ).render(**context),
-                                    "value": jinja_env.get_template(
-                                        "slack_message.txt"
-                                    ).render(**context),
-                                }
-                            ],
-                        }
-                    ],
-                },
+    return {
+        "username": SLACK_USERNAME,
+        "icon_emoji": SLACK_EMOJI,
+        "icon_url": SLACK_ICON,
+        "attachments": [
+            {
+                # desktop notif, mobile, etc
+                "fallback": TEMPLATES["slack_fallback.txt"].render(**context),
+                "color": {
+                    TaskStatus.succeeded: "good",
+                    TaskStatus.canceled: "warning",
+                    TaskStatus.cancel_requested: "warning",
+                    TaskStatus.failed: "danger",
+                }.get(task["status"]),
+                "fields": [
+                    {
+                        "title": TEMPLATES["slack_title.txt"].render(**context),
+                        "value": TEMPLATES["slack_message.txt"].render(**context),
+                    }
+                ],
+            }
+        ],
+    }
+
+
+def send_slack_notification(rendered, channel, session):
+    resp = session.post(
+        SLACK_URL,
+        # destination. prefix with # for chans or @ for account
+        json=dict(rendered, channel=channel),
+        timeout=NOTIFICATIONS_TIMEOUT,
+    )
+    resp.raise_for_status()
+
+
+# render: task -> payload shared by all targets
+# send: (payload, target, session) -> None, raises on failure
+NotificationMethod = collections.namedtuple(
+    "NotificationMethod", ["render", "send", "is_configured"]
+)
+METHODS = {
+    "mailgun": NotificationMethod(
+        render_mailgun_notification,
+        send_mailgun_notification,
+        lambda: bool(MAILGUN_API_URL and MAILGUN_API_KEY),
+    ),
+    "webhook": NotificationMethod(
+        render_webhook_notification, send_webhook_notification, lambda: True
+    ),
+    "slack": NotificationMethod(
+        render_slack_notification, send_slack_notification, lambda: bool(SLACK_URL)
+    ),
+}
+
+
+def get_deliveries(task, event):
+    """deliveries (one per method and target) requested for event on task"""
+    global_notifs = GlobalNotifications.entries.get(event, {})
+    task_notifs = (task.get("notification") or {}).get(event, {})
+
+    deliveries = []
+    for method, recipients in list(task_notifs.items()) + list(global_notifs.items()):
+        # skip methods that are not configured on this instance
+        if method not in METHODS or not METHODS[method].is_configured():
+            continue
+        for target in recipients or []:
+            deliveries.append(
+                {
+                    "method": method,
+                    "target": target,
+                    "status": PENDING,
+                    "attempts": 0,
+                    "error": None,
+                }
             )
-        except Exception as exc:
-            logger.error(f"Failed to submit slack notification: {exc}")
-            logger.exception(exc)
+    return deliveries
 
 
 def handle_notification(task_id, event):
+    """queue notifications for event on task (delivered by notifications-worker)"""
     # alias for all complete status
     if event in TaskStatus.complete():
         event = "ended"
@@ -159,22 +218,99 @@ def handle_notification(task_id, event):
         return
 
     # serialize/unserialize task so we use a safe version from now-on
-    task = json.loads(json.dumps(task, cls=Encoder))
-    global_notifs = GlobalNotifications.entries.get(event, {})
-    task_notifs = task.get("notification", {}).get(event, {})
+    task = loads(dumps_bytes(task))
+    deliveries = get_deliveries(task, event)
 
     # exit early if we don't have notification requests for the event
-    if not global_notifs and not task_notifs:
+    if not deliveries:
         return
 
-    for method, recipients in list(task_notifs.items()) + list(global_notifs.items()):
-        func = {
-            "mailgun": handle_mailgun_notification,
-            "webhook": handle_webhook_notification,
-            "slack": handle_slack_notification,
-        }.get(method)
-        if func and recipients:
-            func(task, recipients)
+    # task is a snapshot so notification reflects its state at event time
+    now = getnow()
+    Notifications().insert_one(
+        {
+            "task_id": task_id,
+            "event": event,
+            "task": task,
+            "deliveries": deliveries,
+            "status": PENDING,
+            "created_on": now,
+            "next_attempt_on": now,
+        }
+    )
+
+
+def get_retry_delay(attempts):
+    """seconds to wait after `attempts` failed attempts, with jitter"""
+    delay = NOTIFICATIONS_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+    return delay * random.uniform(0.8, 1.2)  # nosec
+
+
+def claim_notification():
+    """oldest due notification, now leased to caller for CLAIM_DURATION"""
+    now = getnow()
+    return Notifications().find_one_and_update(
+        {"status": PENDING, "next_attempt_on": {"$lte": now}},
+        {"$set": {"next_attempt_on": now + CLAIM_DURATION}},
+        sort=[("next_attempt_on", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def deliver(notification, session):
+    """attempt pending deliveries of notification, updating them in-place
+
+    Payload of each method is rendered once and sent to all its targets"""
+    rendered = {}
+    for delivery in notification["deliveries"]:
+        if delivery["status"] != PENDING:
+            continue
+        delivery["attempts"] += 1
+        method = METHODS[delivery["method"]]
+        try:
+            if delivery["method"] not in rendered:
+                rendered[delivery["method"]] = method.render(notification["task"])
+            method.send(rendered[delivery["method"]], delivery["target"], session)
+        except Exception as exc:
+            delivery["error"] = str(exc)
+            if delivery["attempts"] >= NOTIFICATIONS_MAX_ATTEMPTS:
+                delivery["status"] = DEAD
+            logger.warning(
+                f"{delivery['method']} notification for {notification['event']} "
+                f"of {notification['task_id']} to {delivery['target']} failed "
+                f"({delivery['attempts']}/{NOTIFICATIONS_MAX_ATTEMPTS}): {exc}"
+            )
+        else:
+            delivery["status"] = SENT
+            delivery["error"] = None
+
+
+def process_notification(notification, session):
+    """deliver notification and reschedule, dead-letter or remove it
+
+    returns its resulting status"""
+    deliver(notification, session)
+    deliveries = notification["deliveries"]
+    pending = [delivery for delivery in deliveries if delivery["status"] == PENDING]
+
+    if pending:
+        attempts = max(delivery["attempts"] for delivery in pending)
+        update = {
+            "deliveries": deliveries,
+            "next_attempt_on": getnow()
+            + datetime.timedelta(seconds=get_retry_delay(attempts)),
+        }
+        status = PENDING
+    elif any(delivery["status"] == DEAD for delivery in deliveries):
+        # kept for inspection until expired (NOTIFICATIONS_DEAD_TTL after dead_on)
+        update = {"deliveries": deliveries, "status": DEAD, "dead_on": getnow()}
+        status = DEAD
+    else:
+        Notifications().delete_one({"_id": notification["_id"]})
+        return SENT
+
+    Notifications().update_one({"_id": notification["_id"]}, {"$set": update})
+    return status
 
 
 # fill-up GlobalNotifications from environ on module load
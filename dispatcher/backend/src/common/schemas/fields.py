@@ -1,4 +1,5 @@
-from marshmallow import fields, validate
+from bson import ObjectId
+from marshmallow import fields, validate, ValidationError
 
 from common.roles import ROLES
 from common.enum import (
@@ -32,6 +33,69 @@ validate_worker_name = validate.Length(min=3)
 validate_periodicity = validate.OneOf(SchedulePeriodicity.all())
 validate_platform = validate.OneOf(Platform.all())
 validate_platform_value = validate.Range(min=0)
+# number of tasks which status can be looked-up at once
+validate_tasks_lookup = validate.Length(min=1, max=200)
+# how list endpoints count matching documents
+COUNT_MODES = ["exact", "estimated", "none"]
+# fields that can be requested (`fields=`) on documents' details.
+# nested fields only if they can't hold secrets (config.flags, commands)
+TASK_FIELDS = [
+    "_id",
+    "status",
+    "schedule_name",
+    "worker",
+    "timestamp",
+    "events",
+    "requested_by",
+    "canceled_by",
+    "priority",
+    "config",
+    "config.task_name",
+    "config.resources",
+    "config.platform",
+    "container",
+    "container.progress",
+    "container.exit_code",
+    "debug",
+    "files",
+    "upload",
+    "notification",
+    "updated_at",
+    "version",
+]
+REQUESTED_TASK_FIELDS = [
+    "_id",
+    "status",
+    "schedule_name",
+    "worker",
+    "timestamp",
+    "events",
+    "requested_by",
+    "priority",
+    "config",
+    "config.task_name",
+    "config.resources",
+    "config.platform",
+    "upload",
+    "notification",
+]
+SCHEDULE_FIELDS = [
+    "name",
+    "category",
+    "enabled",
+    "language",
+    "tags",
+    "periodicity",
+    "config",
+    "config.task_name",
+    "config.resources",
+    "config.platform",
+    "config.warehouse_path",
+    "notification",
+    "most_recent_task",
+    "duration",
+    "version",
+]
 # slack target must start with # for channels or @ for usernames
 validate_slack_target = validate.Regexp(regex=r"^[#|@].+$")
 
@@ -40,6 +104,11 @@ def validate_multiple_of_100(value):
     return value % 100 == 0
 
 
+def validate_object_id(value):
+    if not ObjectId.is_valid(value):
+        raise ValidationError("Not a valid ObjectId.")
+
+
 # reusable fields
 skip_field = fields.Integer(required=False, missing=0, validate=validate.Range(min=0))
 limit_field_20_500 = fields.Integer(
@@ -48,6 +117,25 @@ limit_field_20_500 = fields.Integer(
 limit_field_20_200 = fields.Integer(
     required=False, missing=20, validate=validate.Range(min=0, max=200)
 )
+cursor_field = fields.String(required=False, validate=validate_not_empty)
+count_field = fields.String(
+    required=False, missing="exact", validate=validate.OneOf(COUNT_MODES)
+)
+task_fields_field = fields.List(
+    fields.String(validate=validate.OneOf(TASK_FIELDS)),
+    required=False,
+    data_key="fields",
+)
+requested_task_fields_field = fields.List(
+    fields.String(validate=validate.OneOf(REQUESTED_TASK_FIELDS)),
+    required=False,
+    data_key="fields",
+)
+schedule_fields_field = fields.List(
+    fields.String(validate=validate.OneOf(SCHEDULE_FIELDS)),
+    required=False,
+    data_key="fields",
+)
 priority_field = fields.Integer(required=False, validate=validate_priority)
 worker_field = fields.String(required=False, validate=validate_worker_name)
 schedule_name_field = fields.String(validate=validate_schedule_name)
@@ -1,7 +1,12 @@
-from marshmallow import fields, Schema
+from marshmallow import fields, validate, Schema
 
 from common.schemas.fields import (
     skip_field,
+    cursor_field,
+    count_field,
+    task_fields_field,
+    requested_task_fields_field,
+    schedule_fields_field,
     limit_field_20_200,
     limit_field_20_500,
     worker_field,
@@ -25,6 +30,8 @@ from common.schemas.fields import (
     validate_event,
     validate_worker_name,
     validate_platform,
+    validate_object_id,
+    validate_tasks_lookup,
 )
 from common.schemas.models import (
     LanguageSchema,
@@ -40,16 +47,24 @@ class SkipLimit500Schema(Schema):
     limit = limit_field_20_500
 
 
-# tags GET, # users GET, # workers GET
+# tags GET
 class SkipLimitSchema(Schema):
     skip = skip_field
     limit = limit_field_20_200
 
 
+# users GET, # workers GET
+class PageSchema(SkipLimitSchema):
+    cursor = cursor_field
+    count = count_field
+
+
 # requested-tasks
 class RequestedTaskSchema(Schema):
     skip = skip_field
     limit = limit_field_20_200
+    cursor = cursor_field
+    count = count_field
 
     worker = worker_field
     priority = priority_field
@@ -85,6 +100,8 @@ class UpdateRequestedTaskSchema(Schema):
 class SchedulesSchema(Schema):
     skip = skip_field
     limit = limit_field_20_200
+    cursor = cursor_field
+    count = count_field
     category = fields.List(category_field, required=False)
     tag = tag_field
     lang = fields.List(fields.String(validate=validate_not_empty), required=False)
@@ -118,10 +135,37 @@ class CloneSchema(Schema):
 class TasksSchema(Schema):
     skip = skip_field
     limit = limit_field_20_200
+    cursor = cursor_field
+    count = count_field
     status = fields.List(fields.String(validate=validate_status), required=False)
     schedule_name = schedule_name_field
 
 
+# task GET (loaded from `fields`, conflicting with Schema.fields)
+class TaskFieldsSchema(Schema):
+    projection = task_fields_field
+
+
+# tasks status GET
+class TasksStatusSchema(Schema):
+    ids = fields.List(
+        fields.String(validate=validate_object_id),
+        required=True,
+        validate=validate_tasks_lookup,
+        data_key="id",
+    )
+
+
+# requested-task GET
+class RequestedTaskFieldsSchema(Schema):
+    projection = requested_task_fields_field
+
+
+# schedule GET
+class ScheduleFieldsSchema(Schema):
+    projection = schedule_fields_field
+
+
 # tasks POST
 class TaskCreateSchema(Schema):
     worker_name = fields.String(required=True, validate=validate_worker_name)
@@ -162,3 +206,9 @@ class WorkerCheckInSchema(Schema):
     disk = fields.Integer(required=True, validate=validate_disk)
     offliners = fields.List(offliner_field, required=True)
     platforms = fields.Nested(PlatformsLimitSchema(), required=False)
+
+
+# worker events GET
+class WorkerEventsSchema(Schema):
+    since = fields.Integer(required=False, validate=validate.Range(min=0))
+    limit = limit_field_20_200
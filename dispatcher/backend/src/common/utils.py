@@ -6,12 +6,15 @@ import logging
 import datetime
 
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from common import getnow, to_naive_utc
 from common.enum import TaskStatus
-from common.mongo import Tasks, Schedules
+from common.mongo import Tasks, Schedules, RequestedTasks
 from common.notifications import handle_notification
-from utils.scheduling import update_schedule_duration
+from utils.matchmaking import MATCHMAKING
+from utils.scheduling import update_schedule_duration_with
 
 logger = logging.getLogger(__name__)
 
@@ -52,27 +55,30 @@ def get_timestamp_from_event(event: dict) -> datetime.datetime:
 
 
 def save_event(task_id: ObjectId, code: str, timestamp: datetime.datetime, **kwargs):
-    """save event and its accompagning data to database"""
+    """save event and its accompagning data to database
+
+    Task is updated in a single write (event, status, timestamps and fields)
+    and its schedule's `most_recent_task` in another one.
+    Returns the updated task (schedule_name, worker, timestamp, container.exit_code
+    and last event only) or None if task doesn't exist"""
 
     task_updates = {}
+    update = {}
     # neither file events nor scraper_running should update timestamp list (not unique)
     if code not in TaskStatus.silent_events():
         task_updates[f"timestamp.{code}"] = timestamp
         # insert event and sort by timestamp
-        Tasks().update_one(
-            {"_id": task_id},
-            {
-                "$push": {
-                    "events": {
-                        "$each": [{"code": code, "timestamp": timestamp}],
-                        "$sort": {"timestamp": 1},
-                    }
-                }
-            },
-        )
+        update["$push"] = {
+            "events": {
+                "$each": [{"code": code, "timestamp": timestamp}],
+                "$sort": {"timestamp": 1},
+            }
+        }
 
         # update task status, timestamp and other fields
         task_updates["status"] = code
+        # events are sorted so updated_at is the most recent timestamp
+        update["$max"] = {"updated_at": timestamp}
 
     def add_to_update_if_present(payload_key, update_key):
         if payload_key in kwargs:
@@ -118,58 +124,115 @@ def save_event(task_id: ObjectId, code: str, timestamp: datetime.datetime, **kwa
             task_updates[f"files.{fkey}.check_log"] = kwargs["file"].get("log")
             task_updates[f"files.{fkey}.check_timestamp"] = timestamp
 
-    Tasks().update_one({"_id": task_id}, {"$set": task_updates})
+    if task_updates:
+        update["$set"] = task_updates
+    if not update:
+        return None
+    update["$inc"] = {"version": 1}
+
+    task = Tasks().find_one_and_update(
+        {"_id": task_id},
+        update,
+        projection={
+            "schedule_name": 1,
+            "worker": 1,
+            "timestamp": 1,
+            "container.exit_code": 1,
+            "events": {"$slice": -1},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    if not task:
+        return None
 
-    _update_schedule_most_recent_task_status(task_id)
+    # silent events don't change the last event so most_recent_task is unchanged
+    if code not in TaskStatus.silent_events():
+        _update_schedule_most_recent_task_status(task)
 
     if code == TaskStatus.scraper_completed:
-        schedule_name = Tasks().find_one({"_id": task_id}, {"schedule_name": 1})[
-            "schedule_name"
-        ]
-        update_schedule_duration(schedule_name)
-
-
-def _update_schedule_most_recent_task_status(task_id):
-    """update `most_recent_task` value of associated schedule"""
-    # get schedule and last event
-    cursor = Tasks().aggregate(
-        [
-            {"$match": {"_id": task_id}},
-            {
-                "$project": {
-                    "schedule_name": 1,
-                    "last_event": {"$arrayElemAt": ["$events", -1]},
-                }
-            },
-        ]
-    )
-    tasks = [task for task in cursor]
-    task = tasks[0] if tasks else None
-    if not task:
+        update_schedule_duration_with(task)
+
+    # worker's resources are released
+    if code in TaskStatus.complete():
+        MATCHMAKING.invalidate()
+
+    return task
+
+
+def _update_schedule_most_recent_task_status(task):
+    """update `most_recent_task` value of associated schedule
+
+    task is expected to contain `schedule_name` and its last event"""
+    if not task.get("events"):
         return
 
     # update schedule most recent task
     schedule_name = task["schedule_name"]
-    last_event_code = task["last_event"]["code"]
-    last_event_timestamp = task["last_event"]["timestamp"]
+    last_event_code = task["events"][-1]["code"]
+    last_event_timestamp = task["events"][-1]["timestamp"]
     if "container" in last_event_code:
         return
 
     schedule_updates = {
         "most_recent_task": {
-            "_id": task_id,
+            "_id": task["_id"],
             "status": last_event_code,
             "updated_at": last_event_timestamp,
         }
     }
-    Schedules().update_one({"name": schedule_name}, {"$set": schedule_updates})
+    Schedules().update_one(
+        {"name": schedule_name}, {"$set": schedule_updates, "$inc": {"version": 1}}
+    )
+
+
+def reserve_requested_task(requested_task_id, worker_name):
+    """turn a requested task into a task reserved by worker
+
+    Requested task is removed atomically so a single worker can reserve it.
+    Returns the created task or None if it's not requested anymore"""
+    requested_task = RequestedTasks().find_one_and_delete({"_id": requested_task_id})
+    if requested_task is None:
+        return None
+    MATCHMAKING.invalidate()
+
+    timestamp = getnow()
+    task = dict(requested_task)
+    task.update(
+        {
+            "status": TaskStatus.reserved,
+            "worker": worker_name,
+            "timestamp": dict(requested_task["timestamp"], reserved=timestamp),
+            "events": requested_task.get("events", [])
+            + [{"code": TaskStatus.reserved, "timestamp": timestamp}],
+            "updated_at": timestamp,
+            "version": 1,
+        }
+    )
+    logger.info(f"Task Reserved: {requested_task_id}, worker={worker_name}")
+
+    try:
+        Tasks().insert_one(task)
+    except DuplicateKeyError:
+        # already a task: requested task was a leftover
+        logger.error(f"task {requested_task_id} already exists")
+        return None
+    except Exception:
+        # restore requested task so it's not lost
+        RequestedTasks().insert_one(requested_task)
+        MATCHMAKING.invalidate()
+        raise
+
+    _update_schedule_most_recent_task_status(task)
+    handle_notification(requested_task_id, TaskStatus.reserved)
+
+    return task
 
 
 def task_reserved_event_handler(task_id, payload):
     worker = payload.get("worker")
     logger.info(f"Task Reserved: {task_id}, worker={worker}")
 
-    save_event(
+    return save_event(
         task_id, TaskStatus.reserved, get_timestamp_from_event(payload), worker=worker
     )
 
@@ -177,21 +240,23 @@ def task_reserved_event_handler(task_id, payload):
 def task_started_event_handler(task_id, payload):
     logger.info(f"Task Started: {task_id}")
 
-    save_event(task_id, TaskStatus.started, get_timestamp_from_event(payload))
+    return save_event(task_id, TaskStatus.started, get_timestamp_from_event(payload))
 
 
 def task_suceeded_event_handler(task_id, payload):
     timestamp = get_timestamp_from_event(payload)
     logger.info(f"Task Succeeded: {task_id}, {timestamp}")
 
-    save_event(task_id, TaskStatus.succeeded, timestamp, task_log=payload.get("log"))
+    return save_event(
+        task_id, TaskStatus.succeeded, timestamp, task_log=payload.get("log")
+    )
 
 
 def task_failed_event_handler(task_id, payload):
     timestamp = get_timestamp_from_event(payload)
     logger.info(f"Task Failed: {task_id}, {timestamp}")
 
-    save_event(
+    return save_event(
         task_id,
         TaskStatus.failed,
         timestamp,
@@ -205,7 +270,7 @@ def task_cancel_requested_event_handler(task_id, payload):
     requested_by = payload.get("canceled_by")
     logger.info(f"Task Cancellation Requested: {task_id}, by: {requested_by}")
 
-    save_event(
+    return save_event(
         task_id,
         TaskStatus.cancel_requested,
         get_timestamp_from_event(payload),
@@ -223,7 +288,7 @@ def task_canceled_event_handler(task_id, payload):
     if payload.get("canceled_by") and task and not task.get("canceled_by"):
         canceled_by = payload.get("canceled_by")
 
-    save_event(
+    return save_event(
         task_id,
         TaskStatus.canceled,
         get_timestamp_from_event(payload),
@@ -238,7 +303,7 @@ def task_scraper_started_event_handler(task_id, payload):
     command = payload.get("command")
     logger.info(f"Task Container Started: {task_id}, {command}")
 
-    save_event(
+    return save_event(
         task_id,
         TaskStatus.scraper_started,
         timestamp,
@@ -251,7 +316,7 @@ def task_scraper_running_event_handler(task_id, payload):
     timestamp = get_timestamp_from_event(payload)
     logger.info(f"Task Container ping: {task_id}")
 
-    save_event(
+    return save_event(
         task_id,
         TaskStatus.scraper_running,
         timestamp,
@@ -266,7 +331,7 @@ def task_scraper_completed_event_handler(task_id, payload):
     exit_code = payload.get("exit_code")
     logger.info(f"Task Container Finished: {task_id}, {exit_code}")
 
-    save_event(
+    return save_event(
         task_id,
         TaskStatus.scraper_completed,
         timestamp,
@@ -281,7 +346,7 @@ def task_scraper_killed_event_handler(task_id, payload):
     timeout = payload.get("timeout")
     logger.info(f"Task Container Killed: {task_id}, after {timeout}s")
 
-    save_event(task_id, TaskStatus.scraper_killed, timestamp, timeout=timeout)
+    return save_event(task_id, TaskStatus.scraper_killed, timestamp, timeout=timeout)
 
 
 def task_created_file_event_handler(task_id, payload):
@@ -290,7 +355,7 @@ def task_created_file_event_handler(task_id, payload):
     timestamp = get_timestamp_from_event(payload)
     logger.info(f"Task created file: {task_id}, {file['name']}, {file['size']}")
 
-    save_event(task_id, TaskStatus.created_file, timestamp, file=file)
+    return save_event(task_id, TaskStatus.created_file, timestamp, file=file)
 
 
 def task_uploaded_file_event_handler(task_id, payload):
@@ -298,7 +363,7 @@ def task_uploaded_file_event_handler(task_id, payload):
     timestamp = get_timestamp_from_event(payload)
     logger.info(f"Task uploaded file: {task_id}, {file['name']}")
 
-    save_event(task_id, TaskStatus.uploaded_file, timestamp, file=file)
+    return save_event(task_id, TaskStatus.uploaded_file, timestamp, file=file)
 
 
 def task_failed_file_event_handler(task_id, payload):
@@ -306,7 +371,7 @@ def task_failed_file_event_handler(task_id, payload):
     timestamp = get_timestamp_from_event(payload)
     logger.info(f"Task file upload failed: {task_id}, {file['name']}")
 
-    save_event(task_id, TaskStatus.failed_file, timestamp, file=file)
+    return save_event(task_id, TaskStatus.failed_file, timestamp, file=file)
 
 
 def task_checked_file_event_handler(task_id, payload):
@@ -319,7 +384,7 @@ def task_checked_file_event_handler(task_id, payload):
     timestamp = get_timestamp_from_event(payload)
     logger.info(f"Task checked file: {task_id}, {file['name']}")
 
-    save_event(task_id, TaskStatus.checked_file, timestamp, file=file)
+    return save_event(task_id, TaskStatus.checked_file, timestamp, file=file)
 
 
 def task_update_event_handler(task_id, payload):
@@ -327,7 +392,7 @@ def task_update_event_handler(task_id, payload):
     log = payload.get("log")  # filename / S3 key of text file at upload_uri[logs]
     logger.info(f"Task update: {task_id}, log: {log}")
 
-    save_event(task_id, TaskStatus.update, timestamp, log=log)
+    return save_event(task_id, TaskStatus.update, timestamp, log=log)
 
 
 def handle_others(self, event):
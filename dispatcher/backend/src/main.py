@@ -2,9 +2,11 @@ import os
 import pathlib
 import logging
 
-from flask import Flask, render_template, Response, make_response, redirect
+from flask import Flask, render_template, Response, make_response, redirect, g
 from flask_cors import CORS
 
+from common.mongo import ROUNDTRIPS
+
 from routes import (
     API_PATH,
     auth,
@@ -40,6 +42,26 @@ handler.setFormatter(logging.Formatter("[%(asctime)s: %(levelname)s] %(message)s
 logger.addHandler(handler)
 
 
+@application.before_request
+def reset_mongo_roundtrips():
+    ROUNDTRIPS.reset()
+
+
+@application.after_request
+def add_mongo_roundtrips(response):
+    # number of MongoDB commands issued while serving this request
+    response.headers["X-Mongo-Roundtrips"] = str(ROUNDTRIPS.count)
+    return response
+
+
+@application.after_request
+def add_server_timing(response):
+    # time spent verifying access token (ms)
+    if "auth_duration" in g:
+        response.headers.add("Server-Timing", f"auth;dur={g.auth_duration * 1000:.3f}")
+    return response
+
+
 @application.route(f"{API_PATH}/openapi.yaml")
 def openapi():
     fname = "openapi_v1.yaml"
@@ -76,8 +98,13 @@ application.register_blueprint(platforms.Blueprint())
 
 errors.register_handlers(application)
 
-logger.info(f"connected broadcaster to {BROADCASTER.uri}")
-BROADCASTER.broadcast_dispatcher_started()
+
+@application.before_first_request
+def announce_started():
+    # from serving processes only: a sender thread started in uwsgi's master
+    # would be running when it forks workers
+    logger.info(f"connected broadcaster to {BROADCASTER.uri}")
+    BROADCASTER.broadcast_dispatcher_started()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" one-off maintenance operations on the database
+
+    backfill-durations: recompute schedules' `duration` from their tasks
+    check-indexes: ensure frequent queries are served by indexes
+    migrate-updated-at: set tasks' `updated_at` from their last event """
+
+import sys
+import logging
+import argparse
+
+from common.mongo import Schedules, Tasks
+from utils.indexes import check_queries
+from utils.scheduling import update_schedule_duration
+
+NAME = "maintenance"
+
+logger = logging.getLogger(NAME)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(
+    logging.Formatter("[%(name)s - %(asctime)s: %(levelname)s] %(message)s")
+)
+logger.addHandler(handler)
+
+
+def backfill_durations(schedule_names=None):
+    """recompute `duration` (workers and rolling stats) of schedules from tasks"""
+    query = {"name": {"$in": schedule_names}} if schedule_names else {}
+    nb_schedules = 0
+    for schedule in Schedules().find(query, {"name": 1}):
+        logger.debug(f"backfilling duration of {schedule['name']}")
+        update_schedule_duration(schedule["name"])
+        nb_schedules += 1
+    logger.info(f":: backfilled duration of {nb_schedules} schedule(s)")
+    return 0
+
+
+def check_indexes():
+    """whether all canonical queries are served by an index (explain)"""
+    failures = check_queries()
+    if failures:
+        logger.error(f":: {len(failures)} query(ies) would scan whole collection")
+        return 1
+    logger.info(":: all queries are served by indexes")
+    return 0
+
+
+def migrate_updated_at():
+    """set `updated_at` on tasks missing it (timestamp of their last event)"""
+    result = Tasks().update_many(
+        {"updated_at": {"$exists": False}},
+        [
+            {
+                "$set": {
+                    "updated_at": {"$arrayElemAt": ["$events.timestamp", -1]},
+                    "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                }
+            }
+        ],
+    )
+    logger.info(f":: set updated_at on {result.modified_count} task(s)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=NAME)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    durations = subparsers.add_parser(
+        "backfill-durations", help="Recompute schedules' duration from their tasks"
+    )
+    durations.add_argument(
+        "schedule_names",
+        nargs="*",
+        help="Only backfill those schedules (all schedules if omitted)",
+    )
+
+    subparsers.add_parser(
+        "check-indexes", help="Fail if a frequent query doesn't use an index"
+    )
+
+    subparsers.add_parser(
+        "migrate-updated-at", help="Set tasks' updated_at from their last event"
+    )
+
+    args = parser.parse_args()
+    if args.command == "backfill-durations":
+        return backfill_durations(args.schedule_names)
+    if args.command == "check-indexes":
+        return check_indexes()
+    if args.command == "migrate-updated-at":
+        return migrate_updated_at()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
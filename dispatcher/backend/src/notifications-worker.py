@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" delivers queued notifications (mailgun, slack, webhooks)
+
+    Notifications are queued by the API (common.notifications.handle_notification)
+    and processed by NOTIFICATIONS_WORKERS threads, each reusing its HTTP
+    connections. Failed deliveries are retried with backoff then dead-lettered. """
+
+import signal
+import logging
+import threading
+
+import requests
+
+from common.constants import NOTIFICATIONS_WORKERS
+from common.notifications import claim_notification, process_notification
+
+NAME = "notifications-worker"
+# seconds to wait when there's nothing to deliver
+POLL_INTERVAL = 5
+
+logger = logging.getLogger(NAME)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(
+    logging.Formatter("[%(name)s - %(asctime)s: %(levelname)s] %(message)s")
+)
+logger.addHandler(handler)
+# include delivery failures logged by common.notifications
+logging.getLogger("common.notifications").addHandler(handler)
+
+should_stop = threading.Event()
+
+
+def work():
+    # requests sessions are not thread-safe: one per thread
+    session = requests.Session()
+    while not should_stop.is_set():
+        try:
+            notification = claim_notification()
+            if not notification:
+                should_stop.wait(POLL_INTERVAL)
+                continue
+            status = process_notification(notification, session)
+            logger.info(
+                f"{notification['event']} notification for "
+                f"{notification['task_id']}: {status}"
+            )
+        except Exception as exc:
+            logger.error(f"unable to process notifications: {exc}")
+            logger.exception(exc)
+            should_stop.wait(POLL_INTERVAL)
+    session.close()
+
+
+def main():
+    logger.info(f"starting {NOTIFICATIONS_WORKERS} workers")
+
+    def stop(signum, frame):
+        logger.info("stopping after current deliveries")
+        should_stop.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    workers = [
+        threading.Thread(target=work, name=f"notifier-{index}")
+        for index in range(NOTIFICATIONS_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    # main thread must be free to receive signals
+    while any(worker.is_alive() for worker in workers):
+        for worker in workers:
+            worker.join(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@
 # -*- coding: utf-8 -*-
 # vim: ai ts=4 sts=4 et sw=4 nu
 
+import time
 import logging
+import argparse
 
 from utils.scheduling import request_tasks_using_schedule
 
@@ -16,11 +18,28 @@ handler.setFormatter(
 logger.addHandler(handler)
 
 
-def main():
-    logger.info("running periodic scheduler")
+def main(dry_run=False):
+    logger.info(f"running periodic scheduler{' (dry-run)' if dry_run else ''}")
 
-    request_tasks_using_schedule()
+    started_on = time.monotonic()
+    requested_tasks = request_tasks_using_schedule(dry_run=dry_run)
+    duration = time.monotonic() - started_on
+
+    logger.info(
+        f"{'would have requested' if dry_run else 'requested'} "
+        f"{len(requested_tasks)} task(s) in {duration:.3f}s"
+    )
+    for requested_task in requested_tasks:
+        logger.info(f".. {requested_task['schedule_name']}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(prog="periodic-scheduler")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        default=False,
+        help="Report what would be requested without requesting anything",
+    )
+    args = parser.parse_args()
+    main(dry_run=args.dry_run)
@@ -10,6 +10,7 @@ import pymongo
 from common import getnow
 from common.mongo import Tasks
 from common.enum import TaskStatus
+from utils.worker_events import record_worker_event
 
 # constants
 ONE_MN = 60
@@ -56,18 +57,11 @@ def history_cleanup():
 
     task_ids_to_delete = []
     for schedule_name in schedules_with_too_much_tasks:
-        cursor = Tasks().aggregate(
-            [
-                {"$match": {"schedule_name": schedule_name}},
-                {
-                    "$project": {
-                        "schedule_name": 1,
-                        "updated_at": {"$arrayElemAt": ["$events.timestamp", -1]},
-                    }
-                },
-                {"$sort": {"updated_at": pymongo.DESCENDING}},
-                {"$skip": HISTORY_TASK_PER_SCHEDULE},
-            ]
+        cursor = (
+            Tasks()
+            .find({"schedule_name": schedule_name}, {"_id": 1})
+            .sort("updated_at", pymongo.DESCENDING)
+            .skip(HISTORY_TASK_PER_SCHEDULE)
         )
         task_ids_to_delete += [t["_id"] for t in cursor]
 
@@ -79,6 +73,8 @@ def status_to_cancel(now, status, timeout):
     logger.info(f":: canceling tasks `{status}` for more than {timeout}s")
     ago = now - datetime.timedelta(seconds=timeout)
     query = {"status": status, f"timestamp.{status}": {"$lte": ago}}
+    task_ids = [task["_id"] for task in Tasks().find(query, {"_id": 1})]
+    query["_id"] = {"$in": task_ids}
     result = Tasks().update_many(
         query,
         {
@@ -86,6 +82,7 @@ def status_to_cancel(now, status, timeout):
                 "status": TaskStatus.canceled,
                 "canceled_by": NAME,
                 f"timestamp.{TaskStatus.canceled}": now,
+                "updated_at": now,
             },
             "$push": {
                 "events": {
@@ -93,10 +90,25 @@ def status_to_cancel(now, status, timeout):
                     "timestamp": now,
                 }
             },
+            "$inc": {"version": 1},
         },
     )
     logger.info(f"::: canceled {result.modified_count}/{result.matched_count} tasks")
 
+    # let workers stop those if they're still running them. Some tasks might have
+    # left `status` between find and update: only those we've actually canceled
+    canceled = Tasks().find(
+        {
+            "_id": {"$in": task_ids},
+            "canceled_by": NAME,
+            f"timestamp.{TaskStatus.canceled}": now,
+        },
+        {"_id": 1, "worker": 1},
+    )
+    for task in canceled:
+        if task.get("worker"):
+            record_worker_event(task["worker"], "cancel-task", {"_id": task["_id"]})
+
 
 def staled_statuses():
     """set the status for tasks in an unfinished state"""
@@ -127,7 +139,8 @@ def staled_statuses():
             "$set": {
                 "status": TaskStatus.succeeded,
                 f"timestamp.{TaskStatus.succeeded}": now,
-            }
+            },
+            "$inc": {"version": 1},
         },
     )
     logger.info(f"::: succeeded {result.modified_count}/{result.matched_count} tasks")
@@ -135,7 +148,13 @@ def staled_statuses():
     query_failed.update(query)
     result = Tasks().update_many(
         query_failed,
-        {"$set": {"status": TaskStatus.failed, f"timestamp.{TaskStatus.failed}": now}},
+        {
+            "$set": {
+                "status": TaskStatus.failed,
+                f"timestamp.{TaskStatus.failed}": now,
+            },
+            "$inc": {"version": 1},
+        },
     )
     logger.info(f"::: failed {result.modified_count}/{result.matched_count} tasks")
 
@@ -1,17 +1,13 @@
 import base64
-import pathlib
 import logging
-import tempfile
 import datetime
 import binascii
-import subprocess
 from uuid import uuid4
 
 from flask import request, jsonify
 
 from routes import errors
 from common.constants import (
-    OPENSSL_BIN,
     MESSAGE_VALIDITY,
     REFRESH_TOKEN_EXPIRY,
     TOKEN_EXPIRY,
@@ -19,6 +15,7 @@ from common.constants import (
 from common import getnow
 from common.mongo import Users, RefreshTokens
 from utils.token import AccessToken
+from utils.ssh import find_signing_key
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +37,7 @@ def asymmetric_key_auth():
         signature = base64.b64decode(request.headers["X-SSHAuth-Signature"])
         username, timestamp = message.split(":", 1)
         timestamp = datetime.datetime.fromisoformat(timestamp)
+        signed_data = message.encode("ASCII")
     except KeyError as exc:
         raise errors.BadRequest("Missing header for `{}`".format("".join(exc.args[:1])))
     except binascii.Error:
@@ -63,47 +61,7 @@ def asymmetric_key_auth():
     ssh_keys = user.pop("ssh_keys", [])
 
     # check that the message was signed with a known private key
-    authenticated = False
-    with tempfile.TemporaryDirectory() as tmp_dirname:
-        tmp_dir = pathlib.Path(tmp_dirname)
-        message_path = tmp_dir.joinpath("message")
-        signatured_path = tmp_dir.joinpath(f"{message_path.name}.sig")
-
-        with open(message_path, "w", encoding="ASCII") as fp:
-            fp.write(message)
-
-        with open(signatured_path, "wb") as fp:
-            fp.write(signature)
-
-        for ssh_key in ssh_keys:
-            pkcs8_data = ssh_key.get("pkcs8_key")
-            if not pkcs8_data:  # User record has no PKCS8 version
-                continue
-
-            pkcs8_key = tmp_dir.joinpath("pubkey")
-            with open(pkcs8_key, "w") as fp:
-                fp.write(pkcs8_data)
-
-            pkey_util = subprocess.run(
-                [
-                    OPENSSL_BIN,
-                    "pkeyutl",
-                    "-verify",
-                    "-pubin",
-                    "-inkey",
-                    str(pkcs8_key),
-                    "-in",
-                    str(message_path),
-                    "-sigfile",
-                    signatured_path,
-                ],
-                capture_output=True,
-                text=True,
-            )
-            if pkey_util.returncode == 0:  # signature verified
-                authenticated = True
-                break
-    if not authenticated:
+    if not find_signing_key(ssh_keys, signed_data, signature):
         raise errors.Unauthorized("Could not find matching key for signature")
 
     # we're now authenticated ; generate tokens
@@ -1,6 +1,45 @@
+import threading
+import collections
 from http import HTTPStatus
 
-from flask import request, Response, Blueprint
+from flask import request, jsonify, Response, Blueprint
+
+from common.constants import RESPONSE_CACHE_SIZE
+
+
+class ResponseCache:
+    """bounded LRU of serialized response bodies, keyed by their ETag
+
+    ETags include the version of the document they represent so a write
+    (which increments it) makes previous entries unreachable."""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.bodies = collections.OrderedDict()
+
+    def get(self, etag):
+        with self.lock:
+            body = self.bodies.get(etag)
+            if body is not None:
+                self.bodies.move_to_end(etag)
+            return body
+
+    def set(self, etag, body):
+        if not self.size:
+            return
+        with self.lock:
+            self.bodies[etag] = body
+            self.bodies.move_to_end(etag)
+            while len(self.bodies) > self.size:
+                self.bodies.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.bodies.clear()
+
+
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_SIZE)
 
 
 class BaseRoute:
@@ -34,6 +73,25 @@ class BaseRoute:
     def delete(self, *args, **kwargs):
         return Response(status=HTTPStatus.METHOD_NOT_ALLOWED)
 
+    @staticmethod
+    def cached_response(etag: str, fetch):
+        """JSON response for a versioned resource identified by etag
+
+        304 Not Modified if client has it, cached body if any or `fetch()`ed one"""
+        if request.if_none_match.contains(etag):
+            response = Response(status=HTTPStatus.NOT_MODIFIED)
+        else:
+            body = RESPONSE_CACHE.get(etag)
+            if body is None:
+                response = jsonify(fetch())
+                RESPONSE_CACHE.set(etag, response.get_data())
+            else:
+                response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        # clients must revalidate before using their copy
+        response.cache_control.no_cache = True
+        return response
+
 
 class BaseBlueprint(Blueprint):
     def register_route(self, route: BaseRoute):
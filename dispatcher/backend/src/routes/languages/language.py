@@ -1,8 +1,9 @@
-from flask import request, jsonify
+from flask import request
 
-from common.mongo import Schedules
 from routes.base import BaseRoute
+from routes.utils import make_conditional_response
 from common.schemas.parameters import SkipLimit500Schema
+from utils.facets import FACETS
 
 
 class LanguagesRoute(BaseRoute):
@@ -16,42 +17,19 @@ class LanguagesRoute(BaseRoute):
         request_args = SkipLimit500Schema().load(request.args.to_dict())
         skip, limit = request_args["skip"], request_args["limit"]
 
-        group = {
-            "$group": {
-                "_id": "$language.code",
-                "name_en": {"$first": "$language.name_en"},
-                "name_native": {"$first": "$language.name_native"},
-            }
-        }
+        languages, etag = FACETS.get("languages")
 
-        try:
-            nb_languages = next(Schedules().aggregate([group, {"$count": "count"}]))[
-                "count"
-            ]
-        except StopIteration:
-            nb_languages = 0
-
-        if nb_languages == 0:
-            languages = []
-        else:
-            pipeline = [
-                group,
-                {"$sort": {"name_en": 1}},
-                {"$skip": skip},
-                {"$limit": limit},
-            ]
-            languages = [
-                {
-                    "code": s["_id"],
-                    "name_en": s["name_en"],
-                    "name_native": s["name_native"],
-                }
-                for s in Schedules().aggregate(pipeline)
-            ]
-
-        return jsonify(
+        return make_conditional_response(
             {
-                "meta": {"skip": skip, "limit": limit, "count": nb_languages},
-                "items": languages,
-            }
+                "meta": {"skip": skip, "limit": limit, "count": len(languages)},
+                "items": [
+                    {
+                        "code": language["code"],
+                        "name_en": language["name_en"],
+                        "name_native": language["name_native"],
+                    }
+                    for language in languages[skip : skip + limit]
+                ],
+            },
+            f"{etag}-{skip}-{limit}",
         )
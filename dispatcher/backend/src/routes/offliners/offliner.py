@@ -1,10 +1,9 @@
-from flask import jsonify
-
 from common.enum import Offliner
 from routes import url_object_id
 from routes.base import BaseRoute
 from routes.errors import NotFound
-from common.schemas.models import ScheduleConfigSchema
+from routes.utils import make_conditional_response
+from utils.offliners import get_offliner_definition
 
 
 class offlinersRoute(BaseRoute):
@@ -17,7 +16,7 @@ class offlinersRoute(BaseRoute):
 
         offliners = Offliner.all()
 
-        return jsonify(
+        return make_conditional_response(
             {
                 "meta": {"skip": 0, "limit": 100, "count": len(offliners)},
                 "items": offliners,
@@ -33,9 +32,8 @@ class offlinerRoute(BaseRoute):
     @url_object_id("offliner")
     def get(self, offliner: str, *args, **kwargs):
 
-        if offliner not in Offliner.all():
+        definition = get_offliner_definition(offliner)
+        if definition is None:
             raise NotFound()
 
-        schema = ScheduleConfigSchema.get_offliner_schema(offliner)()
-
-        return jsonify(schema.to_desc())
+        return make_conditional_response(definition.desc, definition.etag)
@@ -7,19 +7,23 @@ from flask import request, jsonify, make_response, Response
 from marshmallow import ValidationError
 
 from common import getnow
-from common.utils import task_event_handler
+from common.enum import TaskStatus
+from common.utils import task_event_handler, reserve_requested_task
 from common.mongo import RequestedTasks, Schedules, Workers
 from errors.http import InvalidRequestJSON, TaskNotFound
 from routes import authenticate, url_object_id, auth_info_if_supplied, require_perm
 from routes.base import BaseRoute
+from routes.utils import paginate, get_fields
 from routes.errors import NotFound
 from utils.broadcaster import BROADCASTER
+from utils.matchmaking import MATCHMAKING
 from utils.token import AccessToken
 from common.schemas.parameters import (
     RequestedTaskSchema,
     NewRequestedTaskSchema,
     UpdateRequestedTaskSchema,
     WorkerRequestedTaskSchema,
+    RequestedTaskFieldsSchema,
 )
 from utils.scheduling import request_a_schedule, find_requested_task_for
 
@@ -44,7 +48,6 @@ def list_of_requested_tasks(token: AccessToken.Payload = None):
     request_args = RequestedTaskSchema().load(request_args)
 
     # unpack query parameter
-    skip, limit = request_args["skip"], request_args["limit"]
     schedule_names = request_args["schedule_name"]
     priority = request_args.get("priority")
 
@@ -67,41 +70,34 @@ def list_of_requested_tasks(token: AccessToken.Payload = None):
     if matching_offliners:
         query["config.task_name"] = {"$in": matching_offliners}
 
-    cursor = (
-        RequestedTasks()
-        .find(
-            query,
-            {
-                "_id": 1,
-                "status": 1,
-                "schedule_name": 1,
-                "config.task_name": 1,
-                "config.resources": 1,
-                "timestamp.requested": 1,
-                "requested_by": 1,
-                "priority": 1,
-                "worker": 1,
-            },
-        )
-        .sort(
-            [
-                ("priority", pymongo.DESCENDING),
-                ("timestamp.reserved", pymongo.DESCENDING),
-                ("timestamp.requested", pymongo.DESCENDING),
-            ]
-        )
-        .skip(skip)
-        .limit(limit)
-    )
-    count = RequestedTasks().count_documents(query)
-
-    return jsonify(
+    requested_tasks, meta = paginate(
+        RequestedTasks(),
+        query,
         {
-            "meta": {"skip": skip, "limit": limit, "count": count},
-            "items": [task for task in cursor],
-        }
+            "_id": 1,
+            "status": 1,
+            "schedule_name": 1,
+            "config.task_name": 1,
+            "config.resources": 1,
+            "timestamp.requested": 1,
+            "timestamp.reserved": 1,
+            "requested_by": 1,
+            "priority": 1,
+            "worker": 1,
+        },
+        sort=[
+            ("priority", pymongo.DESCENDING),
+            ("timestamp.reserved", pymongo.DESCENDING),
+            ("timestamp.requested", pymongo.DESCENDING),
+        ],
+        skip=request_args["skip"],
+        limit=request_args["limit"],
+        cursor=request_args.get("cursor"),
+        count=request_args["count"],
     )
 
+    return jsonify({"meta": meta, "items": requested_tasks})
+
 
 class RequestedTasksRoute(BaseRoute):
     rule = "/"
@@ -139,6 +135,8 @@ class RequestedTasksRoute(BaseRoute):
 
             requested_tasks.append(rq_task)
 
+        if requested_tasks:
+            MATCHMAKING.invalidate()
         if len(requested_tasks) > 1:
             BROADCASTER.broadcast_requested_tasks(requested_tasks)
         elif len(requested_tasks) == 1:
@@ -162,7 +160,10 @@ class RequestedTasksRoute(BaseRoute):
 class RequestedTasksForWorkers(BaseRoute):
     rule = "/worker"
     name = "requested_tasks_workers"
-    methods = ["GET"]
+    methods = ["GET", "POST"]
+
+    # number of candidates tried before giving up when others reserve them first
+    max_claim_attempts = 5
 
     @authenticate
     def get(self, token: AccessToken.Payload):
@@ -195,6 +196,51 @@ class RequestedTasksForWorkers(BaseRoute):
             }
         )
 
+    @authenticate
+    @require_perm("tasks", "create")
+    def post(self, token: AccessToken.Payload):
+        """reserve best requested task for worker's available resources, auth-only
+
+        Candidate is moved to tasks atomically ; should another worker reserve it
+        first, next candidate is tried right away"""
+
+        request_args = WorkerRequestedTaskSchema().load(request.args.to_dict())
+        worker_name = request_args["worker"]
+
+        Workers().update_one(
+            {"name": worker_name, "username": token.username},
+            {"$set": {"last_seen": getnow()}},
+        )
+
+        nb_lost = 0
+        for _ in range(self.max_claim_attempts):
+            requested_task = find_requested_task_for(
+                token.username,
+                worker_name,
+                request_args["avail_cpu"],
+                request_args["avail_memory"],
+                request_args["avail_disk"],
+            )
+            if requested_task is None:
+                break
+
+            task = reserve_requested_task(requested_task["_id"], worker_name)
+            if task is None:
+                logger.debug(f"{requested_task['_id']} reserved by another worker")
+                # next candidate from same snapshot, reloaded once we're done
+                MATCHMAKING.discard(requested_task["_id"])
+                nb_lost += 1
+                continue
+
+            BROADCASTER.broadcast_updated_task(
+                task["_id"], TaskStatus.reserved, {"worker": worker_name}
+            )
+            return make_response(jsonify(task), HTTPStatus.CREATED)
+
+        if nb_lost:
+            MATCHMAKING.invalidate()
+        return Response(status=HTTPStatus.NO_CONTENT)
+
 
 class RequestedTaskRoute(BaseRoute):
     rule = "/<string:requested_task_id>"
@@ -204,7 +250,11 @@ class RequestedTaskRoute(BaseRoute):
     @url_object_id("requested_task_id")
     def get(self, requested_task_id: str):
 
-        requested_task = RequestedTasks().find_one({"_id": requested_task_id})
+        fields = get_fields(RequestedTaskFieldsSchema)
+        requested_task = RequestedTasks().find_one(
+            {"_id": requested_task_id},
+            None if fields is None else {field: 1 for field in fields},
+        )
         if requested_task is None:
             raise TaskNotFound()
 
@@ -229,6 +279,7 @@ class RequestedTaskRoute(BaseRoute):
             {"$set": {"priority": request_json.get("priority", 0)}},
         )
         if update.modified_count:
+            MATCHMAKING.invalidate()
             return Response(status=HTTPStatus.ACCEPTED)
         return Response(status=HTTPStatus.OK)
 
@@ -243,4 +294,5 @@ class RequestedTaskRoute(BaseRoute):
             raise TaskNotFound()
 
         result = RequestedTasks().delete_one(query)
+        MATCHMAKING.invalidate()
         return jsonify({"deleted": result.deleted_count})
@@ -5,6 +5,7 @@ from .schedule import (
     SchedulesRoute,
     ScheduleImageNames,
     SchedulesBackupRoute,
+    SchedulesFacetsRoute,
     ScheduleCloneRoute,
 )
 
@@ -18,3 +19,4 @@ class Blueprint(BaseBlueprint):
         self.register_route(ScheduleImageNames())
         self.register_route(ScheduleCloneRoute())
         self.register_route(SchedulesBackupRoute())
+        self.register_route(SchedulesFacetsRoute())
@@ -1,22 +1,36 @@
 import logging
 from http import HTTPStatus
 
+import pymongo
 import requests
 from flask import request, jsonify, Response, make_response
 from marshmallow import ValidationError
 
 from common.mongo import Schedules, Tasks, RequestedTasks
 from utils.token import AccessToken
-from utils.offliners import expanded_config
+from utils.offliners import expanded_config, get_flags_schema
 from errors.http import InvalidRequestJSON, ScheduleNotFound, ResourceNotFound
 from routes.errors import BadRequest
 from routes.schedules.base import ScheduleQueryMixin
 from routes import authenticate, require_perm, auth_info_if_supplied
 from routes.base import BaseRoute
-from routes.utils import remove_secrets_from_response
-from common.schemas.models import ScheduleConfigSchema, ScheduleSchema
-from common.schemas.parameters import SchedulesSchema, UpdateSchema, CloneSchema
+from routes.utils import (
+    remove_secrets_from_response,
+    paginate,
+    make_conditional_response,
+    get_fields,
+)
+from common.schemas.models import ScheduleSchema
+from common.schemas.parameters import (
+    SchedulesSchema,
+    UpdateSchema,
+    CloneSchema,
+    ScheduleFieldsSchema,
+)
 from utils.scheduling import get_default_duration
+from utils.facets import FACETS
+from utils.json import get_etag_for
+from utils.matchmaking import MATCHMAKING
 
 logger = logging.getLogger(__name__)
 
@@ -34,9 +48,7 @@ class SchedulesRoute(BaseRoute):
             request_args[key] = request.args.getlist(key)
         request_args = SchedulesSchema().load(request_args)
 
-        skip, limit, categories, tags, lang, name = (
-            request_args.get("skip"),
-            request_args.get("limit"),
+        categories, tags, lang, name = (
             request_args.get("category"),
             request_args.get("tag"),
             request_args.get("lang"),
@@ -63,14 +75,19 @@ class SchedulesRoute(BaseRoute):
             "config.task_name": 1,
             "most_recent_task": 1,
         }
-        cursor = Schedules().find(query, projection).skip(skip).limit(limit)
-        count = Schedules().count_documents(query)
-        schedules = [schedule for schedule in cursor]
-
-        return jsonify(
-            {"meta": {"skip": skip, "limit": limit, "count": count}, "items": schedules}
+        schedules, meta = paginate(
+            Schedules(),
+            query,
+            projection,
+            sort=[("name", pymongo.ASCENDING)],
+            skip=request_args["skip"],
+            limit=request_args["limit"],
+            cursor=request_args.get("cursor"),
+            count=request_args["count"],
         )
 
+        return make_conditional_response({"meta": meta, "items": schedules})
+
     @authenticate
     @require_perm("schedules", "create")
     def post(self, token: AccessToken.Payload):
@@ -89,10 +106,26 @@ class SchedulesRoute(BaseRoute):
 
         document["duration"] = {"default": get_default_duration(), "workers": {}}
         schedule_id = Schedules().insert_one(document).inserted_id
+        FACETS.invalidate()
 
         return make_response(jsonify({"_id": str(schedule_id)}), HTTPStatus.CREATED)
 
 
+class SchedulesFacetsRoute(BaseRoute):
+    rule = "/facets/"
+    name = "schedules_facets"
+    methods = ["GET"]
+
+    def get(self):
+        """tags, languages, categories and offliners of schedules, with counts"""
+
+        facets = FACETS.get_all()
+        return make_conditional_response(
+            {name: values for name, (values, _) in facets.items()},
+            get_etag_for([etag for _, etag in facets.values()]),
+        )
+
+
 class SchedulesBackupRoute(BaseRoute):
     rule = "/backup/"
     name = "schedules_backup"
@@ -117,15 +150,23 @@ class ScheduleRoute(BaseRoute, ScheduleQueryMixin):
         """Get schedule object."""
 
         query = {"name": schedule_name}
-        schedule = Schedules().find_one(query, {"_id": 0})
+        with_secrets = bool(token and token.get_permission("schedules", "update"))
+        fields = get_fields(ScheduleFieldsSchema)
+        projection = {field: 1 for field in fields or []}
+        projection["_id"] = 0
+
+        schedule = Schedules().find_one(query, projection)
         if schedule is None:
             raise ScheduleNotFound()
 
-        schedule["config"] = expanded_config(schedule["config"])
-        if not token or not token.get_permission("schedules", "update"):
+        if fields is None or "config" in fields:
+            schedule["config"] = expanded_config(schedule["config"])
+        if not with_secrets:
             remove_secrets_from_response(schedule)
 
-        return jsonify(schedule)
+        # not in response cache: version is bumped by each of its tasks' events
+        # (most_recent_task, duration) so it would hardly ever be reused
+        return make_conditional_response(schedule)
 
     @authenticate
     @require_perm("schedules", "update")
@@ -149,16 +190,12 @@ class ScheduleRoute(BaseRoute, ScheduleQueryMixin):
                     raise ValidationError(
                         "Can't update offliner without updating flags"
                     )
-                flags_schema = ScheduleConfigSchema.get_offliner_schema(
-                    update["task_name"]
-                )
+                flags_schema = get_flags_schema(update["task_name"])
             else:
-                flags_schema = ScheduleConfigSchema.get_offliner_schema(
-                    schedule["config"]["task_name"]
-                )
+                flags_schema = get_flags_schema(schedule["config"]["task_name"])
 
             if "flags" in update:
-                flags_schema().load(update["flags"])
+                flags_schema.load(update["flags"])
         except ValidationError as e:
             raise InvalidRequestJSON(e.messages)
 
@@ -182,19 +219,27 @@ class ScheduleRoute(BaseRoute, ScheduleQueryMixin):
         }
 
         matched_count = (
-            Schedules().update_one(query, {"$set": mongo_update}).matched_count
+            Schedules()
+            .update_one(query, {"$set": mongo_update, "$inc": {"version": 1}})
+            .matched_count
         )
 
         if matched_count:
+            FACETS.invalidate()
             tasks_query = {"schedule_name": schedule_name}
             if "name" in update:
                 Tasks().update_many(
-                    tasks_query, {"$set": {"schedule_name": update["name"]}}
+                    tasks_query,
+                    {
+                        "$set": {"schedule_name": update["name"]},
+                        "$inc": {"version": 1},
+                    },
                 )
 
                 RequestedTasks().update_many(
                     tasks_query, {"$set": {"schedule_name": update["name"]}}
                 )
+                MATCHMAKING.invalidate()
 
             return Response(status=HTTPStatus.NO_CONTENT)
 
@@ -210,6 +255,7 @@ class ScheduleRoute(BaseRoute, ScheduleQueryMixin):
 
         if result.deleted_count == 0:
             raise ScheduleNotFound()
+        FACETS.invalidate()
         return Response(status=HTTPStatus.NO_CONTENT)
 
 
@@ -290,5 +336,6 @@ class ScheduleCloneRoute(BaseRoute, ScheduleQueryMixin):
 
         # insert document
         schedule_id = Schedules().insert_one(schedule).inserted_id
+        FACETS.invalidate()
 
         return make_response(jsonify({"_id": str(schedule_id)}), HTTPStatus.CREATED)
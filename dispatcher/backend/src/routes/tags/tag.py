@@ -1,8 +1,9 @@
-from flask import request, jsonify
+from flask import request
 
-from common.mongo import Schedules
 from routes.base import BaseRoute
+from routes.utils import make_conditional_response
 from common.schemas.parameters import SkipLimitSchema
+from utils.facets import FACETS
 
 
 class tagsRoute(BaseRoute):
@@ -16,30 +17,12 @@ class tagsRoute(BaseRoute):
         request_args = SkipLimitSchema().load(request.args.to_dict())
         skip, limit = request_args["skip"], request_args["limit"]
 
-        base_pipeline = [
-            {"$project": {"_id": 0, "tags": 1}},
-            {"$unwind": "$tags"},
-            {"$group": {"_id": "$tags"}},
-        ]
+        tags, etag = FACETS.get("tags")
 
-        try:
-            nb_tags = next(
-                Schedules().aggregate(base_pipeline + [{"$count": "count"}])
-            )["count"]
-        except StopIteration:
-            nb_tags = 0
-
-        if nb_tags == 0:
-            tags = []
-        else:
-            pipeline = base_pipeline + [
-                {"$sort": {"_id": 1}},
-                {"$skip": skip},
-                {"$limit": limit},
-            ]
-
-            tags = [t["_id"] for t in Schedules().aggregate(pipeline)]
-
-        return jsonify(
-            {"meta": {"skip": skip, "limit": limit, "count": nb_tags}, "items": tags}
+        return make_conditional_response(
+            {
+                "meta": {"skip": skip, "limit": limit, "count": len(tags)},
+                "items": [tag["value"] for tag in tags[skip : skip + limit]],
+            },
+            f"{etag}-{skip}-{limit}",
         )
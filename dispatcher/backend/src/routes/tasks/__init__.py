@@ -1,6 +1,6 @@
 from routes import API_PATH
 from routes.base import BaseBlueprint
-from routes.tasks.task import TasksRoute, TaskRoute, TaskCancelRoute
+from routes.tasks.task import TasksRoute, TasksStatusRoute, TaskRoute, TaskCancelRoute
 
 
 class Blueprint(BaseBlueprint):
@@ -8,5 +8,6 @@ class Blueprint(BaseBlueprint):
         super().__init__("tasks", __name__, url_prefix=f"{API_PATH}/tasks")
 
         self.register_route(TasksRoute())
+        self.register_route(TasksStatusRoute())
         self.register_route(TaskRoute())
         self.register_route(TaskCancelRoute())
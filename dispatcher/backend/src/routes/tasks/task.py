@@ -6,22 +6,69 @@ import logging
 from http import HTTPStatus
 
 import pymongo
+from bson import ObjectId
 from flask import request, jsonify, make_response, Response
 from marshmallow import ValidationError
 
 from common.enum import TaskStatus
-from routes.utils import remove_secrets_from_response
+from routes.utils import (
+    remove_secrets_from_response,
+    paginate,
+    get_fields,
+    get_list_arg,
+    make_conditional_response,
+)
 from utils.token import AccessToken
 from utils.broadcaster import BROADCASTER
-from common.utils import task_event_handler
-from common.mongo import RequestedTasks, Tasks
+from utils.worker_events import record_worker_event
+from common.utils import task_event_handler, reserve_requested_task
+from common.mongo import Tasks
 from errors.http import InvalidRequestJSON, TaskNotFound
 from routes import authenticate, url_object_id, require_perm, auth_info_if_supplied
 from routes.base import BaseRoute
-from common.schemas.parameters import TasksSchema, TaskCreateSchema, TasKUpdateSchema
+from common.schemas.parameters import (
+    TasksSchema,
+    TaskCreateSchema,
+    TasKUpdateSchema,
+    TaskFieldsSchema,
+    TasksStatusSchema,
+)
 
 logger = logging.getLogger(__name__)
 
+# config fields secrets in container.command are found from
+SECRETS_CONFIG_FIELDS = ["config.task_name", "config.flags", "config.command"]
+
+
+def get_task_projection(fields: list, with_notification: bool, with_secrets: bool):
+    """find() projection for requested fields (all if None) and permissions"""
+    # exclude notification to not expose private information (privacy)
+    # on anonymous requests and requests for users without schedules_update
+    if fields is None:
+        return None if with_notification else {"notification": 0}
+    projection = {
+        field: 1 for field in fields if with_notification or field != "notification"
+    }
+    # subpaths only so they don't collide with requested config.* ones
+    if not with_secrets and "container" in fields and "config" not in fields:
+        projection.update({field: 1 for field in SECRETS_CONFIG_FIELDS})
+    return projection
+
+
+def clean_task(task: dict, fields: list, with_secrets: bool):
+    """remove (in-place) secrets and fields only fetched to find them"""
+    if not with_secrets:
+        remove_secrets_from_response(task)
+    if fields is not None and "config" not in fields and "config" in task:
+        task["config"] = {
+            key: value
+            for key, value in task["config"].items()
+            if f"config.{key}" in fields
+        }
+        if not task["config"]:
+            task.pop("config")
+    return task
+
 
 class TasksRoute(BaseRoute):
     rule = "/"
@@ -36,7 +83,6 @@ class TasksRoute(BaseRoute):
         request_args = TasksSchema().load(request_args)
 
         # unpack query parameter
-        skip, limit = request_args["skip"], request_args["limit"]
         statuses = request_args.get("status")
         schedule_name = request_args.get("schedule_name")
 
@@ -47,32 +93,51 @@ class TasksRoute(BaseRoute):
         if schedule_name:
             query["schedule_name"] = schedule_name
 
-        count = Tasks().count_documents(query)
-
-        cursor = Tasks().aggregate(
-            [
-                {"$match": query},
-                {
-                    "$project": {
-                        "schedule_name": 1,
-                        "status": 1,
-                        "timestamp": 1,
-                        "worker": 1,
-                        "config.resources": 1,
-                        "updated_at": {"$arrayElemAt": ["$events.timestamp", -1]},
-                    }
-                },
-                {"$sort": {"updated_at": pymongo.DESCENDING}},
-                {"$skip": skip},
-                {"$limit": limit},
-            ]
+        tasks, meta = paginate(
+            Tasks(),
+            query,
+            {
+                "schedule_name": 1,
+                "status": 1,
+                "timestamp": 1,
+                "worker": 1,
+                "config.resources": 1,
+                "updated_at": 1,
+            },
+            sort=[("updated_at", pymongo.DESCENDING)],
+            skip=request_args["skip"],
+            limit=request_args["limit"],
+            cursor=request_args.get("cursor"),
+            count=request_args["count"],
         )
 
-        tasks = list(cursor)
+        return jsonify({"meta": meta, "items": tasks})
 
-        return jsonify(
-            {"meta": {"skip": skip, "limit": limit, "count": count}, "items": tasks}
-        )
+
+class TasksStatusRoute(BaseRoute):
+    rule = "/status"
+    name = "tasks_status"
+    methods = ["GET"]
+
+    @auth_info_if_supplied
+    def get(self, token: AccessToken.Payload = None):
+        """status (and requested fields) of several tasks, missing ones omitted"""
+
+        ids = TasksStatusSchema().load({"id": get_list_arg("id")})["ids"]
+        with_notification = bool(token and token.get_permission("schedules", "update"))
+        with_secrets = bool(token and token.get_permission("tasks", "create"))
+        fields = sorted(set(get_fields(TaskFieldsSchema) or []) | {"status"})
+        projection = get_task_projection(fields, with_notification, with_secrets)
+
+        tasks = [
+            clean_task(task, fields, with_secrets)
+            for task in Tasks().find(
+                {"_id": {"$in": [ObjectId(task_id) for task_id in set(ids)]}},
+                projection,
+            )
+        ]
+
+        return make_conditional_response({"items": tasks})
 
 
 class TaskRoute(BaseRoute):
@@ -84,24 +149,27 @@ class TaskRoute(BaseRoute):
     @url_object_id("task_id")
     def get(self, task_id: str, token: AccessToken.Payload = None):
 
-        # exclude notification to not expose private information (privacy)
-        # on anonymous requests and requests for users without schedules_update
-        projection = (
-            None
-            if token and token.get_permission("schedules", "update")
-            else {"notification": 0}
-        )
+        with_notification = bool(token and token.get_permission("schedules", "update"))
+        with_secrets = bool(token and token.get_permission("tasks", "create"))
+        fields = get_fields(TaskFieldsSchema)
+        projection = get_task_projection(fields, with_notification, with_secrets)
 
-        task = Tasks().find_one({"_id": task_id}, projection)
+        task = Tasks().find_one({"_id": task_id}, {"version": 1})
         if task is None:
             raise TaskNotFound()
 
-        task["updated_at"] = task["events"][-1]["timestamp"]
-
-        if not token or not token.get_permission("tasks", "create"):
-            remove_secrets_from_response(task)
-
-        return jsonify(task)
+        def fetch():
+            task = Tasks().find_one({"_id": task_id}, projection)
+            if task is None:
+                raise TaskNotFound()
+            return clean_task(task, fields, with_secrets)
+
+        return self.cached_response(
+            f"task-{task_id}-{task.get('version', 0)}"
+            f"-{int(with_notification)}{int(with_secrets)}"
+            f"-{','.join(fields or [])}",
+            fetch,
+        )
 
     @authenticate
     @require_perm("tasks", "create")
@@ -109,49 +177,22 @@ class TaskRoute(BaseRoute):
     def post(self, task_id: str, token: AccessToken.Payload):
         """create a task from a requested_task_id"""
 
-        requested_task = RequestedTasks().find_one({"_id": task_id})
-        if requested_task is None:
-            raise TaskNotFound()
-
         request_args = TaskCreateSchema().load(request.args.to_dict())
 
-        document = {}
-        document.update(requested_task)
-
-        try:
-            Tasks().insert_one(requested_task)
-        except pymongo.errors.DuplicateKeyError as exc:
-            logger.exception(exc)
-            response = jsonify({})
-            response.status_code = 423  # Locked
-            return response
-        except Exception as exc:
-            logger.exception(exc)
-            raise exc
-
-        payload = {"worker": request_args["worker_name"]}
-        try:
-            task_event_handler(task_id, TaskStatus.reserved, payload)
-        except Exception as exc:
-            logger.exception(exc)
-            logger.error("unable to create task. reverting.")
-            try:
-                Tasks().delete_one({"_id": task_id})
-            except Exception:
-                logger.debug(f"unable to revert deletion of task {task_id}")
-            raise exc
-
-        try:
-            RequestedTasks().delete_one({"_id": task_id})
-        except Exception as exc:
-            logger.exception(exc)  # and pass
-
-        BROADCASTER.broadcast_updated_task(task_id, TaskStatus.reserved, payload)
+        task = reserve_requested_task(task_id, request_args["worker_name"])
+        if task is None:
+            if Tasks().count_documents({"_id": task_id}):
+                response = jsonify({})
+                response.status_code = 423  # Locked
+                return response
+            raise TaskNotFound()
 
-        return make_response(
-            jsonify(Tasks().find_one({"_id": task_id})), HTTPStatus.CREATED
+        BROADCASTER.broadcast_updated_task(
+            task_id, TaskStatus.reserved, {"worker": request_args["worker_name"]}
         )
 
+        return make_response(jsonify(task), HTTPStatus.CREATED)
+
     @authenticate
     @require_perm("tasks", "update")
     @url_object_id("task_id")
@@ -189,7 +230,8 @@ class TaskCancelRoute(BaseRoute):
     def post(self, task_id: str, token: AccessToken.Payload):
 
         task = Tasks().find_one(
-            {"status": {"$in": TaskStatus.incomplete()}, "_id": task_id}, {"_id": 1}
+            {"status": {"$in": TaskStatus.incomplete()}, "_id": task_id},
+            {"_id": 1, "worker": 1},
         )
         if task is None:
             raise TaskNotFound()
@@ -200,5 +242,7 @@ class TaskCancelRoute(BaseRoute):
 
         # broadcast cancel-request to worker
         BROADCASTER.broadcast_cancel_task(task_id)
+        if task.get("worker"):
+            record_worker_event(task["worker"], "cancel-task", {"_id": task_id})
 
         return Response(status=HTTPStatus.NO_CONTENT)
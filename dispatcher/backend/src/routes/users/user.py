@@ -1,5 +1,6 @@
 from http import HTTPStatus
 
+import pymongo
 from flask import request, jsonify, Response
 from pymongo.errors import DuplicateKeyError
 from werkzeug.security import generate_password_hash
@@ -10,8 +11,9 @@ from common.roles import get_role_for, ROLES
 from routes import authenticate, url_object_id, errors, require_perm
 from utils.token import AccessToken
 from routes.base import BaseRoute
+from routes.utils import paginate
 from common.schemas.parameters import (
-    SkipLimitSchema,
+    PageSchema,
     UserCreateSchema,
     UserUpdateSchema,
 )
@@ -26,17 +28,18 @@ class UsersRoute(BaseRoute):
     @require_perm("users", "read")
     def get(self, token: AccessToken.Payload):
 
-        request_args = SkipLimitSchema().load(request.args.to_dict())
-        skip, limit = request_args["skip"], request_args["limit"]
+        request_args = PageSchema().load(request.args.to_dict())
 
         # get users from database
-        query = {}
-        count = Users().count_documents(query)
-        cursor = (
-            Users()
-            .find(query, {"_id": 0, "username": 1, "email": 1, "scope": 1})
-            .skip(skip)
-            .limit(limit)
+        users, meta = paginate(
+            Users(),
+            query={},
+            projection={"_id": 0, "username": 1, "email": 1, "scope": 1},
+            sort=[("username", pymongo.ASCENDING)],
+            skip=request_args["skip"],
+            limit=request_args["limit"],
+            cursor=request_args.get("cursor"),
+            count=request_args["count"],
         )
 
         # add role to user while removing scope
@@ -44,11 +47,9 @@ class UsersRoute(BaseRoute):
             user.update({"role": get_role_for(user.pop("scope", {}))})
             return user
 
-        users = list(map(_add_role, cursor))
+        users = list(map(_add_role, users))
 
-        return jsonify(
-            {"meta": {"skip": skip, "limit": limit, "count": count}, "items": users}
-        )
+        return jsonify({"meta": meta, "items": users})
 
     @authenticate
     @require_perm("users", "create")
@@ -1,20 +1,27 @@
+import base64
+import binascii
+
+import pymongo
+from bson import json_util
+from flask import request, jsonify
+
 from common.constants import SECRET_REPLACEMENT
-from common.schemas.models import ScheduleConfigSchema
-from utils.offliners import build_str_command
+from routes.errors import BadRequest
+from utils.offliners import build_str_command, get_offliner_definition
 
 
 def remove_secrets_from_response(response: dict):
     """replaces (in-place) all occurences of secrets in flags/commands with stars"""
 
-    if "config" not in response:
+    # partial documents (fields=) have no secrets
+    if "flags" not in response.get("config", {}):
         return
 
-    schema = ScheduleConfigSchema.get_offliner_schema(
-        response["config"]["task_name"]
-    )().to_desc()
-    fields = [flag["data_key"] for flag in schema if flag.get("secret", False)]
+    definition = get_offliner_definition(response["config"]["task_name"])
+    if definition is None:
+        return
 
-    for field in fields:
+    for field in definition.secret_fields:
         flags = response["config"]["flags"]
         command = response["config"]["command"]
         if field in flags:
@@ -28,3 +35,151 @@ def remove_secrets_from_response(response: dict):
         response["config"]["str_command"] = build_str_command(
             response["config"]["command"]
         )
+
+
+def get_list_arg(name: str) -> list:
+    """values of a query parameter, repeated (a=1&a=2) or comma-separated (a=1,2)"""
+    return [
+        value for arg in request.args.getlist(name) for value in arg.split(",") if value
+    ]
+
+
+def get_fields(schema) -> list:
+    """validated values of the `fields` query parameter, None if not supplied
+
+    Nested fields are dropped if their parent is requested"""
+    values = get_list_arg("fields")
+    if not values:
+        return None
+    fields = set(schema().load({"fields": values})["projection"])
+    return sorted(
+        field
+        for field in fields
+        if "." not in field or field.split(".", 1)[0] not in fields
+    )
+
+
+def encode_cursor(values: list) -> str:
+    """opaque continuation token from sort keys values"""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode("utf-8")).decode(
+        "ASCII"
+    )
+
+
+def decode_cursor(cursor: str, nb_values: int) -> list:
+    """sort keys values from a continuation token"""
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ASCII")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise BadRequest("invalid cursor")
+    if not isinstance(values, list) or len(values) != nb_values:
+        raise BadRequest("invalid cursor")
+    return values
+
+
+def get_value(document: dict, key: str):
+    """value of a dotted key in document (None if missing)"""
+    for part in key.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def after_value(key: str, value, direction: int) -> dict:
+    """query for documents after value in key's sort order (None if no such doc)
+
+    null/missing values are sorted first (ascending)"""
+    if direction == pymongo.ASCENDING:
+        if value is None:
+            return {key: {"$ne": None}}
+        return {key: {"$gt": value}}
+    if value is None:
+        return None
+    return {"$or": [{key: {"$lt": value}}, {key: None}]}
+
+
+def after_cursor_query(sort: list, values: list) -> dict:
+    """query for documents after those sort keys values (keyset)"""
+    branches = []
+    for index, (key, direction) in enumerate(sort):
+        after = after_value(key, values[index], direction)
+        if after is None:
+            continue
+        branch = {
+            prev_key: values[prev_index]
+            for prev_index, (prev_key, _) in enumerate(sort[:index])
+        }
+        branches.append({"$and": [branch, after]} if branch else after)
+    return {"$or": branches} if branches else {"_id": {"$exists": False}}
+
+
+def paginate(
+    collection,
+    query: dict,
+    projection: dict,
+    sort: list,
+    skip: int,
+    limit: int,
+    cursor: str = None,
+    count: str = "exact",
+):
+    """(items, meta) for a page of a find() on collection
+
+    - sort is a list of (key, direction), `_id` is always appended as tie-breaker.
+      sort keys must be part of projection
+    - cursor is the `next_cursor` of previous page (keyset: skip is ignored)
+    - count is either `exact`, `estimated` (whole collection only) or `none`"""
+
+    sort = list(sort) + [("_id", sort[-1][1] if sort else pymongo.ASCENDING)]
+
+    meta = {"skip": skip, "limit": limit}
+    if count == "exact" or (count == "estimated" and query):
+        meta["count"] = collection.count_documents(query)
+    elif count == "estimated":
+        meta["count"] = collection.estimated_document_count()
+
+    find_query = query
+    if cursor:
+        skip = meta["skip"] = 0
+        values = decode_cursor(cursor, len(sort))
+        find_query = {"$and": [query, after_cursor_query(sort, values)]}
+
+    # _id is required to build next cursor
+    hide_id = projection is not None and not projection.get("_id", True)
+    if hide_id:
+        projection = dict(projection, _id=1)
+
+    # fetching one more to know whether there's a next page
+    items = list(
+        collection.find(find_query, projection)
+        .sort(sort)
+        .skip(skip)
+        .limit(limit + 1 if limit else 0)
+    )
+    meta["next_cursor"] = None
+    if limit and len(items) > limit:
+        items = items[:limit]
+        meta["next_cursor"] = encode_cursor(
+            [get_value(items[-1], key) for key, _ in sort]
+        )
+
+    if hide_id:
+        for item in items:
+            item.pop("_id", None)
+
+    return items, meta
+
+
+def make_conditional_response(payload, etag: str = None):
+    """JSON response with ETag, 304 Not Modified if client already has it
+
+    ETag is a hash of the body if not supplied"""
+    response = jsonify(payload)
+    if etag is None:
+        response.add_etag()
+    else:
+        response.set_etag(etag)
+    # clients must revalidate before using their copy
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
@@ -1,6 +1,6 @@
 from routes import API_PATH
 from routes.base import BaseBlueprint
-from routes.workers.worker import WorkersRoute, WorkerCheckinRoute
+from routes.workers.worker import WorkersRoute, WorkerCheckinRoute, WorkerEventsRoute
 
 
 class Blueprint(BaseBlueprint):
@@ -9,3 +9,4 @@ class Blueprint(BaseBlueprint):
 
         self.register_route(WorkersRoute())
         self.register_route(WorkerCheckinRoute())
+        self.register_route(WorkerEventsRoute())
@@ -11,11 +11,20 @@ from marshmallow import ValidationError
 
 from errors.http import InvalidRequestJSON
 from routes import authenticate, url_object_id
+from routes.errors import NotFound
 from common import getnow
 from common.mongo import Workers
 from routes.base import BaseRoute
+from routes.utils import paginate
 from utils.broadcaster import BROADCASTER
-from common.schemas.parameters import SkipLimitSchema, WorkerCheckInSchema
+from utils.matchmaking import MATCHMAKING
+from utils.token import AccessToken
+from utils.worker_events import get_worker_events
+from common.schemas.parameters import (
+    PageSchema,
+    WorkerCheckInSchema,
+    WorkerEventsSchema,
+)
 
 logger = logging.getLogger(__name__)
 OFFLINE_DELAY = 20 * 60
@@ -38,11 +47,8 @@ class WorkersRoute(BaseRoute):
             )
             return worker
 
-        request_args = SkipLimitSchema().load(request.args.to_dict())
-        skip, limit = request_args["skip"], request_args["limit"]
+        request_args = PageSchema().load(request.args.to_dict())
 
-        query = {}
-        count = Workers().count_documents(query)
         projection = {
             "_id": 0,
             "name": 1,
@@ -51,18 +57,19 @@ class WorkersRoute(BaseRoute):
             "resources": 1,
             "last_seen": 1,
         }
-        cursor = (
-            Workers()
-            .find(query, projection)
-            .sort("name", pymongo.ASCENDING)
-            .skip(skip)
-            .limit(limit)
+        workers, meta = paginate(
+            Workers(),
+            query={},
+            projection=projection,
+            sort=[("name", pymongo.ASCENDING)],
+            skip=request_args["skip"],
+            limit=request_args["limit"],
+            cursor=request_args.get("cursor"),
+            count=request_args["count"],
         )
-        workers = list(map(add_status, cursor))
+        workers = list(map(add_status, workers))
 
-        return jsonify(
-            {"meta": {"skip": skip, "limit": limit, "count": count}, "items": workers}
-        )
+        return jsonify({"meta": meta, "items": workers})
 
 
 class WorkerCheckinRoute(BaseRoute):
@@ -91,8 +98,31 @@ class WorkerCheckinRoute(BaseRoute):
             "platforms": request_json.get("platforms", {}),
             "last_seen": getnow(),
         }
-        Workers().replace_one({"name": name}, document, upsert=True)
+        # not replacing so the worker's events_seq is kept
+        Workers().update_one({"name": name}, {"$set": document}, upsert=True)
+        MATCHMAKING.invalidate()
 
         BROADCASTER.broadcast_worker_checkin(document)
 
         return Response(status=HTTPStatus.NO_CONTENT)
+
+
+class WorkerEventsRoute(BaseRoute):
+    rule = "/<string:name>/events"
+    name = "worker-events"
+    methods = ["GET"]
+
+    @authenticate
+    def get(self, name: str, token: AccessToken.Payload):
+        """events pushed to worker after `since` seq, for those it missed"""
+        request_args = WorkerEventsSchema().load(request.args.to_dict())
+
+        # workers only get their own events
+        if not Workers().count_documents({"name": name, "username": token.username}):
+            raise NotFound()
+
+        return jsonify(
+            get_worker_events(
+                name, since=request_args.get("since"), limit=request_args["limit"]
+            )
+        )
@@ -1,6 +1,8 @@
 import pytest
 from bson import ObjectId
 
+from utils.facets import FACETS
+
 
 @pytest.fixture(scope="module")
 def make_language():
@@ -56,11 +58,14 @@ def make_schedule(database, make_language, make_config):
         }
         schedule_id = database.schedules.insert_one(document).inserted_id
         schedule_ids.append(schedule_id)
+        # written directly to database
+        FACETS.invalidate()
         return document
 
     yield _make_schedule
 
     database.schedules.delete_many({"_id": {"$in": schedule_ids}})
+    FACETS.invalidate()
 
 
 @pytest.fixture(scope="module")
@@ -3,6 +3,9 @@ import json
 from bson import ObjectId
 import pytest
 
+from common.enum import TaskStatus
+from utils.matchmaking import MATCHMAKING
+
 
 class TestRequestedTaskList:
     url = "/requested-tasks/"
@@ -182,3 +185,70 @@ class TestRequestedTaskCreate:
             url, headers=headers, data=json.dumps({"schedule_names": ["hello"]})
         )
         assert response.status_code == 404
+
+
+class TestRequestedTaskClaim:
+    url = "/requested-tasks/worker"
+
+    @pytest.fixture()
+    def worker(self, database):
+        document = {
+            "_id": ObjectId(),
+            "name": "claimer",
+            "username": "username",
+            "offliners": ["youtube"],
+            "resources": {"cpu": 3, "memory": 1024, "disk": 1024},
+        }
+        database.workers.insert_one(document)
+        # fixtures write to database directly
+        MATCHMAKING.invalidate()
+        yield document
+        database.workers.delete_one({"_id": document["_id"]})
+        database.tasks.delete_many({"worker": document["name"]})
+
+    @staticmethod
+    def _params(worker, cpu=3):
+        return {
+            "worker": worker["name"],
+            "avail_cpu": cpu,
+            "avail_memory": 1024,
+            "avail_disk": 1024,
+        }
+
+    def test_unauthorized(self, client, worker):
+        response = client.post(self.url, query_string=self._params(worker))
+        assert response.status_code == 401
+
+    def test_claim(self, database, client, access_token, requested_task, worker):
+        headers = {"Authorization": access_token}
+        response = client.post(
+            self.url, headers=headers, query_string=self._params(worker)
+        )
+        assert response.status_code == 201
+
+        data = json.loads(response.data)
+        assert data["_id"] == str(requested_task["_id"])
+        assert data["status"] == TaskStatus.reserved
+        assert data["worker"] == worker["name"]
+        assert (
+            database.requested_tasks.count_documents({"_id": requested_task["_id"]})
+            == 0
+        )
+        assert database.tasks.count_documents({"_id": requested_task["_id"]}) == 1
+
+        # nothing left to claim
+        response = client.post(
+            self.url, headers=headers, query_string=self._params(worker)
+        )
+        assert response.status_code == 204
+
+    def test_not_enough_resources(
+        self, database, client, access_token, requested_task, worker
+    ):
+        response = client.post(
+            self.url,
+            headers={"Authorization": access_token},
+            query_string=self._params(worker, cpu=1),
+        )
+        assert response.status_code == 204
+        assert database.requested_tasks.count_documents({"_id": requested_task["_id"]})
@@ -154,6 +154,21 @@ class TestScheduleList:
         assert len(response_json["items"]) == expected
 
 
+class TestScheduleFacets:
+    def test_facets(self, client, schedules):
+        response = client.get("/schedules/facets/")
+        assert response.status_code == 200
+
+        facets = response.get_json()
+        assert set(facets.keys()) == {"tags", "languages", "categories", "offliners"}
+        assert sum(item["count"] for item in facets["categories"]) >= len(schedules)
+
+        response = client.get(
+            "/schedules/facets/", headers={"If-None-Match": response.headers["ETag"]}
+        )
+        assert response.status_code == 304
+
+
 class TestSchedulePost:
     @pytest.mark.parametrize(
         "document",
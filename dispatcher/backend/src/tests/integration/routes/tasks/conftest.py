@@ -74,6 +74,7 @@ def make_task(database, make_event):
             "schedule_name": schedule_name,
             "timestamp": timestamp,
             "events": events,
+            "updated_at": events[-1]["timestamp"],
             "container": container,
             "debug": debug,
             "files": files,
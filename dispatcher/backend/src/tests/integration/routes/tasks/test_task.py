@@ -33,6 +33,26 @@ class TestTaskCreate:
         data = json.loads(response.data)
         database.tasks.delete_one({"_id": ObjectId(data["_id"])})
 
+    def test_create_twice(self, database, client, access_token, requested_task):
+        url = "/tasks/{}".format(str(requested_task["_id"]))
+        headers = {"Authorization": access_token, "Content-Type": "application/json"}
+        query_string = {"worker_name": "zimfarm_worker.com"}
+        response = client.post(url, headers=headers, query_string=query_string)
+        assert response.status_code == 201
+
+        # already reserved
+        response = client.post(url, headers=headers, query_string=query_string)
+        assert response.status_code == 423
+        database.tasks.delete_one({"_id": requested_task["_id"]})
+
+    def test_create_not_found(self, client, access_token):
+        url = "/tasks/{}".format(str(ObjectId()))
+        headers = {"Authorization": access_token, "Content-Type": "application/json"}
+        response = client.post(
+            url, headers=headers, query_string={"worker_name": "zimfarm_worker.com"}
+        )
+        assert response.status_code == 404
+
     def test_create_with_missing_worker(self, client, access_token, requested_task):
         url = "/tasks/{}".format(str(requested_task["_id"]))
         response = client.post(url, headers={"Authorization": access_token})
@@ -148,6 +168,65 @@ class TestTaskGet:
         assert "timestamp" in data
         assert "events" in data
 
+    def test_get_fields(self, client, task):
+        url = "/tasks/{}?fields=status,container.progress".format(task["_id"])
+        response = client.get(url)
+        assert response.status_code == 200
+
+        data = json.loads(response.data)
+        assert set(data.keys()) <= {"_id", "status", "container"}
+        assert data["status"] == task["status"]
+        assert "events" not in data
+
+    def test_get_fields_invalid(self, client, task):
+        url = "/tasks/{}?fields=status,debug.log".format(task["_id"])
+        response = client.get(url)
+        assert response.status_code == 400
+
+    def test_not_modified(self, client, task):
+        url = "/tasks/{}".format(task["_id"])
+        response = client.get(url)
+        assert response.status_code == 200
+
+        response = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+        assert response.status_code == 304
+
+
+class TestTasksStatus:
+    def test_status(self, client, tasks):
+        unknown_id = ObjectId()
+        url = "/tasks/status?id={},{}&id={}".format(
+            tasks[0]["_id"], tasks[1]["_id"], unknown_id
+        )
+        response = client.get(url)
+        assert response.status_code == 200
+
+        items = json.loads(response.data)["items"]
+        assert {item["_id"] for item in items} == {
+            str(tasks[0]["_id"]),
+            str(tasks[1]["_id"]),
+        }
+        for item, task in _find_matches(items, tasks, "_id"):
+            assert item["status"] == task["status"]
+            assert "events" not in item
+
+    def test_status_fields(self, client, task):
+        url = "/tasks/status?id={}&fields=schedule_name".format(task["_id"])
+        response = client.get(url)
+        assert response.status_code == 200
+
+        item = json.loads(response.data)["items"][0]
+        assert item["schedule_name"] == task["schedule_name"]
+        assert item["status"] == task["status"]
+
+    @pytest.mark.parametrize(
+        "query",
+        ["", "id=invalid", "id=" + "&id=".join(str(ObjectId()) for _ in range(201))],
+    )
+    def test_status_invalid(self, client, query):
+        response = client.get("/tasks/status?" + query)
+        assert response.status_code == 400
+
 
 class TestTaskCancel:
     def test_unauthorized(self, client, task):
@@ -1,5 +1,7 @@
 import pytest
 
+from utils.worker_events import record_worker_event
+
 
 class TestWorkersList:
     def test_list_tags_no_param(self, client, workers):
@@ -95,3 +97,42 @@ class TestWorkerCheckIn:
         )
         assert response.status_code == 400
         database.workers.delete_one({"name": self.name})
+
+
+class TestWorkerEvents:
+    name = "events-worker"
+
+    @pytest.fixture(scope="class")
+    def events(self, database, make_worker):
+        make_worker(name=self.name, username="username")
+        seqs = [
+            record_worker_event(self.name, "cancel-task", {"_id": str(index)})
+            for index in range(3)
+        ]
+        yield seqs
+        database.worker_events.delete_many({"worker": self.name})
+
+    def test_last_seq(self, client, access_token, events):
+        url = f"/workers/{self.name}/events"
+        response = client.get(url, headers={"Authorization": access_token})
+        assert response.status_code == 200
+        assert response.get_json() == {
+            "last_seq": events[-1],
+            "complete": False,
+            "items": [],
+        }
+
+    def test_replay(self, client, access_token, events):
+        url = f"/workers/{self.name}/events?since={events[0]}"
+        response = client.get(url, headers={"Authorization": access_token})
+        assert response.status_code == 200
+        response_json = response.get_json()
+        assert response_json["complete"]
+        assert [item["seq"] for item in response_json["items"]] == events[1:]
+        assert response_json["items"][0]["code"] == "cancel-task"
+        assert response_json["items"][0]["payload"] == {"_id": "1"}
+
+    def test_other_user(self, client, access_token, worker):
+        url = f"/workers/{worker['name']}/events"
+        response = client.get(url, headers={"Authorization": access_token})
+        assert response.status_code == 404
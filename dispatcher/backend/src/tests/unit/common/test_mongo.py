@@ -0,0 +1,31 @@
+from common import mongo
+
+
+class TestClient:
+    def test_shared_client(self):
+        assert mongo.Client.get() is mongo.Client.get()
+        assert mongo.Database().client is mongo.Database().client
+        assert mongo.Tasks().database.client is mongo.Schedules().database.client
+
+    def test_client_recreated_after_fork(self, monkeypatch):
+        client = mongo.Client.get()
+        monkeypatch.setattr(mongo.os, "getpid", lambda: -1)
+        forked_client = mongo.Client.get()
+        assert forked_client is not client
+        assert mongo.Client.get() is forked_client
+
+    def test_pool_sizing(self):
+        client = mongo.Client.get()
+        assert client.max_pool_size == mongo.MONGODB_MAX_POOL_SIZE
+        assert client.min_pool_size == mongo.MONGODB_MIN_POOL_SIZE
+
+
+class TestRoundTripsCounter:
+    def test_counter(self):
+        counter = mongo.RoundTripsCounter()
+        assert counter.count == 0
+        counter.started(None)
+        counter.started(None)
+        assert counter.count == 2
+        counter.reset()
+        assert counter.count == 0
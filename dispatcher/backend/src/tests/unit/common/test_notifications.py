@@ -0,0 +1,121 @@
+import pytest
+
+from common import notifications
+from common.notifications import (
+    DEAD,
+    PENDING,
+    SENT,
+    deliver,
+    get_deliveries,
+    get_retry_delay,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.posted = []
+
+    def post(self, url, **kwargs):
+        self.posted.append(url)
+        return FakeResponse(500 if url in self.failing else 200)
+
+
+@pytest.fixture
+def task():
+    return {
+        "_id": "abcdef",
+        "status": "succeeded",
+        "notification": {
+            "ended": {"webhook": ["https://a", "https://b"], "slack": ["#chan"]}
+        },
+    }
+
+
+def get_notification(task):
+    return {
+        "task_id": task["_id"],
+        "event": "ended",
+        "task": task,
+        "deliveries": get_deliveries(task, "ended"),
+    }
+
+
+def test_deliveries(monkeypatch, task):
+    monkeypatch.setattr(notifications, "SLACK_URL", "")
+    assert get_deliveries(task, "started") == []
+    deliveries = get_deliveries(task, "ended")
+    # slack not configured
+    assert [(item["method"], item["target"]) for item in deliveries] == [
+        ("webhook", "https://a"),
+        ("webhook", "https://b"),
+    ]
+    assert all(item["status"] == PENDING for item in deliveries)
+
+
+def test_retry_delay(monkeypatch):
+    monkeypatch.setattr(notifications, "NOTIFICATIONS_RETRY_DELAY", 10)
+    assert 8 <= get_retry_delay(1) <= 12
+    assert 16 <= get_retry_delay(2) <= 24
+    assert 64 <= get_retry_delay(4) <= 96
+
+
+def test_deliver_retries_failed_only(monkeypatch, task):
+    monkeypatch.setattr(notifications, "NOTIFICATIONS_MAX_ATTEMPTS", 2)
+    notification = get_notification(task)
+    session = FakeSession(failing=["https://b"])
+
+    deliver(notification, session)
+    assert [item["status"] for item in notification["deliveries"]] == [
+        SENT,
+        PENDING,
+    ]
+    assert notification["deliveries"][1]["error"] == "HTTP 500"
+
+    deliver(notification, session)
+    assert session.posted == ["https://a", "https://b", "https://b"]
+    assert [item["status"] for item in notification["deliveries"]] == [SENT, DEAD]
+    assert notification["deliveries"][1]["attempts"] == 2
+
+
+def test_rendered_once_per_method(monkeypatch, task):
+    rendered = []
+
+    def render(task):
+        rendered.append(task["_id"])
+        return task
+
+    monkeypatch.setitem(
+        notifications.METHODS,
+        "webhook",
+        notifications.METHODS["webhook"]._replace(render=render),
+    )
+    notification = get_notification(task)
+    session = FakeSession()
+    deliver(notification, session)
+    assert session.posted == ["https://a", "https://b"]
+    assert rendered == ["abcdef"]
+
+
+def test_templates_precompiled():
+    assert set(notifications.TEMPLATES.keys()) >= {
+        "email_subject.txt",
+        "email_body.html",
+        "slack_fallback.txt",
+        "slack_title.txt",
+        "slack_message.txt",
+    }
+    rendered = notifications.render_slack_notification(
+        {"_id": "abcdef", "status": "failed", "schedule_name": "wiki"}
+    )
+    assert rendered["attachments"][0]["color"] == "danger"
+    assert "wiki" in rendered["attachments"][0]["fields"][0]["title"]
@@ -0,0 +1,59 @@
+import flask
+import pytest
+from marshmallow import ValidationError
+
+from common.schemas.parameters import TaskFieldsSchema
+from routes.utils import get_fields
+from routes.tasks.task import clean_task, get_task_projection
+
+app = flask.Flask(__name__)
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("", None),
+        ("fields=", None),
+        ("fields=status", ["status"]),
+        ("fields=status,worker&fields=status", ["status", "worker"]),
+        ("fields=config.task_name,config", ["config"]),
+        (
+            "fields=container.progress,container.exit_code",
+            ["container.exit_code", "container.progress"],
+        ),
+    ],
+)
+def test_get_fields(query, expected):
+    with app.test_request_context(f"/?{query}"):
+        fields = get_fields(TaskFieldsSchema)
+    assert fields == expected
+
+
+def test_get_fields_invalid():
+    with app.test_request_context("/?fields=status,debug.log"):
+        with pytest.raises(ValidationError) as exc:
+            get_fields(TaskFieldsSchema)
+    assert "fields" in exc.value.messages
+
+
+def test_task_projection_secrets():
+    fields = ["config.task_name", "container"]
+    projection = get_task_projection(fields, False, False)
+    assert "config" not in projection
+    assert projection["config.flags"] == projection["config.command"] == 1
+
+    command = ["mwoffliner", '--optimisationCacheUrl="https://secret"']
+    task = {
+        "config": {
+            "task_name": "mwoffliner",
+            "flags": {"optimisationCacheUrl": "https://secret"},
+            "command": list(command),
+        },
+        "container": {"command": list(command)},
+    }
+    clean_task(task, fields, False)
+    assert task["config"] == {"task_name": "mwoffliner"}
+    assert "secret" not in task["container"]["command"][1]
+
+    task = {"config": {"task_name": "mwoffliner", "flags": {}, "command": []}}
+    assert "config" not in clean_task(task, ["container"], False)
@@ -0,0 +1,54 @@
+import datetime
+
+import pytest
+from bson import ObjectId
+
+from routes.errors import BadRequest
+from routes.utils import after_cursor_query, decode_cursor, encode_cursor, get_value
+
+
+def test_cursor_roundtrip():
+    values = [5, datetime.datetime(2020, 1, 1, 12), None, ObjectId()]
+    decoded = decode_cursor(encode_cursor(values), len(values))
+    assert decoded[0] == 5
+    assert decoded[1].replace(tzinfo=None) == values[1]
+    assert decoded[2:] == values[2:]
+
+
+@pytest.mark.parametrize("cursor, nb_values", [("not-base64!", 2), ("WzFd", 2)])
+def test_invalid_cursor(cursor, nb_values):
+    with pytest.raises(BadRequest):
+        decode_cursor(cursor, nb_values)
+
+
+def test_get_value():
+    document = {"timestamp": {"requested": 1}}
+    assert get_value(document, "timestamp.requested") == 1
+    assert get_value(document, "timestamp.reserved") is None
+    assert get_value(document, "config.resources") is None
+
+
+def test_after_ascending():
+    assert after_cursor_query([("name", 1), ("_id", 1)], ["a", 1]) == {
+        "$or": [
+            {"name": {"$gt": "a"}},
+            {"$and": [{"name": "a"}, {"_id": {"$gt": 1}}]},
+        ]
+    }
+
+
+def test_after_descending_with_null():
+    query = after_cursor_query(
+        [("priority", -1), ("reserved", -1), ("_id", -1)], [1, None, 2]
+    )
+    assert query == {
+        "$or": [
+            {"$or": [{"priority": {"$lt": 1}}, {"priority": None}]},
+            {
+                "$and": [
+                    {"priority": 1, "reserved": None},
+                    {"$or": [{"_id": {"$lt": 2}}, {"_id": None}]},
+                ]
+            },
+        ]
+    }
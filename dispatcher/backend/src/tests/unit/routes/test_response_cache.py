@@ -0,0 +1,45 @@
+import flask
+
+from routes.base import BaseRoute, ResponseCache
+
+
+def test_lru():
+    cache = ResponseCache(size=2)
+    cache.set("a", b"a")
+    cache.set("b", b"b")
+    assert cache.get("a") == b"a"
+    cache.set("c", b"c")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a"
+    assert cache.get("c") == b"c"
+
+
+def test_disabled():
+    cache = ResponseCache(size=0)
+    cache.set("a", b"a")
+    assert cache.get("a") is None
+
+
+def test_cached_response(monkeypatch):
+    monkeypatch.setattr("routes.base.RESPONSE_CACHE", ResponseCache(size=2))
+    fetched = []
+
+    def fetch():
+        fetched.append(True)
+        return {"version": 1}
+
+    app = flask.Flask(__name__)
+    with app.test_request_context("/"):
+        response = BaseRoute.cached_response("doc-1", fetch)
+        assert response.status_code == 200
+        assert response.get_etag() == ("doc-1", False)
+        assert response.get_json() == {"version": 1}
+
+        assert BaseRoute.cached_response("doc-1", fetch).get_json() == {"version": 1}
+        assert len(fetched) == 1
+
+    with app.test_request_context("/", headers={"If-None-Match": '"doc-1"'}):
+        assert BaseRoute.cached_response("doc-1", fetch).status_code == 304
+
+    with app.test_request_context("/", headers={"If-None-Match": '"doc-0"'}):
+        assert BaseRoute.cached_response("doc-1", fetch).status_code == 200
@@ -0,0 +1,103 @@
+import time
+import logging
+import threading
+
+from utils.broadcaster import MessageBroadcaster
+from utils.json import loads
+
+
+class FakeSocket:
+    def __init__(self, block=None):
+        self.block = block
+        self.messages = []
+
+    def send(self, message):
+        if self.block:
+            self.block.wait()
+        self.messages.append(message)
+
+    def close(self):
+        pass
+
+
+class FakeBroadcaster(MessageBroadcaster):
+    def __init__(self, socket, **kwargs):
+        super().__init__("tcp://fake:5000", **kwargs)
+        self.socket = socket
+
+    def connect(self):
+        return self.socket
+
+
+def test_send_in_order():
+    broadcaster = FakeBroadcaster(FakeSocket())
+    broadcaster.broadcast_cancel_task("a")
+    broadcaster.broadcast_requested_tasks(["b", "c"])
+    broadcaster.stop()
+    assert [message.split(b" ", 1)[0] for message in broadcaster.socket.messages] == [
+        b"cancel-task",
+        b"requested-tasks",
+    ]
+    assert loads(broadcaster.socket.messages[1].split(b" ", 1)[1]) == ["b", "c"]
+    assert broadcaster.stats["sent"] == 2
+
+
+def test_coalesce():
+    broadcaster = FakeBroadcaster(FakeSocket())
+    messages = [
+        ("task-event", {"_id": "a", "event": "scraper_running", "log": 1}),
+        ("task-event", {"_id": "b", "event": "scraper_running", "log": 1}),
+        ("task-event", {"_id": "a", "event": "scraper_running", "log": 2}),
+        ("task-event", {"_id": "a", "event": "succeeded"}),
+        ("task-event", {"_id": "a", "event": "succeeded"}),
+    ]
+    broadcaster.stats = {"coalesced": 0}
+    assert broadcaster.coalesce(messages) == messages[1:]
+    assert broadcaster.stats["coalesced"] == 1
+
+
+def test_drop_when_full():
+    block = threading.Event()
+    broadcaster = FakeBroadcaster(FakeSocket(block=block), queue_size=2)
+    for index in range(10):
+        broadcaster.broadcast_cancel_task(str(index))
+    assert broadcaster.stats["dropped"] > 0
+    assert broadcaster.stats["queued"] + broadcaster.stats["dropped"] == 10
+    assert broadcaster.stats["max_depth"] <= 2
+    block.set()
+    broadcaster.stop()
+    assert len(broadcaster.socket.messages) == broadcaster.stats["queued"]
+
+
+def test_payload_copied():
+    broadcaster = FakeBroadcaster(FakeSocket())
+    payload = {"log": 1}
+    broadcaster.broadcast_updated_task("a", "scraper_running", payload)
+    payload["log"] = 2
+    broadcaster.stop()
+    assert loads(broadcaster.socket.messages[0].split(b" ", 1)[1])["log"] == 1
+    assert "_id" not in payload
+
+
+def test_stats_logged(caplog):
+    caplog.set_level(logging.INFO, logger="utils.broadcaster")
+    broadcaster = FakeBroadcaster(FakeSocket(), stats_interval=0.1)
+    broadcaster.broadcast_cancel_task("a")
+    time.sleep(0.7)
+    broadcaster.stop()
+    assert broadcaster.get_stats()["depth"] == 0
+    assert any(
+        "[STATS]" in record.message and "sent: 1" in record.message
+        for record in caplog.records
+    )
+
+
+def test_locks_reset_after_fork():
+    broadcaster = FakeBroadcaster(FakeSocket())
+    # as inherited from a parent whose sender thread held them
+    broadcaster.lock.acquire()
+    broadcaster.stats_lock.acquire()
+    broadcaster.reset_locks()
+    broadcaster.broadcast_cancel_task("a")
+    broadcaster.stop()
+    assert broadcaster.get_stats()["sent"] == 1
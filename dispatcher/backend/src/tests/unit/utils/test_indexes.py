@@ -0,0 +1,20 @@
+from utils.indexes import get_plan_stages
+
+
+def test_plan_stages_nested():
+    plan = {
+        "stage": "FETCH",
+        "inputStage": {
+            "stage": "OR",
+            "inputStages": [
+                {"stage": "IXSCAN", "indexName": "worker_status"},
+                {"stage": "COLLSCAN"},
+            ],
+        },
+    }
+    assert get_plan_stages(plan) == ["FETCH", "OR", "IXSCAN", "COLLSCAN"]
+
+
+def test_plan_stages_sbe():
+    plan = {"queryPlan": {"stage": "IXSCAN"}, "slotBasedPlan": {"slots": "…"}}
+    assert get_plan_stages(plan) == ["IXSCAN"]
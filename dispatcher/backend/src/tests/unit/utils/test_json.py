@@ -0,0 +1,69 @@
+import json
+import uuid
+import datetime
+
+import pytest
+from bson import ObjectId
+from markupsafe import Markup
+
+import utils.json
+from utils.json import Encoder, dumps, loads
+
+DOCUMENT = {
+    "_id": ObjectId("5e0000000000000000000000"),
+    "uuid": uuid.UUID(int=1),
+    "timestamp": {
+        "requested": datetime.datetime(2020, 1, 2, 3, 4, 5, 678),
+        "reserved": datetime.datetime(2020, 1, 2),
+    },
+    "events": [{"code": "requested", "size": 1024}],
+}
+EXPECTED = {
+    "_id": "5e0000000000000000000000",
+    "uuid": "00000000-0000-0000-0000-000000000001",
+    "timestamp": {
+        "requested": "2020-01-02T03:04:05.000678Z",
+        "reserved": "2020-01-02T00:00:00Z",
+    },
+    "events": [{"code": "requested", "size": 1024}],
+}
+
+
+@pytest.fixture(params=[True, False], ids=["orjson", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param and utils.json.orjson is None:
+        pytest.skip("orjson is not installed")
+    monkeypatch.setattr(utils.json, "USE_ORJSON", request.param)
+    if request.param:
+        monkeypatch.setattr(
+            utils.json, "ORJSON_OPTIONS", utils.json.build_orjson_options()
+        )
+
+
+def test_dumps(backend):
+    assert loads(dumps(DOCUMENT)) == EXPECTED
+
+
+def test_encoder(backend):
+    assert json.loads(json.dumps(DOCUMENT, cls=Encoder, sort_keys=True)) == EXPECTED
+
+
+def test_encoder_flask_types(backend):
+    encoded = json.loads(
+        json.dumps(
+            {"html": Markup("<b>x</b>"), "date": datetime.date(2020, 1, 2)}, cls=Encoder
+        )
+    )
+    assert encoded["html"] == "<b>x</b>"
+    assert encoded["date"] == "Thu, 02 Jan 2020 00:00:00 GMT"
+
+
+def test_unknown_type(backend):
+    with pytest.raises(TypeError):
+        dumps({"set": {1, 2}})
+
+
+def test_encoder_aware_datetime(backend):
+    tz = datetime.timezone(datetime.timedelta(hours=2))
+    value = datetime.datetime(2020, 1, 2, 2, tzinfo=tz)
+    assert json.loads(json.dumps([value], cls=Encoder)) == ["2020-01-02T00:00:00Z"]
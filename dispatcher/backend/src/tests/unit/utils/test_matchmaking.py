@@ -0,0 +1,159 @@
+import datetime
+
+import pytest
+
+from utils.matchmaking import MatchmakingCache, get_duration_for_worker
+
+
+def make_requested_task(
+    _id, offliner="mwoffliner", cpu=1, priority=0, worker=None, schedule_name=None
+):
+    return {
+        "_id": _id,
+        "schedule_name": schedule_name or _id,
+        "config": {
+            "task_name": offliner,
+            "resources": {"cpu": cpu, "memory": 1024, "disk": 1024},
+        },
+        "priority": priority,
+        "worker": worker,
+    }
+
+
+def make_schedule(name, default=60, workers=None):
+    return {
+        "name": name,
+        "duration": {"default": {"value": default}, "workers": workers or {}},
+    }
+
+
+@pytest.fixture
+def worker():
+    return {
+        "name": "worker",
+        "username": "user",
+        "resources": {"cpu": 3, "memory": 2048, "disk": 2048},
+        "offliners": ["mwoffliner", "youtube"],
+    }
+
+
+@pytest.fixture
+def cache(worker):
+    cache = MatchmakingCache(ttl=60)
+    documents = dict(
+        requested_tasks=[
+            make_requested_task("short"),
+            make_requested_task("long", offliner="youtube"),
+            make_requested_task("too-big", cpu=4),
+            make_requested_task("urgent", priority=5, worker="worker"),
+            make_requested_task("pinned-elsewhere", worker="other"),
+            make_requested_task("other-offliner", offliner="gutenberg"),
+        ],
+        running_tasks=[
+            {"_id": "running", "schedule_name": "short", "worker": "worker"}
+        ],
+        schedules=[
+            make_schedule("short", default=60),
+            make_schedule("long", default=30, workers={"worker": {"value": 600}}),
+            make_schedule("urgent", default=10),
+        ],
+        workers=[worker],
+    )
+    cache.refresh = lambda: cache.load(**documents)
+    cache.ensure_fresh()
+    return cache
+
+
+def test_duration_for_worker():
+    duration = {
+        "default": {"value": 60},
+        "rolling": {"p90": 120, "on": None},
+        "workers": {"worker": {"value": 30}},
+    }
+    assert get_duration_for_worker(duration, "worker")["value"] == 30
+    assert get_duration_for_worker(duration, "other")["value"] == 120
+    duration["rolling"]["p90"] = None
+    assert get_duration_for_worker(duration, "other")["value"] == 60
+
+
+def test_doable_sorted(cache, worker):
+    tasks = cache.get_reqs_doable_by(worker)
+    assert [task["_id"] for task in tasks] == ["urgent", "long", "short"]
+    assert tasks[1]["duration"] == {"value": 600}
+
+
+def test_doable_selfish(cache, worker):
+    worker["selfish"] = True
+    assert [task["_id"] for task in cache.get_reqs_doable_by(worker)] == ["urgent"]
+
+
+def test_doable_memoized(cache, worker):
+    assert cache.get_reqs_doable_by(worker) is cache.get_reqs_doable_by(worker)
+
+
+def test_discard(cache, worker):
+    doable = cache.get_reqs_doable_by(worker)
+    cache.discard("urgent")
+    assert [task["_id"] for task in doable] == ["urgent", "long", "short"]
+    assert [task["_id"] for task in cache.get_reqs_doable_by(worker)] == [
+        "long",
+        "short",
+    ]
+    assert cache.is_fresh
+
+
+def test_running_tasks(cache):
+    tasks = cache.get_running_tasks("worker")
+    assert [task["_id"] for task in tasks] == ["running"]
+    assert tasks[0]["duration"] == {"value": 60}
+    assert cache.get_running_tasks("other") == []
+
+
+def test_get_worker(cache):
+    assert cache.get_worker("user", "worker")["name"] == "worker"
+    assert cache.get_worker("intruder", "worker") is None
+
+
+def test_freshness(cache):
+    assert cache.is_fresh
+    cache.invalidate()
+    assert not cache.is_fresh
+    assert not MatchmakingCache(ttl=0).enabled
+
+
+def test_invalidated_while_refreshing(cache):
+    load = cache.refresh
+
+    def refresh():
+        load()
+        cache.invalidate()
+
+    cache.invalidate()
+    cache.refresh = refresh
+    cache.ensure_fresh()
+    assert not cache.is_fresh
+
+
+def test_expiry(cache):
+    cache.loaded_on -= datetime.timedelta(minutes=2).total_seconds()
+    assert not cache.is_fresh
+
+
+def test_sync(cache, monkeypatch):
+    requested = [{"_id": "short"}]
+
+    class FakeRequestedTasks:
+        def find(self, query, projection):
+            return requested
+
+    monkeypatch.setattr("utils.matchmaking.RequestedTasks", FakeRequestedTasks)
+    cache.snapshot["requested_since"] = datetime.datetime(2021, 1, 1)
+    cache.sync()
+    assert cache.is_fresh
+
+    # requested by another process (scheduler)
+    requested.append({"_id": "new"})
+    loaded = []
+    cache.refresh = lambda: loaded.append(True)
+    cache.sync()
+    assert loaded == [True]
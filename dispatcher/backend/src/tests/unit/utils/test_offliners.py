@@ -0,0 +1,52 @@
+import pytest
+from marshmallow import ValidationError
+
+from common.constants import SECRET_REPLACEMENT
+from common.enum import Offliner
+from routes.utils import remove_secrets_from_response
+from utils.offliners import OFFLINERS, get_flags_schema, get_offliner_definition
+
+
+def test_registry_complete():
+    assert set(OFFLINERS.keys()) == set(Offliner.all())
+    assert get_offliner_definition("unknown") is None
+
+
+def test_secret_fields():
+    definition = get_offliner_definition(Offliner.mwoffliner)
+    assert "optimisationCacheUrl" in definition.secret_fields
+    assert "mwUrl" not in definition.secret_fields
+    assert get_offliner_definition(Offliner.phet).secret_fields == frozenset()
+
+
+def test_flags_schema_shared():
+    schema = get_flags_schema(Offliner.mwoffliner)
+    assert schema is get_flags_schema(Offliner.mwoffliner)
+    with pytest.raises(ValidationError):
+        schema.load({"mwUrl": "not-an-url"})
+
+
+def test_remove_secrets():
+    command = [
+        "mwoffliner",
+        '--mwUrl="https://fr.wikipedia.org"',
+        '--optimisationCacheUrl="https://secret"',
+    ]
+    task = {
+        "config": {
+            "task_name": Offliner.mwoffliner,
+            "flags": {
+                "mwUrl": "https://fr.wikipedia.org",
+                "optimisationCacheUrl": "https://secret",
+            },
+            "command": list(command),
+        },
+        "container": {"command": list(command)},
+    }
+    remove_secrets_from_response(task)
+    assert task["config"]["flags"]["optimisationCacheUrl"] == SECRET_REPLACEMENT
+    assert task["config"]["flags"]["mwUrl"] == "https://fr.wikipedia.org"
+    assert task["container"]["command"][2] == (
+        f'--optimisationCacheUrl="{SECRET_REPLACEMENT}"'
+    )
+    assert "secret" not in task["config"]["str_command"]
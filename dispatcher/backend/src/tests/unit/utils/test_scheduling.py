@@ -0,0 +1,47 @@
+import datetime
+
+import pytest
+
+from utils.scheduling import get_duration_stats, get_task_duration
+
+
+def make_task(exit_code=0, duration=3600):
+    started = datetime.datetime(2021, 1, 1)
+    return {
+        "container": {"exit_code": exit_code},
+        "timestamp": {
+            "started": started,
+            "scraper_completed": started + datetime.timedelta(seconds=duration),
+        },
+    }
+
+
+class TestDurationStats:
+    def test_empty(self):
+        assert get_duration_stats([]) == {"ewma": None, "p50": None, "p90": None}
+
+    def test_single_value(self):
+        assert get_duration_stats([60]) == {"ewma": 60, "p50": 60, "p90": 60}
+
+    def test_percentiles(self):
+        stats = get_duration_stats(list(range(10, 110, 10)))
+        assert stats["p50"] == 50
+        assert stats["p90"] == 90
+
+    def test_ewma_favors_recent(self):
+        assert get_duration_stats([100, 100, 100, 200])["ewma"] == 130
+        assert get_duration_stats([200, 100, 100, 100])["ewma"] < 150
+
+
+class TestTaskDuration:
+    def test_succeeded(self):
+        assert get_task_duration(make_task(duration=120)) == 120
+
+    @pytest.mark.parametrize("exit_code", [1, 137, None])
+    def test_failed(self, exit_code):
+        assert get_task_duration(make_task(exit_code=exit_code)) is None
+
+    def test_not_started(self):
+        task = make_task()
+        del task["timestamp"]["started"]
+        assert get_task_duration(task) is None
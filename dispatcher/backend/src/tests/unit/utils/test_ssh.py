@@ -0,0 +1,77 @@
+import base64
+
+import pytest
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from utils.ssh import PublicKeysCache, find_signing_key, verify_signature
+
+
+def generate_key():
+    return rsa.generate_private_key(65537, 2048, default_backend())
+
+
+def sign(private_key, message):
+    """what `openssl pkeyutl -sign` does: PKCS#1 v1.5 padding, no digest"""
+    size = private_key.key_size // 8
+    padded = b"\x00\x01" + b"\xff" * (size - len(message) - 3) + b"\x00" + message
+    numbers = private_key.private_numbers()
+    signed = pow(int.from_bytes(padded, "big"), numbers.d, numbers.public_numbers.n)
+    return signed.to_bytes(size, "big")
+
+
+def get_ssh_key(private_key, fingerprint, with_pkcs8=True):
+    public_key = private_key.public_key()
+    ssh_key = {
+        "fingerprint": fingerprint,
+        "key": public_key.public_bytes(
+            serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH
+        )
+        .decode("ASCII")
+        .split(" ", 1)[1],
+    }
+    if with_pkcs8:
+        ssh_key["pkcs8_key"] = public_key.public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode("ASCII")
+    return ssh_key
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return generate_key(), generate_key()
+
+
+def test_verify(keys):
+    message = b"bob:2020-01-01T00:00:00"
+    signature = sign(keys[0], message)
+    assert verify_signature(keys[0].public_key(), message, signature)
+    assert not verify_signature(keys[1].public_key(), message, signature)
+    assert not verify_signature(keys[0].public_key(), b"alice:2020", signature)
+    assert not verify_signature(keys[0].public_key(), message, b"garbage")
+
+
+def test_verify_sha256(keys):
+    message = b"bob:2020-01-01T00:00:00"
+    signature = keys[0].sign(message, padding.PKCS1v15(), hashes.SHA256())
+    assert verify_signature(keys[0].public_key(), message, signature)
+    assert not verify_signature(keys[1].public_key(), message, signature)
+    assert not verify_signature(keys[0].public_key(), b"alice:2020", signature)
+
+
+def test_find_signing_key(keys):
+    message = b"bob:2020-01-01T00:00:00"
+    ssh_keys = [get_ssh_key(keys[1], "aa"), get_ssh_key(keys[0], "bb", False)]
+    assert find_signing_key(ssh_keys, message, sign(keys[0], message)) is ssh_keys[1]
+    assert find_signing_key(ssh_keys[:1], message, sign(keys[0], message)) is None
+    assert find_signing_key([], message, base64.b64decode("AAAA")) is None
+
+
+def test_cache(keys):
+    cache = PublicKeysCache(size=1)
+    ssh_key = get_ssh_key(keys[0], "aa")
+    assert cache.get(ssh_key) is cache.get(ssh_key)
+    cache.get(get_ssh_key(keys[1], "bb"))
+    assert list(cache.keys.keys()) == ["bb"]
+    assert cache.get({"fingerprint": "cc", "key": "invalid"}) is None
@@ -0,0 +1,98 @@
+import jwt
+import pytest
+from bson import ObjectId
+
+from utils.token import (
+    AccessToken,
+    Keyring,
+    LoadedAccessToken,
+    VerifiedTokensCache,
+)
+
+
+def get_token():
+    return LoadedAccessToken(ObjectId(), "bob", {"tasks": {"update": True}}).encode()
+
+
+def test_cached():
+    cache = VerifiedTokensCache(size=2)
+    token = get_token()
+    payload = cache.get_payload(token)
+    assert payload.username == "bob"
+    assert isinstance(payload.user_id, ObjectId)
+    assert payload.get_permission("tasks", "update")
+    assert cache.get_payload(token) is payload
+
+
+def test_bounded():
+    cache = VerifiedTokensCache(size=2)
+    tokens = [get_token() for _ in range(3)]
+    payloads = [cache.get_payload(token) for token in tokens]
+    assert list(cache.tokens.keys()) == tokens[1:]
+    assert cache.get_payload(tokens[0]) is not payloads[0]
+
+
+def test_disabled():
+    cache = VerifiedTokensCache(size=0)
+    token = get_token()
+    assert cache.get_payload(token) is not cache.get_payload(token)
+
+
+def test_invalid_not_cached():
+    cache = VerifiedTokensCache(size=2)
+    with pytest.raises(jwt.exceptions.InvalidTokenError):
+        cache.get_payload(get_token() + "x")
+    assert not cache.tokens
+
+
+def test_not_served_after_expiry(monkeypatch):
+    cache = VerifiedTokensCache(size=2)
+    token = get_token()
+    payload = cache.get_payload(token)
+    expire_on = AccessToken.decode(token)["exp"]
+    monkeypatch.setattr("utils.token.time.time", lambda: expire_on + 1)
+    # verified again (jwt raises if it's actually expired)
+    assert cache.get_payload(token) is not payload
+
+
+def test_expired():
+    token = AccessToken.encode({"_id": ObjectId(), "username": "bob", "scope": {}})
+    jwt_payload = AccessToken.decode(token)
+    jwt_payload["exp"] = jwt_payload["iat"] - 1
+    expired = jwt.encode(
+        jwt_payload,
+        key=AccessToken.keyring.signing_key,
+        algorithm="HS256",
+        headers={"kid": AccessToken.keyring.signing_kid},
+    )
+    with pytest.raises(jwt.exceptions.ExpiredSignatureError):
+        VerifiedTokensCache(size=2).get_payload(expired.decode("utf-8"))
+
+
+def test_keyring_parse():
+    keyring = Keyring.parse(["# comment", "new:secret:with:colons", "", " old : s2 "])
+    assert keyring.signing_kid == "new"
+    assert keyring.signing_key == "secret:with:colons"
+    assert keyring.get("old") == "s2"
+    assert Keyring.parse(["alone"]).signing_kid == "default"
+    with pytest.raises(ValueError):
+        Keyring.parse(["a:1", "a:2"])
+    with pytest.raises(ValueError):
+        Keyring.parse(["# nothing"])
+
+
+def test_keyring_rotation(monkeypatch):
+    user = {"_id": ObjectId(), "username": "bob", "scope": {}}
+    monkeypatch.setattr(AccessToken, "keyring", Keyring.parse(["old:s1"]))
+    old_token = AccessToken.encode(user)
+    assert jwt.get_unverified_header(old_token)["kid"] == "old"
+
+    # new key signs, old one still accepted
+    monkeypatch.setattr(AccessToken, "keyring", Keyring.parse(["new:s2", "old:s1"]))
+    assert jwt.get_unverified_header(AccessToken.encode(user))["kid"] == "new"
+    assert AccessToken.decode(old_token)["user"]["username"] == "bob"
+
+    # old key removed
+    monkeypatch.setattr(AccessToken, "keyring", Keyring.parse(["new:s2"]))
+    with pytest.raises(jwt.exceptions.InvalidTokenError):
+        AccessToken.decode(old_token)
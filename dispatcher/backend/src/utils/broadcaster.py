@@ -3,38 +3,196 @@
 # vim: ai ts=4 sts=4 et sw=4 nu
 
 import os
-import json
+import time
+import queue
+import atexit
 import logging
+import threading
 
 import zmq
 
-from utils.json import Encoder
+from common.constants import BROADCASTER_QUEUE_SIZE, BROADCASTER_STATS_INTERVAL
+from utils.json import dumps_bytes
 
 logger = logging.getLogger(__name__)
 
+# messages superseded by a later one for the same task: (key, event)
+COALESCED = {("task-event", "scraper_running")}
+# max number of messages taken off the queue (and coalesced) at once
+BATCH_SIZE = 100
+
 
 class MessageBroadcaster:
-    def __init__(self, uri):
+    """publishes messages to the relay from a dedicated sender thread
+
+    `send()` only enqueues so requests never wait on the relay. The queue is
+    bounded: messages are dropped (and counted) once it's full.
+    The ZMQ socket (not thread-safe) is created and only used by the sender
+    thread, which is (re)started lazily in each process (uwsgi forks).
+
+    Payloads are serialized by the sender thread: don't alter them once sent.
+    Statistics are logged every `stats_interval` seconds by the sender thread."""
+
+    def __init__(
+        self,
+        uri,
+        queue_size=BROADCASTER_QUEUE_SIZE,
+        stats_interval=BROADCASTER_STATS_INTERVAL,
+    ):
         self.uri = uri
+        self.queue_size = queue_size
+        self.stats_interval = stats_interval
+        self.pid = None
+        self.queue = None
+        self.thread = None
+        self.stats = {}
+        self.reset_locks()
+
+    def reset_locks(self):
+        """new synchronization primitives. Called in forked processes as those
+        inherited might have been held by our (not inherited) sender thread"""
+        self.lock = threading.Lock()  # sender thread start
+        self.stats_lock = threading.Lock()
+        self.should_stop = threading.Event()
+
+    def connect(self):
+        """PUB socket connected to relay, None if not possible"""
         try:
             context = zmq.Context()
-            self.socket = context.socket(zmq.PUB)
-            self.socket.connect(uri)
+            socket = context.socket(zmq.PUB)
+            # time allowed to send pending messages on close
+            socket.setsockopt(zmq.LINGER, 1000)
+            socket.connect(self.uri)
         except zmq.error.ZMQError:
-            self.dummy = True
             logger.error("Unable to connect to zmq relay. faking it.")
-        else:
-            self.dummy = False
+            return None
+        return socket
+
+    def start(self):
+        """start sender thread if not running in this process"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # a forked process inherits our attributes but not our thread
+            self.queue = queue.Queue(maxsize=self.queue_size)
+            self.stats = {
+                "queued": 0,
+                "sent": 0,
+                "coalesced": 0,
+                "dropped": 0,
+                "failed": 0,
+                "max_depth": 0,
+            }
+            self.should_stop.clear()
+            self.thread = threading.Thread(
+                target=self.run, name="broadcaster", daemon=True
+            )
+            self.thread.start()
+            self.pid = os.getpid()
+
+    def stop(self, timeout=2):
+        """let sender thread send what's queued and exit"""
+        if self.pid != os.getpid():
+            return
+        self.should_stop.set()
+        self.thread.join(timeout)
+
+    @property
+    def depth(self):
+        return self.queue.qsize() if self.queue else 0
+
+    def count(self, name, value=1):
+        """increment a statistic. Updated from both request and sender threads"""
+        with self.stats_lock:
+            self.stats[name] += value
+            return self.stats[name]
+
+    def get_stats(self):
+        """copy of statistics with current queue depth"""
+        with self.stats_lock:
+            return dict(self.stats, depth=self.depth)
+
+    def log_stats(self):
+        logger.info(
+            "[STATS] "
+            + ", ".join(f"{name}: {value}" for name, value in self.get_stats().items())
+        )
 
     def send(self, key, payload):
-        if self.dummy:
-            logger.debug(f"[DUMMY] {key} {payload}")
+        self.start()
+        try:
+            self.queue.put_nowait((key, payload))
+        except queue.Full:
+            dropped = self.count("dropped")
+            # don't flood logs while relay is unreachable
+            if dropped % 100 == 1:
+                logger.warning(
+                    f"broadcast queue full, dropped {dropped} "
+                    f"messages so far (latest on `{key}`)"
+                )
             return
+        depth = self.depth
+        with self.stats_lock:
+            self.stats["queued"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], depth)
+
+    def get_batch(self):
+        """messages from queue (empty if none within .5s), None if stopping"""
         try:
-            self.socket.send_string(f"{key} {json.dumps(payload, cls=Encoder)}")
-        except Exception as exc:
-            logger.error(f"unable to brodcast on `{key}` with payload={payload}")
-            logger.exception(exc)
+            messages = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return None if self.should_stop.is_set() else []
+        while len(messages) < BATCH_SIZE:
+            try:
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+
+    def coalesce(self, messages):
+        """messages without those superseded by a later one (same task)"""
+        latest = {}
+        for index, (key, payload) in enumerate(messages):
+            if isinstance(payload, dict) and (key, payload.get("event")) in COALESCED:
+                latest[(key, payload.get("event"), str(payload.get("_id")))] = index
+        kept = [
+            (key, payload)
+            for index, (key, payload) in enumerate(messages)
+            if not isinstance(payload, dict)
+            or (key, payload.get("event")) not in COALESCED
+            or latest[(key, payload.get("event"), str(payload.get("_id")))] == index
+        ]
+        if len(kept) < len(messages):
+            self.count("coalesced", len(messages) - len(kept))
+        return kept
+
+    def run(self):
+        socket = self.connect()
+        next_stats_on = time.monotonic() + self.stats_interval
+        while True:
+            messages = self.get_batch()
+            if messages is None:
+                break
+            if self.stats_interval and time.monotonic() >= next_stats_on:
+                self.log_stats()
+                next_stats_on = time.monotonic() + self.stats_interval
+            for key, payload in self.coalesce(messages):
+                if socket is None:
+                    logger.debug(f"[DUMMY] {key} {payload}")
+                    continue
+                try:
+                    socket.send(f"{key} ".encode("utf-8") + dumps_bytes(payload))
+                    self.count("sent")
+                except Exception as exc:
+                    self.count("failed")
+                    logger.error(
+                        f"unable to brodcast on `{key}` with payload={payload}"
+                    )
+                    logger.exception(exc)
+        if socket is not None:
+            socket.close()
 
     def broadcast_dispatcher_started(self):
         self.send("dispatcher-started", {})
@@ -48,10 +206,10 @@ class MessageBroadcaster:
     def broadcast_cancel_task(self, task_id):
         self.send("cancel-task", task_id)
 
-    def broadcast_updated_task(self, task_id, event, payload={}):
+    def broadcast_updated_task(self, task_id, event, payload=None):
         try:
-            payload["_id"] = task_id
-            payload["event"] = event
+            # copy as it's serialized later on
+            payload = dict(payload or {}, _id=task_id, event=event)
         except Exception:
             logger.error("received non-dict payload.")
             payload = {"_id": task_id, "event": event}
@@ -60,5 +218,11 @@ class MessageBroadcaster:
     def broadcast_worker_checkin(self, payload):
         self.send("worker-checkin", payload)
 
+    def broadcast_worker_event(self, worker_name, event):
+        self.send(f"worker-event.{worker_name}", event)
+
 
 BROADCASTER = MessageBroadcaster(os.getenv("SOCKET_URI", "tcp://localhost:5000"))
+# short-lived processes (periodic tasks) exit right after sending
+atexit.register(BROADCASTER.stop)
+os.register_at_fork(after_in_child=BROADCASTER.reset_locks)
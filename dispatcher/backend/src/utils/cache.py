@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import abc
+import time
+import threading
+
+
+class TTLCache(abc.ABC):
+    """data loaded from database and kept in memory for `ttl` seconds
+
+    Local writes call `invalidate()` so they're seen on next access."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.loaded_on = None
+        # bumped on invalidation so a refresh running meanwhile isn't trusted
+        self.generation = 0
+
+    def invalidate(self):
+        """force refresh on next access"""
+        self.generation += 1
+        self.loaded_on = None
+
+    @property
+    def is_fresh(self):
+        return (
+            self.loaded_on is not None and time.monotonic() - self.loaded_on < self.ttl
+        )
+
+    def ensure_fresh(self):
+        """refresh data if expired, once for all waiting threads"""
+        if not self.is_fresh:
+            with self.lock:
+                # another thread might have refreshed it while we waited
+                if not self.is_fresh:
+                    generation, started_on = self.generation, time.monotonic()
+                    self.refresh()
+                    # invalidated while loading: data might miss that write
+                    if self.generation == generation:
+                        self.loaded_on = started_on
+
+    @abc.abstractmethod
+    def refresh(self):
+        """load data from database (with lock held)"""
@@ -14,6 +14,8 @@ class Initializer:
         mongo.Schedules().initialize()
         mongo.Tasks().initialize()
         mongo.RequestedTasks().initialize()
+        mongo.WorkerEvents().initialize()
+        mongo.Notifications().initialize()
 
     @staticmethod
     def create_initial_user():
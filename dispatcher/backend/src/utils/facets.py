@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import logging
+
+from common.constants import FACETS_CACHE_TTL
+from common.mongo import Schedules
+from utils.cache import TTLCache
+from utils.json import get_etag_for
+
+logger = logging.getLogger(__name__)
+
+
+def by_value(field):
+    """$facet pipeline grouping schedules on a field, with counts"""
+    return [
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "value": "$_id", "count": 1}},
+    ]
+
+
+FACETS_PIPELINE = [
+    {
+        "$facet": {
+            "tags": [{"$project": {"tags": 1}}, {"$unwind": "$tags"}]
+            + by_value("tags"),
+            "languages": [
+                {
+                    "$group": {
+                        "_id": "$language.code",
+                        "name_en": {"$first": "$language.name_en"},
+                        "name_native": {"$first": "$language.name_native"},
+                        "count": {"$sum": 1},
+                    }
+                },
+                {"$sort": {"name_en": 1}},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "code": "$_id",
+                        "name_en": 1,
+                        "name_native": 1,
+                        "count": 1,
+                    }
+                },
+            ],
+            "categories": by_value("category"),
+            "offliners": by_value("config.task_name"),
+        }
+    }
+]
+
+
+class FacetsCache(TTLCache):
+    """tags, languages, categories and offliners of schedules, with counts
+
+    Computed in a single aggregation then kept in memory for `ttl` seconds
+    or until invalidated by a local schedule write.
+    Each facet has an ETag derived from its content so it's consistent
+    across processes."""
+
+    def __init__(self, ttl):
+        super().__init__(ttl)
+        self.facets = None
+
+    def refresh(self):
+        # swapped at once so readers never mix values and etag
+        self.facets = {
+            name: (values, get_etag_for(values))
+            for name, values in next(Schedules().aggregate(FACETS_PIPELINE)).items()
+        }
+        logger.debug("refreshed schedules facets")
+
+    def get_all(self):
+        """{name: (values, etag)} of all facets"""
+        self.ensure_fresh()
+        return self.facets
+
+    def get(self, name):
+        """(values, etag) of a facet"""
+        return self.get_all()[name]
+
+
+FACETS = FacetsCache(FACETS_CACHE_TTL)
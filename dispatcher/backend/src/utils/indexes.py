@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" canonical shapes of the dispatcher's frequent queries
+
+    Indexes are declared in the `initialize()` of each collection (common.mongo).
+    `check_queries()` ensures each of those shapes is served by an index """
+
+import logging
+
+from common.enum import TaskStatus
+from common.mongo import Tasks, Schedules, RequestedTasks
+
+logger = logging.getLogger(__name__)
+
+WORKER = "worker_name"
+SCHEDULE = "schedule_name"
+
+# name: (collection, filter, sort)
+CANONICAL_QUERIES = {
+    "tasks_running_for_worker": (
+        Tasks,
+        {"status": {"$nin": TaskStatus.complete()}, "worker": WORKER},
+        None,
+    ),
+    "tasks_successful_for_schedule": (
+        Tasks,
+        {
+            "schedule_name": SCHEDULE,
+            f"timestamp.{TaskStatus.scraper_completed}": {"$exists": True},
+            f"timestamp.{TaskStatus.started}": {"$exists": True},
+            "container.exit_code": 0,
+        },
+        [(f"timestamp.{TaskStatus.scraper_completed}", 1)],
+    ),
+    "tasks_for_schedule": (
+        Tasks,
+        {"schedule_name": SCHEDULE},
+        [("updated_at", -1)],
+    ),
+    "tasks_list": (Tasks, {}, [("updated_at", -1)]),
+    "tasks_list_for_statuses": (
+        Tasks,
+        {"status": {"$in": [TaskStatus.started, TaskStatus.scraper_started]}},
+        [("updated_at", -1)],
+    ),
+    "requested_tasks_doable_by_worker": (
+        RequestedTasks,
+        {
+            "config.resources.cpu": {"$lte": 3},
+            "config.resources.memory": {"$lte": 2 ** 30},
+            "config.resources.disk": {"$lte": 2 ** 30},
+            "config.task_name": {"$in": ["mwoffliner", "youtube"]},
+            "worker": {"$in": [WORKER, None]},
+        },
+        None,
+    ),
+    "requested_tasks_list": (
+        RequestedTasks,
+        {},
+        [("priority", -1), ("timestamp.reserved", -1), ("timestamp.requested", -1)],
+    ),
+    "requested_tasks_for_schedule": (
+        RequestedTasks,
+        {"schedule_name": SCHEDULE},
+        None,
+    ),
+    "schedules_enabled_for_periodicity": (
+        Schedules,
+        {"enabled": True, "periodicity": "monthly"},
+        None,
+    ),
+}
+
+
+def get_plan_stages(plan):
+    """flat list of stage names from a (nested) explain plan"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages += get_plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            stages += get_plan_stages(item)
+    return stages
+
+
+def explain_query(collection, query, sort=None):
+    """stages of the winning plan for this query"""
+    cursor = collection().find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    return get_plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+
+
+def check_queries():
+    """{name: stages} of canonical queries that are not served by an index"""
+    failures = {}
+    for name, (collection, query, sort) in CANONICAL_QUERIES.items():
+        stages = explain_query(collection, query, sort)
+        if "COLLSCAN" in stages:
+            logger.error(f"{name} scans collection: {' < '.join(stages)}")
+            failures[name] = stages
+        else:
+            logger.info(f"{name} uses index: {' < '.join(stages)}")
+    return failures
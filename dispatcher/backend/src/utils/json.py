@@ -1,16 +1,95 @@
+""" JSON serialization of API responses, broadcasted messages and notifications
+
+    Uses orjson (if installed and not disabled via JSON_BACKEND) which natively
+    handles datetime and UUID. Falls back to the stdlib json module. """
+
+import json
+import hashlib
+import logging
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
 
 from bson.objectid import ObjectId
 from flask.json import JSONEncoder
 
+from common.constants import JSON_BACKEND
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+if JSON_BACKEND == "orjson" and orjson is None:
+    logger.warning("orjson is not installed, using stdlib json")
+USE_ORJSON = JSON_BACKEND == "orjson" and orjson is not None
+
+
+def build_orjson_options():
+    # naive datetimes (all we get from mongo) are UTC, serialized with Z suffix
+    return orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+ORJSON_OPTIONS = build_orjson_options() if USE_ORJSON else None
+
+
+def default(o):
+    """serializable version of types unknown to JSON libraries"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime):
+        if o.tzinfo is not None:
+            o = o.astimezone(timezone.utc).replace(tzinfo=None)
+        return o.isoformat() + "Z"
+    if isinstance(o, UUID):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
 
 class Encoder(JSONEncoder):
+    """Flask's JSON encoder (jsonify), delegating to orjson if in use"""
+
     def default(self, o):
-        if isinstance(o, datetime):
-            return o.isoformat() + "Z"
-        if isinstance(o, UUID):
-            return str(o)
-        if isinstance(o, ObjectId):
-            return str(o)
-        super().default(o)
+        try:
+            return default(o)
+        except TypeError:
+            # date, __html__ and others handled by Flask
+            return super().default(o)
+
+    def encode(self, o):
+        if not USE_ORJSON:
+            return super().encode(o)
+        # dates to default() so they're serialized as by Flask (HTTP date)
+        option = ORJSON_OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.indent:
+            option |= orjson.OPT_INDENT_2
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(o, default=self.default, option=option).decode("utf-8")
+
+
+def dumps_bytes(obj) -> bytes:
+    """UTF-8 encoded JSON of obj"""
+    if USE_ORJSON:
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=default).encode("utf-8")
+
+
+def dumps(obj) -> str:
+    """JSON of obj"""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def loads(data):
+    """object from JSON str or bytes"""
+    if USE_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def get_etag_for(values) -> str:
+    """ETag of JSON-serializable values, stable across processes"""
+    return hashlib.sha256(
+        json.dumps(values, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:32]
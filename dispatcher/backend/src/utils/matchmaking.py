@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+import time
+import logging
+import datetime
+
+from common import getnow
+from common.enum import TaskStatus
+from common.constants import MATCHMAKING_CACHE_TTL, DEFAULT_SCHEDULE_DURATION
+from common.mongo import Tasks, Schedules, Workers, RequestedTasks
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# requested tasks are inserted shortly after being timestamped: those requested
+# that long before a snapshot is loaded are checked for on sync()
+REQUESTED_MARGIN = datetime.timedelta(seconds=10)
+
+WORKER_PROJECTION = {
+    "_id": 0,
+    "username": 1,
+    "resources": 1,
+    "offliners": 1,
+    "last_seen": 1,
+    "name": 1,
+    "selfish": 1,
+    "platforms": 1,
+}
+REQUESTED_TASK_PROJECTION = {
+    "_id": 1,
+    "status": 1,
+    "schedule_name": 1,
+    "config.task_name": 1,
+    "config.platform": 1,
+    "config.resources": 1,
+    "timestamp.requested": 1,
+    "requested_by": 1,
+    "priority": 1,
+    "worker": 1,
+}
+RUNNING_TASK_PROJECTION = {
+    "config.resources": 1,
+    "config.platform": 1,
+    "schedule_name": 1,
+    "timestamp": 1,
+    "worker": 1,
+}
+
+
+def get_duration_for_worker(duration, worker_name):
+    """duration doc for a worker from a schedule's duration
+
+    falls back to the schedule's rolling p90 (other workers) then default one"""
+    if worker_name in duration["workers"]:
+        return duration["workers"][worker_name]
+    if duration.get("rolling", {}).get("p90") is not None:
+        return {
+            "value": duration["rolling"]["p90"],
+            "on": duration["rolling"]["on"],
+            "worker": None,
+            "task": None,
+        }
+    return duration["default"]
+
+
+class MatchmakingCache(TTLCache):
+    """in-memory snapshot of what's needed to match a worker with a requested task
+
+    - requested tasks indexed by offliner and pinned worker (None if not pinned)
+    - not-completed tasks indexed by worker
+    - durations of the schedules of those tasks
+    - checked-in workers
+
+    Snapshot is reloaded once older than `ttl` seconds or after being invalidated
+    by a local write. Tasks requested by other processes (API, scheduler) are
+    found by `sync()` on each poll. Other writes from other processes are seen
+    within `ttl` and a stale candidate is caught on reservation (in database).
+
+    Sorted candidates are memoized per worker for the snapshot's lifetime
+    so consecutive polls are answered without touching the database."""
+
+    def __init__(self, ttl):
+        super().__init__(ttl)
+        self.snapshot = None
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get_snapshot(self):
+        self.ensure_fresh()
+        return self.snapshot
+
+    def sync(self):
+        """reload snapshot if tasks were requested elsewhere since it was loaded
+
+        Single indexed query, to be called once per worker poll"""
+        snapshot = self.get_snapshot()
+        if snapshot["requested_since"] is None:
+            return
+        for task in RequestedTasks().find(
+            {"timestamp.requested": {"$gte": snapshot["requested_since"]}}, {"_id": 1}
+        ):
+            if task["_id"] not in snapshot["requested_ids"]:
+                logger.debug(f"{task['_id']} requested elsewhere, reloading")
+                self.invalidate()
+                self.ensure_fresh()
+                return
+
+    def refresh(self):
+        started_on = time.monotonic()
+        requested_since = getnow() - REQUESTED_MARGIN
+        requested_tasks = list(RequestedTasks().find({}, REQUESTED_TASK_PROJECTION))
+        running_tasks = list(
+            Tasks().find(
+                {"status": {"$nin": TaskStatus.complete()}}, RUNNING_TASK_PROJECTION
+            )
+        )
+        schedule_names = {task["schedule_name"] for task in requested_tasks}
+        schedule_names |= {task["schedule_name"] for task in running_tasks}
+        schedules = list(
+            Schedules().find(
+                {"name": {"$in": list(schedule_names)}}, {"name": 1, "duration": 1}
+            )
+        )
+        workers = list(Workers().find({}, WORKER_PROJECTION))
+
+        self.load(requested_tasks, running_tasks, schedules, workers)
+        self.snapshot["requested_since"] = requested_since
+        logger.debug(
+            f"loaded matchmaking snapshot with {len(requested_tasks)} requested "
+            f"and {len(running_tasks)} running tasks "
+            f"in {time.monotonic() - started_on:.3f}s"
+        )
+
+    def load(self, requested_tasks, running_tasks, schedules, workers):
+        """replace snapshot with those documents"""
+        requested = {}
+        for task in requested_tasks:
+            key = (task["config"]["task_name"], task.get("worker"))
+            requested.setdefault(key, []).append(task)
+
+        running = {}
+        for task in running_tasks:
+            running.setdefault(task.get("worker"), []).append(task)
+
+        # swapped at once so readers never see a partial snapshot
+        self.snapshot = {
+            "requested": requested,
+            "running": running,
+            "durations": {
+                schedule["name"]: schedule["duration"] for schedule in schedules
+            },
+            "workers": {worker["name"]: worker for worker in workers},
+            "doable": {},
+            "requested_ids": {task["_id"] for task in requested_tasks},
+            "requested_since": None,
+        }
+
+    def discard(self, requested_task_id):
+        """remove a requested task (reserved elsewhere) from current snapshot
+
+        Lists are replaced, not altered, as readers might be iterating them"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return
+
+        def without(tasks):
+            return [task for task in tasks if task["_id"] != requested_task_id]
+
+        for key, tasks in list(snapshot["requested"].items()):
+            snapshot["requested"][key] = without(tasks)
+        for name, doable in list(snapshot["doable"].items()):
+            snapshot["doable"][name] = dict(doable, tasks=without(doable["tasks"]))
+
+    def get_worker(self, username, worker_name):
+        """worker document if checked-in by username"""
+        worker = self.get_snapshot()["workers"].get(worker_name)
+        if worker is None:
+            # might have checked-in on another process since snapshot
+            worker = Workers().find_one({"name": worker_name}, WORKER_PROJECTION)
+        if worker is None or worker["username"] != username:
+            return None
+        return worker
+
+    def get_duration_for(self, schedule_name, worker_name):
+        """duration doc for a schedule and worker, None if schedule is unknown"""
+        duration = self.get_snapshot()["durations"].get(schedule_name)
+        if duration is None:
+            return None
+        return get_duration_for_worker(duration, worker_name)
+
+    def get_running_tasks(self, worker_name):
+        """copies of tasks being run by worker, with their `duration` doc"""
+        return [
+            dict(
+                task, duration=self.get_duration_for(task["schedule_name"], worker_name)
+            )
+            for task in self.get_snapshot()["running"].get(worker_name, [])
+        ]
+
+    def get_reqs_doable_by(self, worker):
+        """list of requested tasks doable by a worker using all its resources
+
+        - sorted by priority
+        - sorted by duration (longest first)
+
+        Returned documents are shared with further calls and must not be altered"""
+        snapshot = self.get_snapshot()
+        doable = snapshot["doable"].get(worker["name"])
+        if doable is not None and doable["worker"] == worker:
+            return doable["tasks"]
+
+        workers = [worker["name"]]
+        if not worker.get("selfish", False):
+            workers.append(None)
+
+        tasks = []
+        for offliner in worker["offliners"]:
+            for pinned_worker in workers:
+                for task in snapshot["requested"].get((offliner, pinned_worker), []):
+                    if any(
+                        task["config"]["resources"][res_key]
+                        > worker["resources"][res_key]
+                        for res_key in ("cpu", "memory", "disk")
+                    ):
+                        continue
+                    duration = self.get_duration_for(
+                        task["schedule_name"], worker["name"]
+                    )
+                    tasks.append(
+                        dict(
+                            task,
+                            duration={
+                                "value": duration["value"]
+                                if duration
+                                else int(DEFAULT_SCHEDULE_DURATION)
+                            },
+                        )
+                    )
+
+        tasks.sort(
+            key=lambda task: (task.get("priority", 0), task["duration"]["value"]),
+            reverse=True,
+        )
+        snapshot["doable"][worker["name"]] = {"worker": worker, "tasks": tasks}
+        return tasks
+
+
+MATCHMAKING = MatchmakingCache(MATCHMAKING_CACHE_TTL)
@@ -3,8 +3,13 @@
 # vim: ai ts=4 sts=4 et sw=4 nu
 
 import pathlib
+import collections
+
+from marshmallow import Schema
 
 from common.enum import Offliner
+from common.schemas.models import ScheduleConfigSchema
+from utils.json import get_etag_for
 from typing import List
 
 
@@ -143,3 +148,38 @@ def expanded_config(config):
 def build_str_command(args: List[str]):
     """string version of the command to be run by the worker"""
     return " ".join(args)
+
+
+# what routes need from an offliner's flags schema, computed once at import
+OfflinerDefinition = collections.namedtuple(
+    "OfflinerDefinition", ["schema", "desc", "etag", "secret_fields"]
+)
+
+
+def build_offliner_definition(offliner):
+    schema = ScheduleConfigSchema.get_offliner_schema(offliner)()
+    desc = schema.to_desc()
+    return OfflinerDefinition(
+        schema=schema,
+        desc=desc,
+        etag=get_etag_for(desc),
+        secret_fields=frozenset(
+            field["data_key"] for field in desc if field.get("secret", False)
+        ),
+    )
+
+
+OFFLINERS = {
+    offliner: build_offliner_definition(offliner) for offliner in Offliner.all()
+}
+
+
+def get_offliner_definition(offliner):
+    """OfflinerDefinition of an offliner, None if unknown"""
+    return OFFLINERS.get(offliner)
+
+
+def get_flags_schema(offliner):
+    """shared flags schema instance of an offliner"""
+    definition = get_offliner_definition(offliner)
+    return definition.schema if definition else Schema()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 # vim: ai ts=4 sts=4 et sw=4 nu
 
+import math
 import logging
 import datetime
 import functools
@@ -21,8 +22,13 @@ from common.constants import (
 )
 from common.enum import TaskStatus, SchedulePeriodicity, Platform
 from utils.offliners import expanded_config
+from utils.matchmaking import MATCHMAKING, get_duration_for_worker
 from common.mongo import Tasks, Schedules, Workers, RequestedTasks
-from common.constants import DEFAULT_SCHEDULE_DURATION
+from common.constants import (
+    DEFAULT_SCHEDULE_DURATION,
+    DURATION_HISTORY_SIZE,
+    DURATION_EWMA_ALPHA,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -36,10 +42,145 @@ def get_default_duration():
     }
 
 
-def update_schedule_duration(schedule_name):
-    """set/update the `duration` object of a schedule by looking at its recent tasks
+def get_duration_stats(values):
+    """rolling statistics (ewma, p50, p90) of a list of durations (oldest first)"""
+    if not values:
+        return {"ewma": None, "p50": None, "p90": None}
+
+    ewma = values[0]
+    for value in values[1:]:
+        ewma = DURATION_EWMA_ALPHA * value + (1 - DURATION_EWMA_ALPHA) * ewma
+
+    ordered = sorted(values)
+
+    def percentile(rank):
+        # nearest-rank method
+        return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+    return {"ewma": int(ewma), "p50": percentile(50), "p90": percentile(90)}
+
+
+def get_duration_stats_expression(values):
+    """aggregation expressions of `get_duration_stats()` for a `values` expression
+
+    Percentiles use the nearest-rank method without sorting (not available
+    in aggregation): smallest value with at least `rank` values lower or equal"""
+
+    def percentile(rank):
+        nb_wanted = {
+            "$max": [{"$ceil": {"$multiply": [rank / 100, {"$size": values}]}}, 1]
+        }
+        return {
+            "$min": {
+                "$filter": {
+                    "input": values,
+                    "as": "candidate",
+                    "cond": {
+                        "$gte": [
+                            {
+                                "$size": {
+                                    "$filter": {
+                                        "input": values,
+                                        "as": "other",
+                                        "cond": {"$lte": ["$$other", "$$candidate"]},
+                                    }
+                                }
+                            },
+                            nb_wanted,
+                        ]
+                    },
+                }
+            }
+        }
+
+    ewma = {
+        "$reduce": {
+            "input": values,
+            "initialValue": None,
+            "in": {
+                "$cond": [
+                    {"$eq": ["$$value", None]},
+                    "$$this",
+                    {
+                        "$add": [
+                            {"$multiply": [DURATION_EWMA_ALPHA, "$$this"]},
+                            {"$multiply": [1 - DURATION_EWMA_ALPHA, "$$value"]},
+                        ]
+                    },
+                ]
+            },
+        }
+    }
+    return {"ewma": {"$toInt": ewma}, "p50": percentile(50), "p90": percentile(90)}
+
+
+def get_task_duration(task):
+    """duration (seconds) of a task's scraper if it completed successfuly else None
 
     value is computed with `scraper_completed - started` timestamps"""
+    if task.get("container", {}).get("exit_code") != 0:
+        return None
+    started = task.get("timestamp", {}).get(TaskStatus.started)
+    completed = task.get("timestamp", {}).get(TaskStatus.scraper_completed)
+    if not started or not completed:
+        return None
+    return int((completed - started).total_seconds())
+
+
+def update_schedule_duration_with(task):
+    """update the `duration` object of a schedule with a just-completed task
+
+    Constant-time alternative to `update_schedule_duration()`: records task as
+    its worker's duration and pushes it to the rolling statistics.
+    task must contain `schedule_name`, `worker`, `timestamp` and `container.exit_code`
+    """
+    value = get_task_duration(task)
+    if value is None:
+        return
+
+    completed_on = task["timestamp"][TaskStatus.scraper_completed]
+    values = "$duration.rolling.values"
+    # single (atomic) update so concurrent completions can't store stats
+    # computed from another list of values
+    Schedules().update_one(
+        {"name": task["schedule_name"]},
+        [
+            {
+                "$set": {
+                    "duration.available": True,
+                    f"duration.workers.{task['worker']}": {
+                        "$literal": {
+                            "worker": task["worker"],
+                            "task": task["_id"],
+                            "value": value,
+                            "on": completed_on,
+                        }
+                    },
+                    "duration.rolling.values": {
+                        "$slice": [
+                            {"$concatArrays": [{"$ifNull": [values, []]}, [value]]},
+                            -DURATION_HISTORY_SIZE,
+                        ]
+                    },
+                    "duration.rolling.on": completed_on,
+                    "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                }
+            },
+            {
+                "$set": {
+                    f"duration.rolling.{key}": expression
+                    for key, expression in get_duration_stats_expression(values).items()
+                }
+            },
+        ],
+    )
+
+
+def update_schedule_duration(schedule_name):
+    """set/update the `duration` object of a schedule by looking at all its tasks
+
+    Scans all successful tasks of the schedule: meant for backfilling only,
+    completed tasks are accounted for via `update_schedule_duration_with()`"""
 
     schedule_query = {"name": schedule_name}
 
@@ -55,58 +196,41 @@ def update_schedule_duration(schedule_name):
         "default": get_default_duration(),
     }
 
+    tasks = list(
+        Tasks()
+        .find(query, {"timestamp": 1, "worker": 1, "container.exit_code": 1})
+        .sort(f"timestamp.{TaskStatus.scraper_completed}", pymongo.ASCENDING)
+    )
+
     # we have no finished task for this schedule, using default duration
-    if Tasks().count_documents(query) == 0:
+    if not tasks:
         document.update({"available": False, "workers": {}})
 
     # compute duration from last completed tasks
     else:
-        tasks = (
-            Tasks()
-            .find(query, {"timestamp": 1, "worker": 1})
-            .sort(f"timestamp.{TaskStatus.scraper_completed}", pymongo.ASCENDING)
-        )
-
         workers = {
             task["worker"]: {
                 "worker": task["worker"],
                 "task": task["_id"],
-                "value": int(
-                    (
-                        task["timestamp"]["scraper_completed"]
-                        - task["timestamp"]["started"]
-                    ).total_seconds()
-                ),
+                "value": get_task_duration(task),
                 "on": task["timestamp"][TaskStatus.scraper_completed],
             }
             for task in tasks
         }
-        if workers:
-            document.update({"available": True, "workers": workers})
+        values = [get_task_duration(task) for task in tasks][-DURATION_HISTORY_SIZE:]
+        rolling = {"values": values, "on": tasks[-1]["timestamp"]["scraper_completed"]}
+        rolling.update(get_duration_stats(values))
+        document.update({"available": True, "workers": workers, "rolling": rolling})
 
-    Schedules().update_one(schedule_query, {"$set": {"duration": document}})
+    Schedules().update_one(
+        schedule_query, {"$set": {"duration": document}, "$inc": {"version": 1}}
+    )
 
 
-def request_a_schedule(
-    schedule_name, requested_by: str, worker: str = None, priority: int = 0
+def build_requested_task(
+    schedule, requested_by: str, worker: str = None, priority: int = 0
 ):
-    """created requested_task for schedule_name if possible else None
-
-    enabled=False schedules can't be requested
-    schedule can't be requested if already requested on same worker"""
-
-    # skip if already requested
-    if RequestedTasks().count_documents(
-        {"schedule_name": schedule_name, "worker": worker}
-    ):
-        return None
-
-    schedule = Schedules().find_one(
-        {"name": schedule_name, "enabled": True}, {"config": 1, "notification": 1}
-    )
-    # schedule might be disabled
-    if not schedule:
-        return None
+    """requested_task document for a schedule (with `name`, `config`, `notification`)"""
 
     config = schedule["config"]
     # build and save command-information to config
@@ -115,7 +239,7 @@ def request_a_schedule(
     now = getnow()
 
     document = {
-        "schedule_name": schedule_name,
+        "schedule_name": schedule["name"],
         "status": TaskStatus.requested,
         "timestamp": {TaskStatus.requested: now},
         "events": [{"code": TaskStatus.requested, "timestamp": now}],
@@ -142,24 +266,99 @@ def request_a_schedule(
     if worker:
         document["worker"] = worker
 
+    return document
+
+
+def request_a_schedule(
+    schedule_name, requested_by: str, worker: str = None, priority: int = 0
+):
+    """created requested_task for schedule_name if possible else None
+
+    enabled=False schedules can't be requested
+    schedule can't be requested if already requested on same worker"""
+
+    # skip if already requested
+    if RequestedTasks().count_documents(
+        {"schedule_name": schedule_name, "worker": worker}
+    ):
+        return None
+
+    schedule = Schedules().find_one(
+        {"name": schedule_name, "enabled": True},
+        {"name": 1, "config": 1, "notification": 1},
+    )
+    # schedule might be disabled
+    if not schedule:
+        return None
+
+    document = build_requested_task(schedule, requested_by, worker, priority)
     rt_id = RequestedTasks().insert_one(document).inserted_id
 
     document.update({"_id": str(rt_id)})
     return document
 
 
-def request_tasks_using_schedule():
+def get_due_schedules(periodicity, period_start):
+    """enabled schedules of periodicity not requested nor run since period_start
+
+    Single aggregation joining schedules with requested_tasks and last run"""
+    return Schedules().aggregate(
+        [
+            {"$match": {"enabled": True, "periodicity": periodicity}},
+            # don't bother if the schedule's already requested
+            {
+                "$lookup": {
+                    "from": RequestedTasks._name,
+                    "localField": "name",
+                    "foreignField": "schedule_name",
+                    "as": "requested_tasks",
+                }
+            },
+            {"$match": {"requested_tasks": {"$size": 0}}},
+            # start of last run (missing if never started or gone)
+            {
+                "$lookup": {
+                    "from": Tasks._name,
+                    "localField": "most_recent_task._id",
+                    "foreignField": "_id",
+                    "as": "last_runs",
+                }
+            },
+            {
+                "$project": {
+                    "name": 1,
+                    "config": 1,
+                    "notification": 1,
+                    "last_started": {
+                        "$arrayElemAt": ["$last_runs.timestamp.started", 0]
+                    },
+                }
+            },
+            # don't bother if it started after this rolling period's start
+            {
+                "$match": {
+                    "$or": [
+                        {"last_started": {"$exists": False}},
+                        {"last_started": {"$lte": period_start}},
+                    ]
+                }
+            },
+        ]
+    )
+
+
+def request_tasks_using_schedule(dry_run: bool = False):
     """create requested_tasks based on schedule's periodicity field
 
-    Expected to be ran periodically to compute what needs to be scheduled"""
+    Expected to be ran periodically to compute what needs to be scheduled.
+    One aggregation per periodicity and a single insert for all requested tasks.
+    Returns list of requested tasks (that would have been requested if dry_run)"""
 
     requester = "period-scheduler"
     priority = 0
     worker = None
 
-    query = {"enabled": True}
-    projection = {"name": 1, "config": 1, "most_recent_task": 1}
-
+    requested_tasks = []
     for period, period_data in {
         p: PERIODICITIES.get(p) for p in SchedulePeriodicity.all()
     }.items():
@@ -169,34 +368,17 @@ def request_tasks_using_schedule():
         period_start = getnow() - datetime.timedelta(days=period_data["days"])
         logger.debug(f"requesting for `{period}` schedules (before {period_start})")
 
-        # find non-requested schedules which last run started before our period start
-        query["periodicity"] = period
-        for schedule in Schedules().find(query, projection):
-            # don't bother if the schedule's already requested
-            if (
-                RequestedTasks().count_documents({"schedule_name": schedule["name"]})
-                > 0
-            ):
-                continue
-
-            if schedule.get("most_recent_task"):
-                last_run = Tasks().find_one(
-                    {"_id": schedule["most_recent_task"]["_id"]}, {"timestamp": 1}
-                )
-                # don't bother if it started after this rolling period's start
-                if (
-                    last_run
-                    and last_run["timestamp"].get(
-                        "started", datetime.datetime(2019, 1, 1)
-                    )
-                    > period_start
-                ):
-                    continue
-
-            if request_a_schedule(schedule["name"], requester, worker, priority):
-                logger.debug(f"requested {schedule['name']}")
-            else:
-                logger.debug(f"could not request {schedule['name']}")
+        for schedule in get_due_schedules(period, period_start):
+            requested_tasks.append(
+                build_requested_task(schedule, requester, worker, priority)
+            )
+            logger.debug(f"requesting {schedule['name']}")
+
+    # API processes' matchmaking snapshots find those on next poll (sync)
+    if requested_tasks and not dry_run:
+        RequestedTasks().insert_many(requested_tasks, ordered=False)
+
+    return requested_tasks
 
 
 def can_run(task, resources):
@@ -208,19 +390,22 @@ def can_run(task, resources):
 
 
 def get_duration_for(schedule_name, worker_name):
-    """duration doc for a schedule and worker (or default one)"""
+    """duration doc for a schedule and worker
+
+    falls back to the schedule's rolling p90 (other workers) then default one"""
     schedule = Schedules().find_one({"name": schedule_name}, {"duration": 1})
     if not schedule:
         return get_default_duration()
-    return schedule["duration"]["workers"].get(
-        worker_name, schedule["duration"]["default"]
-    )
+    return get_duration_for_worker(schedule["duration"], worker_name)
 
 
-def get_task_eta(task, worker_name):
-    """compute task duration (dict), remaining (seconds) and eta (datetime)"""
+def get_task_eta(task, worker_name, duration=None):
+    """compute task duration (dict), remaining (seconds) and eta (datetime)
+
+    duration (dict) is retrieved from database unless supplied"""
     now = getnow()
-    duration = get_duration_for(task["schedule_name"], worker_name)
+    if duration is None:
+        duration = get_duration_for(task["schedule_name"], worker_name)
     # delta
     elapsed = now - task["timestamp"].get("started", task["timestamp"]["reserved"])
     remaining = max([duration["value"] - elapsed.total_seconds(), 60])  # seconds
@@ -264,11 +449,12 @@ def get_reqs_doable_by(worker):
         "schedule": {"$arrayElemAt": ["$schedules", 0]},
     }
     extract_schedule_proj.update(projection)
-    # add a single int value for duration (real or default) for comparisons
+    # add a single int value for duration (real, rolling or default) for comparisons
     duration_value_proj = {
         "duration": {
             "$mergeObjects": [
                 {"value": "$schedule.duration.default.value"},
+                {"value": "$schedule.duration.rolling.p90"},
                 {"value": f"$schedule.duration.workers.{worker['name']}.value"},
             ]
         },
@@ -362,17 +548,21 @@ def find_requested_task_for(username, worker_name, avail_cpu, avail_memory, avai
     """
 
     # get total resources for that worker
-    worker = Workers().find_one(
-        {"username": username, "name": worker_name},
-        {
-            "resources": 1,
-            "offliners": 1,
-            "last_seen": 1,
-            "name": 1,
-            "selfish": 1,
-            "platforms": 1,
-        },
-    )
+    if MATCHMAKING.enabled:
+        MATCHMAKING.sync()
+        worker = MATCHMAKING.get_worker(username, worker_name)
+    else:
+        worker = Workers().find_one(
+            {"username": username, "name": worker_name},
+            {
+                "resources": 1,
+                "offliners": 1,
+                "last_seen": 1,
+                "name": 1,
+                "selfish": 1,
+                "platforms": 1,
+            },
+        )
 
     # worker is not checked-in
     if worker is None:
@@ -380,12 +570,17 @@ def find_requested_task_for(username, worker_name, avail_cpu, avail_memory, avai
         return None
 
     # retrieve list of tasks we are currently running with associated resources
-    running_tasks = get_currently_running_tasks(worker_name)
-
     # find all requested tasks that this worker can do with its total resources
     #   sorted by priorities
     #   sorted by max durations
-    tasks_worker_could_do = get_reqs_doable_by(worker)
+    if MATCHMAKING.enabled:
+        running_tasks = MATCHMAKING.get_running_tasks(worker_name)
+        for task in running_tasks:
+            task.update(get_task_eta(task, worker_name, task["duration"]))
+        tasks_worker_could_do = MATCHMAKING.get_reqs_doable_by(worker)
+    else:
+        running_tasks = get_currently_running_tasks(worker_name)
+        tasks_worker_could_do = get_reqs_doable_by(worker)
 
     # filter-out requested tasks that are not doable now due to platform limitations
     worker_platform_filter = functools.partial(
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" in-process verification of SSH-key authentication messages
+
+    Messages are signed with the user's RSA key using PKCS#1 v1.5 padding,
+    either over the raw message (`openssl pkeyutl -sign`, older workers)
+    or over its SHA-256 digest (cryptography's RSA signatures). """
+
+import hmac
+import hashlib
+import logging
+import threading
+import collections
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_public_key,
+    load_ssh_public_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# DER prefix of a PKCS#1 DigestInfo for SHA-256 (RFC 8017, 9.2)
+SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+class PublicKeysCache:
+    """RSA public keys of users' SSH keys, parsed once and kept by fingerprint"""
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.lock = threading.Lock()
+        self.keys = collections.OrderedDict()
+
+    @staticmethod
+    def load(ssh_key):
+        """RSA public key from a user's SSH key document. None if unusable"""
+        try:
+            if ssh_key.get("pkcs8_key"):
+                public_key = load_pem_public_key(
+                    ssh_key["pkcs8_key"].encode("ASCII"), default_backend()
+                )
+            else:
+                public_key = load_ssh_public_key(
+                    f"ssh-rsa {ssh_key['key']}".encode("ASCII"), default_backend()
+                )
+        except Exception as exc:
+            logger.error(f"unable to load key {ssh_key.get('fingerprint')}: {exc}")
+            return None
+        return public_key if isinstance(public_key, rsa.RSAPublicKey) else None
+
+    def get(self, ssh_key):
+        fingerprint = ssh_key.get("fingerprint")
+        if fingerprint is None:
+            return self.load(ssh_key)
+        with self.lock:
+            if fingerprint in self.keys:
+                self.keys.move_to_end(fingerprint)
+                return self.keys[fingerprint]
+        public_key = self.load(ssh_key)
+        with self.lock:
+            self.keys[fingerprint] = public_key
+            if len(self.keys) > self.size:
+                self.keys.popitem(last=False)
+        return public_key
+
+
+PUBLIC_KEYS = PublicKeysCache()
+
+
+def verify_signature(public_key, message: bytes, signature: bytes) -> bool:
+    """whether signature is message signed with public_key's private key"""
+    try:
+        signed = public_key.recover_data_from_signature(
+            signature, padding.PKCS1v15(), None
+        )
+    except (InvalidSignature, ValueError):
+        return False
+    # single RSA operation for both signing methods
+    return hmac.compare_digest(signed, message) or hmac.compare_digest(
+        signed, SHA256_DIGEST_INFO + hashlib.sha256(message).digest()
+    )
+
+
+def find_signing_key(ssh_keys, message: bytes, signature: bytes):
+    """the SSH key (from ssh_keys) that signed message, if any"""
+    for ssh_key in ssh_keys:
+        public_key = PUBLIC_KEYS.get(ssh_key)
+        if public_key is not None and verify_signature(public_key, message, signature):
+            return ssh_key
+    return None
@@ -1,20 +1,74 @@
 import json
+import time
 import uuid
-import string
-import random
+import logging
+import secrets
 import datetime
+import threading
+import collections
 
 import jwt
 from bson import ObjectId
 
 from common import getnow, to_naive_utc
-from common.constants import TOKEN_EXPIRY
+from common.constants import (
+    TOKEN_EXPIRY,
+    TOKEN_CACHE_SIZE,
+    JWT_SECRETS,
+    JWT_SECRETS_FILE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Keyring:
+    """secrets for access tokens, by key ID. First one signs new tokens"""
+
+    def __init__(self, keys: collections.OrderedDict):
+        if not keys:
+            raise ValueError("keyring needs at least one key")
+        self.keys = keys
+        self.signing_kid = next(iter(keys))
+
+    @property
+    def signing_key(self) -> str:
+        return self.keys[self.signing_kid]
+
+    def get(self, kid: str) -> str:
+        return self.keys.get(kid)
+
+    @classmethod
+    def parse(cls, entries) -> "Keyring":
+        """from `kid:secret` entries. Blank ones and #comments are ignored"""
+        keys = collections.OrderedDict()
+        for entry in entries:
+            entry = entry.strip()
+            if not entry or entry.startswith("#"):
+                continue
+            kid, secret = entry.split(":", 1) if ":" in entry else ("default", entry)
+            if not kid.strip() or not secret.strip():
+                raise ValueError(f"invalid keyring entry for `{kid}`")
+            if kid.strip() in keys:
+                raise ValueError(f"duplicate key ID `{kid}` in keyring")
+            keys[kid.strip()] = secret.strip()
+        return cls(keys)
+
+    @classmethod
+    def load(cls) -> "Keyring":
+        """from JWT_SECRETS_FILE or JWT_SECRETS. Random key if not configured"""
+        if JWT_SECRETS_FILE:
+            with open(JWT_SECRETS_FILE, "r") as fh:
+                return cls.parse(fh.readlines())
+        if JWT_SECRETS:
+            return cls.parse(JWT_SECRETS.split(","))
+        logger.warning(
+            "No JWT_SECRETS configured: tokens are only valid in this process"
+        )
+        return cls(collections.OrderedDict(random=secrets.token_urlsafe(32)))
 
 
 class AccessToken:
-    secret = "".join(
-        [random.choice(string.ascii_letters + string.digits) for _ in range(32)]
-    )
+    keyring = Keyring.load()
     issuer = "dispatcher"
     expire_time_delta = datetime.timedelta(hours=TOKEN_EXPIRY)
 
@@ -60,18 +114,65 @@ class AccessToken:
             "user": user,  # user payload (username, scope)
         }
         return jwt.encode(
-            payload, key=cls.secret, algorithm="HS256", json_encoder=cls.JSONEncoder
+            payload,
+            key=cls.keyring.signing_key,
+            algorithm="HS256",
+            headers={"kid": cls.keyring.signing_kid},
+            json_encoder=cls.JSONEncoder,
         ).decode("utf-8")
 
     @classmethod
     def decode(cls, token: str) -> dict:
-        return jwt.decode(token, cls.secret, algorithms=["HS256"])
+        kid = jwt.get_unverified_header(token).get("kid")
+        # tokens without kid are from before keyring: signing key
+        key = cls.keyring.get(kid) if kid else cls.keyring.signing_key
+        if key is None:
+            raise jwt.exceptions.InvalidTokenError(f"unknown key ID `{kid}`")
+        return jwt.decode(token, key, algorithms=["HS256"])
 
     @classmethod
     def get_expiry(cls, token: str) -> datetime:
         return to_naive_utc(cls.decode(token)["exp"])
 
 
+class VerifiedTokensCache:
+    """AccessToken.Payload of recently verified tokens, by raw token
+
+    Spares the signature verification and decoding of tokens presented
+    on every request (workers). Entries are only served until the token
+    expires ; expired ones are decoded again so the usual error is raised."""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.tokens = collections.OrderedDict()
+
+    def get_payload(self, token: str) -> AccessToken.Payload:
+        """payload of a valid token (from cache). Raises as jwt.decode otherwise"""
+        with self.lock:
+            entry = self.tokens.get(token)
+            if entry is not None and entry[1] > time.time():
+                self.tokens.move_to_end(token)
+                return entry[0]
+
+        data = AccessToken.decode(token)
+        payload = AccessToken.Payload(data)
+        if self.size > 0:
+            with self.lock:
+                self.tokens[token] = (payload, data["exp"])
+                self.tokens.move_to_end(token)
+                while len(self.tokens) > self.size:
+                    self.tokens.popitem(last=False)
+        return payload
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+
+
+VERIFIED_TOKENS = VerifiedTokensCache(TOKEN_CACHE_SIZE)
+
+
 class LoadedAccessToken(AccessToken):
     def __init__(self, user_id: ObjectId, username: str, scope: dict):
         self.user_id = user_id
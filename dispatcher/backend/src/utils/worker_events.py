@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" events pushed to workers through the relay
+
+    Each event gets the next sequence number of its worker and is stored
+    (for WORKER_EVENTS_TTL) before being broadcasted on `worker-event.<name>`.
+    A worker that missed some (disconnected) replays them from its last seq. """
+
+import logging
+
+import pymongo
+from pymongo.collection import ReturnDocument
+
+from common import getnow
+from common.mongo import Workers, WorkerEvents
+from utils.broadcaster import BROADCASTER
+
+logger = logging.getLogger(__name__)
+
+PROJECTION = {"_id": 0, "seq": 1, "code": 1, "payload": 1}
+
+
+def record_worker_event(worker_name: str, code: str, payload: dict):
+    """store and broadcast an event for a worker. seq or None if unknown worker"""
+    worker = Workers().find_one_and_update(
+        {"name": worker_name},
+        {"$inc": {"events_seq": 1}},
+        projection={"events_seq": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if worker is None:
+        logger.warning(f"not recording `{code}` event for unknown {worker_name}")
+        return None
+
+    event = {"seq": worker["events_seq"], "code": code, "payload": payload}
+    WorkerEvents().insert_one(dict(event, worker=worker_name, created_on=getnow()))
+    BROADCASTER.broadcast_worker_event(worker_name, event)
+    return event["seq"]
+
+
+def get_worker_events(worker_name: str, since: int = None, limit: int = 100):
+    """events of a worker after `since` seq
+
+    - last_seq: seq of worker's most recent event (0 if none)
+    - complete: whether all events after `since` are still there to be replayed
+    - items: up to `limit` events, by seq"""
+    # seq is taken (events_seq) before the event is stored: last_seq is that of
+    # the most recent stored event so an event being recorded isn't reported missing
+    latest = WorkerEvents().find_one(
+        {"worker": worker_name}, {"seq": 1}, sort=[("seq", pymongo.DESCENDING)]
+    )
+    if latest:
+        last_seq = latest["seq"]
+    else:
+        # all expired (or none yet)
+        worker = Workers().find_one({"name": worker_name}, {"events_seq": 1})
+        last_seq = worker.get("events_seq", 0) if worker else 0
+
+    if since is None or since >= last_seq:
+        # worker can't be ahead of us unless events were lost (database reset)
+        return {"last_seq": last_seq, "complete": since == last_seq, "items": []}
+
+    items = list(
+        WorkerEvents()
+        .find({"worker": worker_name, "seq": {"$gt": since}}, PROJECTION)
+        .sort("seq", pymongo.ASCENDING)
+        .limit(limit)
+    )
+    # older events expire: we have all we need only if next one is still there
+    complete = bool(items) and items[0]["seq"] == since + 1
+    return {"last_seq": last_seq, "complete": complete, "items": items}
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: ai ts=4 sts=4 et sw=4 nu
+
+""" measures relay throughput (messages/second) end-to-end
+
+    Starts the relay (or another implementation passed as first argument)
+    then publishes messages to its internal port and counts those received
+    on its public port.
+
+    python benchmark.py [path/to/relay.py] """
+
+import os
+import sys
+import time
+import pathlib
+import subprocess
+
+import zmq
+
+NB_MESSAGES = int(os.getenv("NB_MESSAGES", "200000"))
+PAYLOAD_SIZE = int(os.getenv("PAYLOAD_SIZE", "512"))
+INTERNAL_PORT = 15000
+SOCKET_PORT = 16000
+CONTROL_PORT = 16001
+
+
+def main(relay_path):
+    relay = subprocess.Popen(
+        [sys.executable, str(relay_path)],
+        env=dict(
+            os.environ,
+            INTERNAL_SOCKET_PORT=str(INTERNAL_PORT),
+            SOCKET_PORT=str(SOCKET_PORT),
+            CONTROL_SOCKET_PORT=str(CONTROL_PORT),
+            EVENTS="task-event,warmup",
+        ),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    context = zmq.Context()
+    try:
+        publisher = context.socket(zmq.PUB)
+        publisher.setsockopt(zmq.SNDHWM, 0)
+        publisher.connect(f"tcp://localhost:{INTERNAL_PORT}")
+        subscriber = context.socket(zmq.SUB)
+        subscriber.setsockopt(zmq.RCVHWM, 0)
+        subscriber.connect(f"tcp://localhost:{SOCKET_PORT}")
+        subscriber.setsockopt(zmq.SUBSCRIBE, b"")
+
+        # wait for all connections to be established
+        while True:
+            publisher.send(b"warmup {}")
+            if subscriber.poll(100):
+                break
+        while subscriber.poll(100):
+            subscriber.recv()
+
+        message = b"task-event " + b"x" * PAYLOAD_SIZE
+        received = 0
+        started_on = time.perf_counter()
+        for index in range(NB_MESSAGES):
+            publisher.send(message)
+            # receive as we go so nothing piles up on the relay
+            while subscriber.poll(0):
+                subscriber.recv()
+                received += 1
+        while received < NB_MESSAGES and subscriber.poll(1000):
+            subscriber.recv()
+            received += 1
+        duration = time.perf_counter() - started_on
+        print(
+            f"{relay_path.name}: {received}/{NB_MESSAGES} messages "
+            f"of {PAYLOAD_SIZE}B in {duration:.2f}s: "
+            f"{received / duration:,.0f} msg/s"
+        )
+    finally:
+        relay.terminate()
+        relay.wait()
+        context.destroy(linger=0)
+
+
+if __name__ == "__main__":
+    main(
+        pathlib.Path(sys.argv[1])
+        if len(sys.argv) > 1
+        else pathlib.Path(__file__).with_name("relay.py")
+    )
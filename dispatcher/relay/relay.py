@@ -2,9 +2,27 @@
 # -*- coding: utf-8 -*-
 # vim: ai ts=4 sts=4 et sw=4 nu
 
+""" forwards dispatcher's messages (internal port) to subscribers (public port)
+
+    Messages are forwarded as-is (frames not decoded) by a zmq proxy.
+    A copy of each message is captured to maintain per-topic counters
+    and a ring buffer of recent messages (optionally persisted on disk).
+    Both are served on the control port (REQ/REP):
+      - `stats`: JSON of per-topic counters and rates
+      - `replay [topic]`: `replay` frame followed by buffered messages
+        (on that topic prefix), oldest first. Dispatcher's messages are
+        single-frame (`topic payload`) so that's one frame per message. """
+
 import os
+import sys
+import json
+import time
+import struct
+import signal
 import logging
+import threading
 import subprocess
+import collections
 
 import zmq
 
@@ -26,11 +44,221 @@ try:
     SOCKET_PORT = int(os.getenv("SOCKET_PORT"))
 except Exception:
     SOCKET_PORT = 6000
+# stats and replay. 0 disables
+try:
+    CONTROL_PORT = int(os.getenv("CONTROL_SOCKET_PORT"))
+except Exception:
+    CONTROL_PORT = 6001
 try:
     EVENTS = os.getenv("EVENTS").split(",")
 except Exception:
     EVENTS = []
     logger.error(f"unable to parse events list. Defaulting to {EVENTS}")
+# messages queued per peer before dropping (zmq's default is 1000)
+try:
+    RCV_HWM = int(os.getenv("RCV_HWM"))
+except Exception:
+    RCV_HWM = 10000
+try:
+    SND_HWM = int(os.getenv("SND_HWM"))
+except Exception:
+    SND_HWM = 10000
+# number of recent messages kept for replay. 0 disables
+try:
+    RING_BUFFER_SIZE = int(os.getenv("RING_BUFFER_SIZE"))
+except Exception:
+    RING_BUFFER_SIZE = 1000
+# file to persist recent messages to (kept across restarts)
+RING_BUFFER_PATH = os.getenv("RING_BUFFER_PATH")
+# seconds between rates computations (and summary log)
+try:
+    STATS_INTERVAL = int(os.getenv("STATS_INTERVAL"))
+except Exception:
+    STATS_INTERVAL = 60
+
+CAPTURE_URI = "inproc://capture"
+
+
+def get_topic(frame):
+    """topic (bytes) of a message from its first frame, without decoding it"""
+    index = frame.find(b" ")
+    return bytes(frame[:index]) if index >= 0 else bytes(frame)
+
+
+class RingBuffer:
+    """last `size` messages (list of frames), optionally persisted to `path`
+
+    Records are appended to `path`. Once it holds `size` messages,
+    it's moved to `path.1` (replacing previous one) so disk usage is bounded
+    and those two files always contain at least the last `size` messages."""
+
+    header = struct.Struct("!I")
+
+    def __init__(self, size, path=None):
+        self.size = size
+        self.messages = collections.deque(maxlen=size)
+        self.path = path
+        self.fh = None
+        self.nb_written = 0
+        if self.path:
+            for fpath in (f"{self.path}.1", self.path):
+                for message in self.read(fpath):
+                    self.messages.append(message)
+            self.nb_written = len(list(self.read(self.path)))
+            self.fh = open(self.path, "ab")
+            logger.info(f"loaded {len(self.messages)} messages from {self.path}")
+
+    @classmethod
+    def read(cls, fpath):
+        """messages stored in fpath. Stops at a truncated record"""
+        try:
+            with open(fpath, "rb") as fh:
+                data = fh.read()
+        except FileNotFoundError:
+            return
+        offset = 0
+        try:
+            while offset < len(data):
+                (nb_frames,) = cls.header.unpack_from(data, offset)
+                offset += cls.header.size
+                message = []
+                for _ in range(nb_frames):
+                    (length,) = cls.header.unpack_from(data, offset)
+                    offset += cls.header.size
+                    if offset + length > len(data):
+                        return
+                    message.append(data[offset : offset + length])
+                    offset += length
+                yield message
+        except struct.error:
+            return
+
+    def append(self, message):
+        self.messages.append(message)
+        if not self.fh:
+            return
+        self.fh.write(self.header.pack(len(message)))
+        for frame in message:
+            self.fh.write(self.header.pack(len(frame)))
+            self.fh.write(frame)
+        self.nb_written += 1
+        if self.nb_written >= self.size:
+            self.fh.close()
+            os.replace(self.path, f"{self.path}.1")
+            self.fh = open(self.path, "ab")
+            self.nb_written = 0
+
+    def flush(self):
+        if self.fh:
+            self.fh.flush()
+
+    def get(self, topic=b""):
+        return [message for message in self.messages if message[0].startswith(topic)]
+
+
+class Monitor:
+    """per-topic counters and ring buffer, fed by the proxy's capture socket"""
+
+    def __init__(self, context, control_uri=None, ring_buffer=None):
+        self.context = context
+        self.control_uri = control_uri
+        self.ring_buffer = ring_buffer
+        self.started_on = time.time()
+        self.counters = collections.Counter()
+        self.sizes = collections.Counter()
+        self.rates = {}
+        self.last_tick = (time.monotonic(), collections.Counter())
+
+    def record(self, message):
+        topic = get_topic(message[0])
+        self.counters[topic] += 1
+        self.sizes[topic] += sum(len(frame) for frame in message)
+        if self.ring_buffer is not None:
+            self.ring_buffer.append(message)
+
+    def tick(self):
+        """update per-topic rates (msg/s) since last tick"""
+        now = time.monotonic()
+        last_on, last_counters = self.last_tick
+        elapsed = now - last_on
+        if elapsed <= 0:
+            return
+        self.rates = {
+            topic: (count - last_counters[topic]) / elapsed
+            for topic, count in self.counters.items()
+        }
+        self.last_tick = (now, collections.Counter(self.counters))
+        if self.ring_buffer is not None:
+            self.ring_buffer.flush()
+        logger.info(
+            "[STATS] "
+            + (
+                ", ".join(
+                    f"{topic.decode('utf-8', 'replace')}: {rate:.2f}/s"
+                    for topic, rate in self.rates.items()
+                )
+                or "no message"
+            )
+        )
+
+    def get_stats(self):
+        return {
+            "started_on": self.started_on,
+            "ring_buffer": len(self.ring_buffer.messages) if self.ring_buffer else None,
+            "topics": {
+                topic.decode("utf-8", "replace"): {
+                    "count": count,
+                    "bytes": self.sizes[topic],
+                    "rate": self.rates.get(topic, 0),
+                }
+                for topic, count in self.counters.items()
+            },
+        }
+
+    def reply(self, request):
+        """reply (list of frames) to a control request"""
+        command, *args = request[0].split(b" ", 1)
+        if command == b"stats":
+            return [json.dumps(self.get_stats()).encode("utf-8")]
+        if command == b"replay":
+            if self.ring_buffer is None:
+                return [b"error replay disabled"]
+            topic = args[0] if args else b""
+            return [b"replay"] + [
+                frame for message in self.ring_buffer.get(topic) for frame in message
+            ]
+        return [b"error unknown command"]
+
+    def run(self):
+        capture = self.context.socket(zmq.SUB)
+        capture.setsockopt(zmq.RCVHWM, RCV_HWM)
+        capture.setsockopt(zmq.SUBSCRIBE, b"")
+        capture.connect(CAPTURE_URI)
+
+        poller = zmq.Poller()
+        poller.register(capture, zmq.POLLIN)
+        control = None
+        if self.control_uri:
+            logger.info(f"binding to {self.control_uri}")
+            control = self.context.socket(zmq.REP)
+            control.bind(self.control_uri)
+            poller.register(control, zmq.POLLIN)
+
+        next_tick = time.monotonic() + STATS_INTERVAL
+        while True:
+            events = dict(poller.poll(timeout=1000))
+            if capture in events:
+                # drain what's available before serving control requests
+                while True:
+                    try:
+                        self.record(capture.recv_multipart(zmq.NOBLOCK, copy=True))
+                    except zmq.Again:
+                        break
+            if control in events:
+                control.send_multipart(self.reply(control.recv_multipart()))
+            if time.monotonic() >= next_tick:
+                self.tick()
+                next_tick = time.monotonic() + STATS_INTERVAL
 
 
 def main():
@@ -46,20 +274,43 @@ def main():
     public_uri = f"tcp://{ip_address}:{SOCKET_PORT}"
     logger.info(f"binding to {public_uri}")
     public_server = context.socket(zmq.PUB)
+    public_server.setsockopt(zmq.SNDHWM, SND_HWM)
     public_server.bind(public_uri)
 
     private_uri = f"tcp://{ip_address}:{INTERNAL_PORT}"
     logger.info(f"binding to {private_uri}")
     private_server = context.socket(zmq.SUB)
+    private_server.setsockopt(zmq.RCVHWM, RCV_HWM)
     private_server.bind(private_uri)
     for event in EVENTS:
         logger.debug(f"subscribing to topic `{event}`")
         private_server.setsockopt_string(zmq.SUBSCRIBE, event)
 
-    while True:
-        received_string = private_server.recv_string()
-        logger.info(f"[FORWARDING] {received_string[:150]}")
-        public_server.send_string(received_string)
+    # PUB so a slow monitor drops captured copies instead of stalling the proxy
+    capture = context.socket(zmq.PUB)
+    capture.setsockopt(zmq.SNDHWM, RCV_HWM)
+    capture.bind(CAPTURE_URI)
+
+    monitor = Monitor(
+        context,
+        control_uri=f"tcp://{ip_address}:{CONTROL_PORT}" if CONTROL_PORT else None,
+        ring_buffer=RingBuffer(RING_BUFFER_SIZE, RING_BUFFER_PATH)
+        if RING_BUFFER_SIZE
+        else None,
+    )
+    threading.Thread(target=monitor.run, name="monitor", daemon=True).start()
+
+    # docker stop sends SIGTERM. exit cleanly so ring buffer is flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    logger.info("forwarding messages")
+    try:
+        zmq.proxy(private_server, public_server, capture)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if monitor.ring_buffer:
+            monitor.ring_buffer.flush()
 
 
 if __name__ == "__main__":
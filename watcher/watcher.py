@@ -26,16 +26,20 @@ import re
 import sys
 import time
 import json
+import random
 import signal
 import pathlib
 import logging
 import argparse
 import datetime
+import threading
 import subprocess
+import urllib.parse
 import multiprocessing
 import concurrent.futures as cf
 
 import jwt
+import urllib3
 import requests
 import humanfriendly
 from pif import get_public_ip
@@ -45,6 +49,10 @@ from kiwixstorage import KiwixStorage
 VERSION = "1.0"
 DOWNLOAD_URL = os.getenv("DOWNLOAD_URL", "https://archive.org/download/stackexchange")
 ZIMFARM_API_URL = os.getenv("ZIMFARM_API_URL", "https://api.farm.openzim.org/v1")
+API_TIMEOUT = (10, 60)  # seconds to connect, to wait for response
+API_MAX_RETRIES = 3  # retries on connection errors
+API_RETRY_DELAY = 30  # seconds before first retry, doubled (with jitter) each time
+API_RETRY_MAX_DELAY = 300  # cap on retry delay (seconds)
 ASCII_LOGO = r"""
   __                                         _       _
  / _| __ _ _ __ _ __ ___      __      ____ _| |_ ___| |__   ___ _ __
@@ -86,36 +94,136 @@ def get_version_for(url):
         ).strftime("%Y-%m")
 
 
+# API helpers below are those of workers' common.dispatcher: watcher is a
+# single-file script in its own image and can't import them. Keep in sync
+
+
+class APIMetrics:
+    """count, errors and latency of Zimfarm API requests, per endpoint"""
+
+    # IDs in paths (ObjectId, UUID) so requests are grouped by endpoint
+    ids_re = re.compile(
+        r"[0-9a-f]{24}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    @classmethod
+    def get_endpoint(cls, method, url):
+        path = urllib.parse.urlparse(url).path
+        return f"{method.upper()} {cls.ids_re.sub('<id>', path)}"
+
+    def record(self, method, url, status_code, duration):
+        with self.lock:
+            stats = self.endpoints.setdefault(
+                self.get_endpoint(method, url),
+                {"count": 0, "errors": 0, "duration": 0.0, "max_duration": 0.0},
+            )
+            stats["count"] += 1
+            if status_code >= 400:
+                stats["errors"] += 1
+            stats["duration"] += duration
+            stats["max_duration"] = max(stats["max_duration"], duration)
+
+    def summary(self):
+        with self.lock:
+            return "\n".join(
+                f"  {endpoint}: {stats['count']} reqs, {stats['errors']} errors, "
+                f"avg {stats['duration'] / stats['count'] * 1000:.0f}ms, "
+                f"max {stats['max_duration'] * 1000:.0f}ms"
+                for endpoint, stats in sorted(self.endpoints.items())
+            )
+
+
+API_METRICS = APIMetrics()
+# requests sessions are not thread-safe: one per thread
+THREAD_LOCAL = threading.local()
+
+
+def get_session():
+    """this thread's requests.Session, keeping connections to the API alive"""
+    if not hasattr(THREAD_LOCAL, "session"):
+        THREAD_LOCAL.session = requests.Session()
+    return THREAD_LOCAL.session
+
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+
+def is_retryable(method, exc):
+    """whether a request that failed with exc can safely be sent again
+
+    Read timeouts and aborted connections (a kept-alive one closed by server)
+    leave us unaware of whether the server processed the request so only
+    idempotent ones are retried. Others only if the connection couldn't be
+    established: request was not sent"""
+    if method.upper() in IDEMPOTENT_METHODS:
+        return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    if not isinstance(exc, requests.ConnectionError) or not exc.args:
+        return False
+    # urllib3's error is wrapped in a MaxRetryError
+    reason = getattr(exc.args[0], "reason", exc.args[0])
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def get_retry_delay(attempt):
+    """seconds to wait before retry number `attempt`: exponential, with jitter"""
+    delay = min(API_RETRY_DELAY * 2 ** (attempt - 1), API_RETRY_MAX_DELAY)
+    return delay / 2 + random.uniform(0, delay / 2)  # nosec
+
+
 def get_token(api_url, username, password):
     """Access-token, Refresh-token for a pair of Zimfarm credentials"""
-    req = requests.post(
+    req = get_session().post(
         url=f"{api_url}/auth/authorize",
         headers={
             "username": username,
             "password": password,
             "Content-type": "application/json",
         },
+        timeout=API_TIMEOUT,
     )
     req.raise_for_status()
     return req.json().get("access_token"), req.json().get("refresh_token")
 
 
-def query_api(token, method, url, payload=None, params=None, headers=None, attempt=0):
-    """success, status_code, payload from a query to Zimfamr API"""
+def query_api(token, method, url, payload=None, params=None, headers=None):
+    """success, status_code, payload from a query to Zimfamr API
+
+    Connection errors (and timeouts of idempotent requests) are retried
+    up to API_MAX_RETRIES times"""
     req_headers = {}
     req_headers.update(headers or {})
-    try:
-        req_headers.update({"Authorization": f"Token {token}"})
-        req = getattr(requests, method.lower(), "get")(
-            url=url, headers=req_headers, json=payload, params=params
-        )
-    except Exception as exc:
-        attempt += 1
-        logger.error(f"ConnectionError (attempt {attempt}) for {method} {url} -- {exc}")
-        if attempt <= 3:
-            time.sleep(attempt * 60 * 2)
-            return query_api(token, method, url, payload, params, headers, attempt)
-        return (False, 599, f"ConnectionError -- {exc}")
+    req_headers.update({"Authorization": f"Token {token}"})
+
+    attempt = 0
+    while True:
+        started_on = time.monotonic()
+        try:
+            req = get_session().request(
+                method.upper(),
+                url=url,
+                headers=req_headers,
+                json=payload,
+                params=params,
+                timeout=API_TIMEOUT,
+            )
+        except Exception as exc:
+            API_METRICS.record(method, url, 599, time.monotonic() - started_on)
+            attempt += 1
+            logger.error(
+                f"ConnectionError (attempt {attempt}) for {method} {url} -- {exc}"
+            )
+            if attempt > API_MAX_RETRIES or not is_retryable(method, exc):
+                return (False, 599, f"ConnectionError -- {exc}")
+            time.sleep(get_retry_delay(attempt))
+            continue
+        API_METRICS.record(method, url, req.status_code, time.monotonic() - started_on)
+        break
 
     if req.status_code == requests.codes.NO_CONTENT:
         return True, req.status_code, ""
@@ -242,6 +350,22 @@ class WatcherRunner:
 
         return success, status_code, response
 
+    def query_api_items(self, path, params=None):
+        """success, status_code, response with all items of a Zimfarm list
+
+        Follows pagination cursors, without counting"""
+        params = dict(params or {}, limit=200, count="none")
+        items = []
+        while True:
+            success, status_code, response = self.query_api("GET", path, params=params)
+            if not success:
+                return success, status_code, response
+            items += response.get("items", [])
+            cursor = response.get("meta", {}).get("next_cursor")
+            if not cursor:
+                return success, status_code, {"items": items}
+            params["cursor"] = cursor
+
     def zimfarm_credentials_ok(self):
         logger.info(f"Testing Zimfarm credentials with {ZIMFARM_API_URL}…")
         self.access_token = self.refresh_token = self.token_payload = None
@@ -268,8 +392,7 @@ class WatcherRunner:
 
     def get_recipes_for(self, domain):
         """list of Zimfarm recipes names for a StackExchange domain"""
-        success, status, payload = self.query_api(
-            "GET",
+        success, status, payload = self.query_api_items(
             "/schedules/",
             params={"category": "stack_exchange", "name": f"{domain}_.+"},
         )
@@ -288,8 +411,7 @@ class WatcherRunner:
         if not recipes:
             return False
 
-        success, status, payload = self.query_api(
-            "GET",
+        success, status, payload = self.query_api_items(
             "/tasks/",
             params={"schedule_name": recipes, "status": ["started", "scraper_started"]},
         )
@@ -320,8 +442,8 @@ class WatcherRunner:
         if not recipes:
             return False
 
-        success, status, payload = self.query_api(
-            "GET", "/requested-tasks/", params={"schedule_name": recipes}
+        success, status, payload = self.query_api_items(
+            "/requested-tasks/", params={"schedule_name": recipes}
         )
         if not success:
             logger.error(f"{prefix} Can't get equested-tasks from zimfarm")
@@ -495,10 +617,12 @@ class WatcherRunner:
 
         checked_on = datetime.datetime.now()
         self.check_and_go()
+        logger.info(f"Zimfarm API requests:\n{API_METRICS.summary()}")
         while self.running:
             if datetime.datetime.now() > checked_on + self.duration:
                 checked_on = datetime.datetime.now()
                 self.check_and_go()
+                logger.info(f"Zimfarm API requests:\n{API_METRICS.summary()}")
             time.sleep(5)  # check time every 5s
 
     def exit_gracefully(self, signum, frame):
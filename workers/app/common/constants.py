@@ -26,7 +26,18 @@ CHECKER_IMAGE = os.getenv("CHECKER_IMAGE", "openzim/zim-tools:2.1.0")
 DEFAULT_WORKDIR = os.getenv("WORKDIR", "/data")  # in-container workdir for manager
 DOCKER_SOCKET = pathlib.Path(os.getenv("DOCKER_SOCKET", "/var/run/docker.sock"))
 PRIVATE_KEY = pathlib.Path(os.getenv("PRIVATE_KEY", "/etc/ssh/keys/zimfarm"))
-OPENSSL_BIN = os.getenv("OPENSSL_BIN", "/usr/bin/openssl")
+# access token shared by manager with its task-workers (in workdir)
+SHARED_TOKEN_FILENAME = ".access-token.json"
+# seconds before expiry an access token is renewed (or not reused)
+TOKEN_RENEWAL_MARGIN = 600
+
+# API requests
+API_CONNECT_TIMEOUT = 10  # seconds to establish connection
+API_READ_TIMEOUT = 60  # seconds to wait for response
+API_MAX_RETRIES = 3  # retries on connection errors
+API_RETRY_DELAY = 30  # seconds before first retry, doubled (with jitter) each time
+API_RETRY_MAX_DELAY = 300  # cap on retry delay (seconds)
+API_METRICS_INTERVAL = 3600  # seconds between API metrics logs (manager)
 
 # task-related
 CANCELED = "canceled"
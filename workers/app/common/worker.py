@@ -14,7 +14,13 @@ import docker
 import requests
 
 from common import logger
-from common.constants import DOCKER_SOCKET, PRIVATE_KEY, DOCKER_CLIENT_TIMEOUT
+from common.constants import (
+    DOCKER_SOCKET,
+    PRIVATE_KEY,
+    DOCKER_CLIENT_TIMEOUT,
+    SHARED_TOKEN_FILENAME,
+    TOKEN_RENEWAL_MARGIN,
+)
 from common.dispatcher import get_token_ssh, query_api
 
 
@@ -97,24 +103,45 @@ class BaseWorker:
         signal.signal(signal.SIGQUIT, self.exit_gracefully)
 
     def authenticate(self, force=False):
-        # our access token should grant us access for 60mn
-        if force or self.authentication_expires_on <= datetime.datetime.now():
-            try:
-                self.access_token, self.refresh_token = get_token_ssh(
-                    self.webapi_uri, self.username, PRIVATE_KEY
-                )
-                self.token_payload = jwt.decode(self.access_token, verify=False)
-                self.authenticated_on = datetime.datetime.now()
-                self.authentication_expires_on = datetime.datetime.fromtimestamp(
-                    self.token_payload["exp"]
-                )
-                return True
-            except Exception as exc:
-                logger.error(f"authenticate() failure: {exc}")
-                logger.exception(exc)
-                return False
+        # renew ahead of expiry so a token we share remains usable for a while
+        if not force and datetime.datetime.now() < (
+            self.authentication_expires_on
+            - datetime.timedelta(seconds=TOKEN_RENEWAL_MARGIN)
+        ):
+            return True
+
+        if self.load_shared_token():
+            return True
+
+        try:
+            self.set_token(*get_token_ssh(self.webapi_uri, self.username, PRIVATE_KEY))
+        except Exception as exc:
+            logger.error(f"authenticate() failure: {exc}")
+            logger.exception(exc)
+            return False
+        self.share_token()
         return True
 
+    def set_token(self, access_token, refresh_token):
+        self.token_payload = jwt.decode(access_token, verify=False)
+        self.access_token, self.refresh_token = access_token, refresh_token
+        self.authenticated_on = datetime.datetime.now()
+        self.authentication_expires_on = datetime.datetime.fromtimestamp(
+            self.token_payload["exp"]
+        )
+
+    @property
+    def shared_token_path(self):
+        return self.workdir.joinpath(SHARED_TOKEN_FILENAME)
+
+    def share_token(self):
+        """write our tokens to workdir for task-workers. to be overriden"""
+        pass
+
+    def load_shared_token(self):
+        """whether we now use a token shared in workdir. to be overriden"""
+        return False
+
     def can_stream_logs(self):
         try:
             upload_uri = urllib.parse.urlparse(
@@ -124,7 +151,9 @@ class BaseWorker:
             return False
         return upload_uri.scheme in ("scp", "sftp")
 
-    def query_api(self, method, path, payload=None, params=None, headers=None):
+    def query_api(
+        self, method, path, payload=None, params=None, headers=None, etags=None
+    ):
         if not self.authenticate():
             return (False, 0, "")
 
@@ -137,6 +166,7 @@ class BaseWorker:
                 payload,
                 params,
                 headers or {},
+                etags=etags,
             )
             attempts += 1
 
@@ -14,6 +14,7 @@ import requests
 from common import logger
 from common.utils import format_size, as_pos_int
 from common.worker import BaseWorker
+from common.dispatcher import API_METRICS
 from common.docker import (
     query_host_stats,
     stop_task_worker,
@@ -23,6 +24,7 @@ from common.docker import (
     remove_container,
 )
 from common.constants import (
+    API_METRICS_INTERVAL,
     CANCELED,
     CANCELING,
     CANCEL_REQUESTED,
@@ -47,7 +49,11 @@ class WorkerManager(BaseWorker):
 
         # set data holders
         self.tasks = {}
+        self.tasks_etags = {}
+        # seq of last worker event (pushed to us) we've handled
+        self.events_seq = None
         self.last_poll = datetime.datetime(2020, 1, 1)
+        self.last_metrics_log = datetime.datetime.now()
         self.should_stop = False
 
         # check workdir
@@ -103,11 +109,36 @@ class WorkerManager(BaseWorker):
     def sleep(self):
         time.sleep(self.sleep_interval)
 
+    def share_token(self):
+        """write access token to workdir so task-workers don't authenticate"""
+        tmp_path = self.shared_token_path.with_suffix(".tmp")
+        try:
+            # only readable by us (and task-workers, running as same user)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, "w") as fh:
+                json.dump(
+                    {
+                        "username": self.username,
+                        "webapi_uri": self.webapi_uri,
+                        "access_token": self.access_token,
+                    },
+                    fh,
+                )
+            # atomic so task-workers never read a partial file
+            os.replace(tmp_path, self.shared_token_path)
+        except Exception as exc:
+            logger.warning(f"unable to share access token: {exc}")
+
     def poll(self, task_id=None):
         self.check_cancellation()  # update our tasks register
 
         logger.debug("polling…")
         self.last_poll = datetime.datetime.now()
+        if (
+            self.last_poll - self.last_metrics_log
+        ).total_seconds() >= API_METRICS_INTERVAL:
+            logger.info(f"API requests so far:\n{API_METRICS.summary()}")
+            self.last_metrics_log = self.last_poll
 
         host_stats = query_host_stats(self.docker, self.workdir)
         expected_disk_avail = as_pos_int(
@@ -120,8 +151,9 @@ class WorkerManager(BaseWorker):
             )
             return
 
+        # API picks and reserves the best task for us in a single call
         success, status_code, response = self.query_api(
-            "GET",
+            "POST",
             "/requested-tasks/worker",
             params={
                 "worker": self.worker_name,
@@ -134,19 +166,9 @@ class WorkerManager(BaseWorker):
             logger.warning(f"poll failed with HTTP {status_code}: {response}")
             return
 
-        if self.selfish:
-            response["items"] = [
-                t for t in response["items"] if t["worker"] == self.worker_name
-            ]
-
-        if response["items"]:
-            logger.info(
-                "API is offering {nb} task(s): {ids}".format(
-                    nb=len(response["items"]),
-                    ids=[task["_id"] for task in response["items"]],
-                )
-            )
-            self.start_task(response["items"].pop())
+        if status_code == requests.codes.CREATED:
+            logger.info(f"API reserved task {response['_id']} for us")
+            self.start_task(response)
             # we need to allow the task to start, its container to start and
             # eventually its scraper to start so docker can report to us
             # the assigned resources (on the scraper) _before_ polling again
@@ -178,11 +200,20 @@ class WorkerManager(BaseWorker):
         logger.info("\tchecked-in!")
 
     def check_cancellation(self):
-        for task_id in list(self.tasks.keys()):
-            if self.tasks.get(task_id, {}).get("status") in [CANCELED, CANCELING]:
-                continue  # already handling cancellation
-
-            self.update_task_data(task_id)
+        # cancellations are pushed to us. Those we missed are replayed.
+        # only if they can't be (start, expired) do we check each task's status
+        if not self.replay_worker_events():
+            self.check_tasks_status()
+
+    def check_tasks_status(self):
+        task_ids = [
+            task_id
+            for task_id, task in self.tasks.items()
+            # already handling cancellation
+            if task.get("status") not in [CANCELED, CANCELING]
+        ]
+        self.update_tasks_data(task_ids)
+        for task_id in task_ids:
             if self.tasks.get(task_id, {}).get("status") in [
                 CANCELED,
                 CANCELING,
@@ -199,21 +230,38 @@ class WorkerManager(BaseWorker):
         self.stop_task_worker(task_id, timeout=60)
         self.tasks.pop(task_id, None)
 
-    def update_task_data(self, task_id):
-        """request task object from server and update locally"""
+    def update_tasks_data(self, task_ids):
+        """request status of tasks from server (single request) and update locally
 
-        logger.debug(f"update_task_data: {task_id}")
-        success, status_code, response = self.query_api("GET", f"/tasks/{task_id}")
-        if success and status_code == requests.codes.OK:
-            self.tasks[task_id] = response
+        tasks unknown to the server are cancelled"""
+        if not task_ids:
             return True
 
-        if status_code == requests.codes.NOT_FOUND:
-            logger.warning(f"task {task_id} is gone. cancelling it")
-            self.cancel_and_remove_task(task_id)
-        else:
-            logger.warning(f"couldn't retrieve task detail for {task_id}")
-        return success
+        logger.debug(f"update_tasks_data: {task_ids}")
+        # server answers 304 if statuses are those of previous response
+        # for the same tasks (ETag is kept per set of IDs) which we can only
+        # rely on if they've all been applied to tracked tasks
+        all_tracked = all(task_id in self.tasks for task_id in task_ids)
+        success, status_code, response = self.query_api(
+            "GET",
+            "/tasks/status",
+            params={"id": task_ids},
+            etags=self.tasks_etags if all_tracked else None,
+        )
+        if success and status_code == requests.codes.NOT_MODIFIED:
+            return True
+        if not success or status_code != requests.codes.OK:
+            logger.warning(f"couldn't retrieve tasks status HTTP {status_code}")
+            return False
+
+        tasks = {task["_id"]: task for task in response["items"]}
+        for task_id in task_ids:
+            if task_id not in tasks:
+                logger.warning(f"task {task_id} is gone. cancelling it")
+                self.cancel_and_remove_task(task_id)
+                continue
+            self.tasks.setdefault(task_id, {}).update(tasks[task_id])
+        return True
 
     def sync_tasks_and_containers(self):
         # list of completed containers (successfuly ran)
@@ -238,10 +286,12 @@ class WorkerManager(BaseWorker):
             remove_container(self.docker, container.name)
 
         # make sure we are tracking task for all running containers
-        for task_id in running_task_ids:
-            if task_id not in self.tasks.keys():
-                logger.info(f"found running container for {task_id}.")
-                self.update_task_data(task_id)
+        untracked_task_ids = [
+            task_id for task_id in running_task_ids if task_id not in self.tasks.keys()
+        ]
+        for task_id in untracked_task_ids:
+            logger.info(f"found running container for {task_id}.")
+        self.update_tasks_data(untracked_task_ids)
 
         # filter our tasks register of gone containers
         for task_id in list(self.tasks.keys()):
@@ -253,21 +303,11 @@ class WorkerManager(BaseWorker):
         logger.debug(f"stop_task_worker: {task_id}")
         stop_task_worker(self.docker, task_id, timeout=timeout)
 
-    def start_task(self, requested_task):
-        task_id = requested_task["_id"]
-        logger.debug(f"start_task: {task_id}")
-
-        success, status_code, response = self.query_api(
-            "POST", f"/tasks/{task_id}", params={"worker_name": self.worker_name}
-        )
-        if success and status_code == requests.codes.CREATED:
-            self.update_task_data(task_id)
-            self.start_task_worker(requested_task)
-        elif status_code == requests.codes.LOCKED:
-            logger.warning(f"task {task_id} belongs to another worker. skipping")
-        else:
-            logger.warning(f"couldn't request task: {task_id}")
-            logger.warning(f"HTTP {status_code}: {response}")
+    def start_task(self, task):
+        """start task-worker for a task reserved for us"""
+        logger.debug(f"start_task: {task['_id']}")
+        self.tasks[task["_id"]] = task
+        self.start_task_worker(task)
 
     def start_task_worker(self, requested_task):
         logger.debug(f"start_task_worker: {requested_task['_id']}")
@@ -280,6 +320,47 @@ class WorkerManager(BaseWorker):
             self.worker_name,
         )
 
+    def replay_worker_events(self):
+        """apply events missed since events_seq. False if they can't be replayed"""
+        while True:
+            success, status_code, response = self.query_api(
+                "GET",
+                f"/workers/{self.worker_name}/events",
+                params={"since": self.events_seq, "limit": 200},
+            )
+            if not success or status_code != requests.codes.OK:
+                logger.warning(f"couldn't retrieve worker events HTTP {status_code}")
+                return False
+
+            if not response["complete"]:
+                # we'll check our tasks instead. Then all events up to now are moot
+                self.events_seq = response["last_seq"]
+                return False
+
+            for event in response["items"]:
+                self.apply_worker_event(event)
+            if len(response["items"]) < 200:
+                return True
+
+    def apply_worker_event(self, event):
+        logger.debug(f"applying worker event #{event['seq']}: {event['code']}")
+        if event["code"] == "cancel-task":
+            task_id = event["payload"]["_id"]
+            if task_id in self.tasks.keys():
+                self.cancel_and_remove_task(task_id)
+            else:
+                logger.debug("not running this task, discarding")
+        self.events_seq = event["seq"]
+
+    def handle_worker_event(self, event):
+        if self.events_seq is not None and event["seq"] <= self.events_seq:
+            return  # already applied (replayed)
+        if self.events_seq is None or event["seq"] > self.events_seq + 1:
+            # we've missed some. replay them all (including this one)
+            self.check_cancellation()
+            return
+        self.apply_worker_event(event)
+
     def handle_broadcast_event(self, received_string):
         try:
             key, data = received_string.split(" ", 1)
@@ -291,7 +372,9 @@ class WorkerManager(BaseWorker):
             logger.info(received_string)
             return
 
-        if key == "cancel-task":
+        if key == f"worker-event.{self.worker_name}":
+            self.handle_worker_event(payload)
+        elif key == "cancel-task":
             if payload in self.tasks.keys():
                 self.cancel_and_remove_task(payload)
             else:
@@ -325,6 +408,9 @@ class WorkerManager(BaseWorker):
         for event in self.events:
             logger.debug(f".. {event}")
             socket.setsockopt_string(zmq.SUBSCRIBE, event)
+        # subscriptions are prefixes: separator ensures we only get our own events
+        logger.debug(f".. worker-event.{self.worker_name}")
+        socket.setsockopt_string(zmq.SUBSCRIBE, f"worker-event.{self.worker_name} ")
 
         while not self.should_stop:
             try:
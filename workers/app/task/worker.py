@@ -10,12 +10,14 @@ import shutil
 import pathlib
 import datetime
 
+import jwt
 import docker
 import requests
 
 from common import logger
 from common.utils import format_size
 from common.worker import BaseWorker
+from common.dispatcher import API_METRICS
 from common.docker import (
     query_host_mounts,
     query_container_stats,
@@ -29,7 +31,11 @@ from common.docker import (
     get_container_name,
     container_logs,
 )
-from common.constants import PROGRESS_CAPABLE_OFFLINERS, CONTAINER_TASK_IDENT
+from common.constants import (
+    PROGRESS_CAPABLE_OFFLINERS,
+    CONTAINER_TASK_IDENT,
+    TOKEN_RENEWAL_MARGIN,
+)
 
 SLEEP_INTERVAL = 60  # nb of seconds to sleep before watching
 PENDING = "pending"
@@ -98,6 +104,32 @@ class TaskWorker(BaseWorker):
         # register stop/^C
         self.register_signals()
 
+    def load_shared_token(self):
+        """use access token shared by manager in workdir, if still valid"""
+        try:
+            with open(self.shared_token_path, "r") as fh:
+                shared = json.load(fh)
+            if (
+                shared["username"] != self.username
+                or shared["webapi_uri"] != self.webapi_uri
+                # already using it (and server refused it)
+                or shared["access_token"] == self.access_token
+            ):
+                return False
+            expires_on = datetime.datetime.fromtimestamp(
+                jwt.decode(shared["access_token"], verify=False)["exp"]
+            )
+        except Exception:
+            return False
+        if (
+            expires_on - datetime.timedelta(seconds=TOKEN_RENEWAL_MARGIN)
+            <= datetime.datetime.now()
+        ):
+            return False
+        self.set_token(shared["access_token"], None)
+        logger.debug("using access token shared by manager")
+        return True
+
     def get_task(self):
         logger.info(f"Fetching task details for {self.task_id}")
         success, status_code, response = self.query_api("GET", f"/tasks/{self.task_id}")
@@ -307,7 +339,9 @@ class TaskWorker(BaseWorker):
 
     def shutdown(self, status, **kwargs):
         self.mark_task_completed(status, **kwargs)
-        logger.info("Shutting down task-worker")
+        logger.info(
+            f"Shutting down task-worker. API requests:\n{API_METRICS.summary()}"
+        )
         self.stop()
         self.cleanup_workdir()
 